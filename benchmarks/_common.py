@@ -0,0 +1,46 @@
+"""
+Helpers shared by the benchmarks: synthetic snapshots, and timing.
+
+Benchmarks are run as scripts from the repository root, such as
+`poetry run python benchmarks/bench_index.py`, so this module is imported
+from the script's directory.
+"""
+import time
+from typing import Any, Callable, Dict, Iterator, List, Sequence
+
+
+def synthetic_entries(
+    n_entries: int,
+    files_per_dir: int = 1000,
+    extensions: Sequence[str] = (".png",),
+    directories: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Generate the entries of a synthetic snapshot of `n_entries` files, in
+    directories of `files_per_dir` files each. Extensions of the files cycle
+    through `extensions`. If `directories` is True, each directory has an
+    entry of its own, before its files.
+    """
+    for i in range(n_entries):
+        rel_dir = f"session_{i // files_per_dir:05d}/"
+        if directories and i % files_per_dir == 0:
+            yield dict(path=rel_dir, type="directory")
+        yield dict(
+            path=f"{rel_dir}frame_{i:07d}{extensions[i % len(extensions)]}",
+            type="file",
+        )
+
+
+def synthetic_snapshot(n_entries: int, **kwargs) -> List[Dict[str, Any]]:
+    """A synthetic snapshot, as a list. See `synthetic_entries`."""
+    return list(synthetic_entries(n_entries, **kwargs))
+
+
+def best_of(repeat: int, func: Callable[[], Any]) -> float:
+    """Return the shortest time, in seconds, of `repeat` calls to `func`."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
@@ -0,0 +1,74 @@
+"""
+Benchmark eval functions that loop over entries against columnar ones.
+
+Validates the same check, that there are as many `.mp4` files as `.csv`
+files and that no file is empty, over synthetic columnar snapshots. The
+row function receives a list of dictionaries, and the columnar function
+receives a `columnar.Columns` view with NumPy arrays, if NumPy is
+installed.
+
+Usage:
+
+    poetry run python benchmarks/bench_columnar.py --entries 10000 1000000
+"""
+import time
+import argparse
+from datajoint_file_validator.columnar import ColumnarSnapshot
+from datajoint_file_validator.constraint import EvalConstraint
+from datajoint_file_validator.config import config
+
+ROWS = EvalConstraint(
+    """
+def check(snapshot):
+    n_mp4 = len([f for f in snapshot if f["extension"] == ".mp4"])
+    n_csv = len([f for f in snapshot if f["extension"] == ".csv"])
+    return n_mp4 == n_csv and all(f["size"] > 0 for f in snapshot)
+check.fields = ["extension", "size"]
+"""
+)
+COLUMNAR = EvalConstraint(
+    """
+def check(columns):
+    extension = columns["extension"]
+    n_mp4 = (extension == ".mp4").sum()
+    n_csv = (extension == ".csv").sum()
+    return n_mp4 == n_csv and (columns["size"] > 0).all()
+check.fields = ["extension", "size"]
+check.columnar = True
+"""
+)
+
+
+def synthetic_snapshot(n_entries: int) -> ColumnarSnapshot:
+    return ColumnarSnapshot.from_records(
+        dict(
+            path=f"session_{i // 1000:05d}/video_{i // 2:07d}.{'mp4' if i % 2 else 'csv'}",
+            extension=".mp4" if i % 2 else ".csv",
+            type="file",
+            size=1 + i,
+        )
+        for i in range(n_entries)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    config.allow_eval = True
+
+    for n_entries in args.entries:
+        snapshot = synthetic_snapshot(n_entries)
+        print(f"{n_entries} entries")
+        for label, constraint in (("rows", ROWS), ("columnar", COLUMNAR)):
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                assert constraint.validate(snapshot).status
+                timings.append(time.perf_counter() - start)
+            print(f"{label:>10}: best of {args.repeat}: {min(timings):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
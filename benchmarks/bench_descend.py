@@ -0,0 +1,67 @@
+"""
+Benchmark walking only the directories that rule queries can match inside.
+
+Builds a synthetic fileset with a `raw/` and a `cache/` tree in a temporary
+directory, then reports the time to snapshot it in full, and with the
+`descend` filter derived from each query by `planner.descend_filter`.
+
+Usage:
+
+    poetry run python benchmarks/bench_descend.py --dirs 100 --files 200
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+from datajoint_file_validator.planner import descend_filter
+from datajoint_file_validator.query import GlobQuery
+from datajoint_file_validator.snapshot import create_snapshot
+
+QUERIES = [
+    GlobQuery("**"),
+    GlobQuery("raw/**"),
+    GlobQuery("*/session_00000/*.png"),
+    GlobQuery("**", exclude="cache/**"),
+    GlobQuery("*"),
+]
+
+
+def make_tree(root: str, n_dirs: int, n_files: int):
+    for top in ("raw", "cache"):
+        for i in range(n_dirs):
+            subdir = os.path.join(root, top, f"session_{i:05d}")
+            os.makedirs(subdir)
+            for j in range(n_files):
+                with open(os.path.join(subdir, f"frame_{j:06d}.png"), "w"):
+                    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dirs", type=int, default=100)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="djfval-bench-")
+    try:
+        make_tree(root, args.dirs, args.files)
+        print(f"Synthetic tree: {2 * args.dirs * (args.files + 1)} entries at {root}")
+        for query in QUERIES:
+            descend = descend_filter([query])
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                n_entries = len(create_snapshot(root, descend=descend))
+                timings.append(time.perf_counter() - start)
+            print(
+                f"{str(query.patterns):>40}: best of {args.repeat}: "
+                f"{min(timings):.3f}s, {n_entries} entries walked"
+            )
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark diff_snapshots on synthetic snapshots of increasing size.
+
+For each size, builds a ColumnarSnapshot and a copy of it in which 0.1% of
+entries were added, removed and modified, then reports the time taken to
+diff them. Time per entry should stay flat as the size grows.
+
+Usage:
+
+    poetry run python benchmarks/bench_diff.py --entries 10000 100000 1000000
+"""
+import time
+import argparse
+from datajoint_file_validator.columnar import ColumnarSnapshot
+from datajoint_file_validator.diff import diff_snapshots
+
+T0 = 1_700_000_000_000_000_000
+
+
+def records(n_entries: int, changed: int = 0, files_per_dir: int = 1000):
+    for i in range(n_entries):
+        if changed and i % 1000 == 0:
+            # Removed in the new snapshot
+            continue
+        rel_dir = f"session_{i // files_per_dir:05d}/"
+        name = f"frame_{i:07d}.png"
+        t = T0 + i + (changed if i % 1000 == 1 else 0)
+        yield dict(
+            path=rel_dir + name, rel_path=rel_dir + name, name=name, size=i, mtime_ns=t
+        )
+    for i in range(n_entries // 1000 if changed else 0):
+        # Added in the new snapshot
+        yield dict(path=f"new/frame_{i:07d}.png", size=0, mtime_ns=T0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--entries", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for n in args.entries:
+        old = ColumnarSnapshot.from_records(records(n))
+        new = ColumnarSnapshot.from_records(records(n, changed=1))
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            diff = diff_snapshots(old, new)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        print(
+            f"{n:>10} entries: best of {args.repeat}: {best:.3f}s "
+            f"({best / n * 1e9:.0f} ns/entry), {len(diff.added)} added, "
+            f"{len(diff.removed)} removed, {len(diff.modified)} modified"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark glob filtering of snapshots with `path_utils.find_matching_files`.
+
+Filters synthetic snapshots of increasing size with the compiled matcher,
+and with the previous implementation, which ran a full `globfilter` over
+the snapshot for every entry. The previous implementation is quadratic, so
+it is only run on the small snapshots given by `--legacy-entries`.
+
+Usage:
+
+    poetry run python benchmarks/bench_glob.py --entries 10000 100000 1000000
+"""
+import argparse
+from wcmatch import glob
+from datajoint_file_validator.path_utils import GLOB_FLAGS, find_matching_files
+from _common import best_of, synthetic_snapshot
+
+PATTERNS = ["**", "**/*.png", "session_00001/*", "*/frame_000000?.png"]
+
+
+def legacy_find_matching_files(snapshot, patterns):
+    filenames = [file.get("path") for file in snapshot]
+    return (
+        file
+        for file in snapshot
+        if file.get("path")
+        in set(glob.globfilter(filenames, patterns, flags=GLOB_FLAGS))
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--entries", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument(
+        "--legacy-entries", type=int, nargs="+", default=[500, 1000, 2000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engines = [("legacy", legacy_find_matching_files, args.legacy_entries)]
+    engines.append(("compiled", find_matching_files, args.entries))
+    for name, find, sizes in engines:
+        for n in sizes:
+            snapshot = synthetic_snapshot(n)
+            for pattern in PATTERNS:
+                best = best_of(args.repeat, lambda: list(find(snapshot, pattern)))
+                print(
+                    f"{name:>8} {n:>9} entries {pattern!r:>24}: {best:.4f}s "
+                    f"({best / n * 1e9:.0f} ns/entry)"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark glob queries against indexed and plain snapshots.
+
+Runs `GlobQuery.filter` and `TypeQuery.filter` over synthetic snapshots, as
+a plain list and as an `IndexedSnapshot`. The time to build the path trie
+is reported separately, since it is paid once per snapshot and shared by
+every query.
+
+Usage:
+
+    poetry run python benchmarks/bench_index.py --entries 10000 100000 1000000
+"""
+import time
+import argparse
+from datajoint_file_validator.index import IndexedSnapshot
+from datajoint_file_validator.query import GlobQuery, TypeQuery
+from _common import best_of, synthetic_snapshot
+
+QUERIES = [
+    GlobQuery("session_00001/*"),
+    GlobQuery("session_00001/**"),
+    GlobQuery("*/frame_000000?.png"),
+    GlobQuery("*"),
+    GlobQuery("**/*.png"),
+    GlobQuery("**/*.txt"),
+    GlobQuery("**", exclude="session_0*/**"),
+    TypeQuery("directory"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--entries", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for n in args.entries:
+        snapshot = synthetic_snapshot(n, directories=True)
+        indexed = IndexedSnapshot(snapshot)
+        start = time.perf_counter()
+        indexed.snapshot_index.glob("session_00000/*")
+        print(f"{n:>9} entries: built path trie in {time.perf_counter() - start:.4f}s")
+        for query in QUERIES:
+            plain = best_of(args.repeat, lambda: query.filter(snapshot))
+            fast = best_of(args.repeat, lambda: query.filter(indexed))
+            print(
+                f"{n:>9} entries {query!r:>40}: plain {plain:.4f}s, "
+                f"indexed {fast:.4f}s ({plain / max(fast, 1e-9):.0f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark the memory used by FileMetadata records.
+
+Builds FileMetadata records for a synthetic tree without touching the
+filesystem, and reports the memory held per record, compared to the
+previous dataclass-based FileMetadata.
+
+Usage:
+
+    poetry run python benchmarks/bench_metadata.py --entries 1000000
+"""
+import gc
+import time
+import argparse
+import tracemalloc
+from types import SimpleNamespace
+from dataclasses import dataclass, field
+from typing import Optional
+from wcmatch.pathlib import Path
+from datajoint_file_validator.snapshot import FileMetadata
+from datajoint_file_validator.walker import WalkEntry
+
+ROOT = "/data/acquisition/"
+T0 = 1_700_000_000_000_000_000
+
+
+@dataclass
+class LegacyFileMetadata:
+    """FileMetadata before it was slotted, kept here for comparison."""
+
+    name: str
+    path: str = field(init=False)
+    abs_path: str
+    rel_path: str
+    extension: str
+    size: int
+    type: str
+    last_modified: str
+    mtime_ns: int
+    ctime_ns: int
+    atime_ns: int
+    _path: Optional[Path] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        self.path = self.rel_path
+
+    @classmethod
+    def from_walk_entry(cls, entry: WalkEntry) -> "LegacyFileMetadata":
+        st = entry.stat
+        return cls(
+            name=entry.name,
+            rel_path=entry.rel_path,
+            abs_path=entry.abs_path,
+            size=st.st_size,
+            type="file" if entry.is_file else "directory",
+            last_modified=FileMetadata.to_iso_8601(st.st_mtime_ns),
+            extension=Path(entry.name).suffix,
+            mtime_ns=st.st_mtime_ns,
+            ctime_ns=st.st_ctime_ns,
+            atime_ns=st.st_atime_ns,
+            _path=Path(entry.abs_path),
+        )
+
+
+def synthetic_walk(n_entries: int, files_per_dir: int = 1000):
+    for i in range(n_entries):
+        rel_dir = f"session_{i // files_per_dir:05d}/"
+        name = f"frame_{i:07d}.png"
+        t = T0 + i
+        yield WalkEntry(
+            name=name,
+            rel_path=rel_dir + name,
+            abs_path=ROOT + rel_dir + name,
+            is_file=True,
+            is_dir=False,
+            stat=SimpleNamespace(
+                st_size=4096 + i, st_mtime_ns=t, st_ctime_ns=t, st_atime_ns=t
+            ),
+        )
+
+
+def measure(build, n_entries: int):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    records = build(synthetic_walk(n_entries))
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return current, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    args = parser.parse_args()
+    n = args.entries
+
+    builders = {
+        "legacy": lambda entries: [
+            LegacyFileMetadata.from_walk_entry(e) for e in entries
+        ],
+        "slotted": lambda entries: [
+            FileMetadata.from_walk_entry(e, abs_prefix=ROOT) for e in entries
+        ],
+    }
+    print(f"Synthetic tree: {n} entries")
+    for name, build in builders.items():
+        current, elapsed = measure(build, n)
+        print(
+            f"{name:>8}: {current / 2**20:8.1f} MiB held "
+            f"({current / n:6.0f} B/entry), built in {elapsed:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark schema constraints compiled to Python against Cerberus.
+
+Validates a `regex` constraint over synthetic snapshots, once with a
+Cerberus Validator per file, and once with the schema compiled by
+`constraint.schema.compile_schema`. Half of the files fail the constraint,
+so that error messages are also formatted.
+
+Then validates several regex constraints over the same snapshot, one at a
+time, and in a single pass with `constraint.validate_regex_constraints`.
+
+Usage:
+
+    poetry run python benchmarks/bench_schema.py --entries 10000 100000
+"""
+import time
+import argparse
+from datajoint_file_validator.constraint import (
+    RegexConstraint,
+    validate_regex_constraints,
+)
+from _common import synthetic_snapshot
+
+CONSTRAINT = RegexConstraint(r"^session_\d+/frame_\d+\.png$")
+BATCH = [
+    RegexConstraint(r"^session_\d+/frame_\d+\.(png|tif)$"),
+    RegexConstraint(r".*\.(png|tif|txt)"),
+    RegexConstraint(r"[a-z_0-9/.]+"),
+    RegexConstraint(r"^(?!.*tmp).*"),
+]
+
+
+def with_cerberus(snapshot):
+    schema = CONSTRAINT.to_schema()
+    return {
+        file["path"]: errors
+        for file in snapshot
+        for errors in (CONSTRAINT._validate_file(schema, file).errors,)
+        if errors
+    }
+
+
+def compiled(snapshot):
+    return CONSTRAINT.validate(snapshot).message
+
+
+def one_at_a_time(snapshot):
+    return [constraint.validate(snapshot).message for constraint in BATCH]
+
+
+def batched(snapshot):
+    return [result.message for result in validate_regex_constraints(BATCH, snapshot)]
+
+
+def time_all(snapshot, functions, repeat: int):
+    messages = []
+    for label, fn in functions:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            message = fn(snapshot)
+            timings.append(time.perf_counter() - start)
+        messages.append(message)
+        print(f"{label:>10}: best of {repeat}: {min(timings):.3f}s")
+    assert all(message == messages[0] for message in messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for n_entries in args.entries:
+        snapshot = synthetic_snapshot(n_entries, extensions=(".tif", ".png"))
+        print(f"{n_entries} entries, 1 constraint")
+        time_all(
+            snapshot, (("cerberus", with_cerberus), ("compiled", compiled)), args.repeat
+        )
+        print(f"{n_entries} entries, {len(BATCH)} constraints")
+        time_all(
+            snapshot, (("separate", one_at_a_time), ("batched", batched)), args.repeat
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark validating a stream of entries with and without accumulators.
+
+Validates a manifest of count and regex rules against a generator of
+synthetic snapshot entries, once by filtering the entries of every rule
+into lists, as rules with `eval` constraints need, and once by streaming
+them to the accumulators of the constraints (see `Constraint.start`).
+Prints the time and the peak memory allocated by each.
+
+Usage:
+
+    poetry run python benchmarks/bench_stream.py --entries 10000 100000
+"""
+import time
+import argparse
+import tracemalloc
+from datajoint_file_validator.manifest import Manifest
+from datajoint_file_validator.main import validate_rules
+from datajoint_file_validator.planner import QueryPlan
+from _common import synthetic_entries
+
+EXTENSIONS = (".tif", ".png")
+MANIFEST = Manifest.from_dict(
+    {
+        "id": "bench",
+        "rules": [
+            {"id": "total", "count_min": 1},
+            {"id": "png", "query": "**/*.png", "count_min": 1, "count_max": 10**9},
+            {"id": "names", "query": "**/*.png", "regex": r".*/frame_\d+\.png"},
+        ],
+    }
+)
+
+
+def filtered(n_entries: int):
+    plan = QueryPlan([rule.query for rule in MANIFEST.rules])
+    filtered_snapshots = plan.scan(synthetic_entries(n_entries, extensions=EXTENSIONS))
+    return [
+        {name: r.status for name, r in rule.validate_constraints(snapshot).items()}
+        for rule, snapshot in zip(MANIFEST.rules, filtered_snapshots)
+    ]
+
+
+def streamed(n_entries: int):
+    return [
+        {name: r.status for name, r in results.items()}
+        for results in validate_rules(
+            synthetic_entries(n_entries, extensions=EXTENSIONS), MANIFEST
+        )
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    for n_entries in args.entries:
+        print(f"{n_entries} entries")
+        statuses = []
+        for label, fn in (("filtered", filtered), ("streamed", streamed)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            statuses.append(fn(n_entries))
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{label:>10}: {elapsed:.3f}s, peak {peak / 2**20:.1f} MiB")
+        assert statuses[0] == statuses[1]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Benchmark the snapshot walker engines against each other.
+
+Builds a synthetic fileset in a temporary directory, then reports wall time
+and the number of filesystem calls made by `_snapshot_to_cls` for every
+walker engine. Calls are counted by wrapping `os.stat`, `os.lstat`,
+`os.scandir` and `os.DirEntry.stat`; if `strace` is available, the exact
+number of system calls is also reported.
+
+Usage:
+
+    poetry run python benchmarks/bench_walker.py --dirs 100 --files 200
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+from contextlib import contextmanager
+from datajoint_file_validator.snapshot import _snapshot_to_cls
+from datajoint_file_validator.walker import WALKERS
+
+ENGINES = ["glob", *WALKERS]
+
+
+def make_tree(root: str, n_dirs: int, n_files: int):
+    for i in range(n_dirs):
+        subdir = os.path.join(root, f"session_{i:05d}")
+        os.makedirs(subdir)
+        for j in range(n_files):
+            with open(os.path.join(subdir, f"frame_{j:06d}.png"), "w"):
+                pass
+
+
+class _CountingDirEntry:
+    def __init__(self, entry, counter: Counter):
+        self._entry = entry
+        self._counter = counter
+
+    def stat(self, *args, **kw):
+        self._counter["DirEntry.stat"] += 1
+        return self._entry.stat(*args, **kw)
+
+    def __getattr__(self, name):
+        return getattr(self._entry, name)
+
+    def __fspath__(self):
+        return self._entry.path
+
+
+class _CountingScandir:
+    def __init__(self, it, counter: Counter):
+        self._it = it
+        self._counter = counter
+
+    def __iter__(self):
+        return (_CountingDirEntry(entry, self._counter) for entry in self._it)
+
+    def __next__(self):
+        return _CountingDirEntry(next(self._it), self._counter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._it.close()
+
+    def close(self):
+        self._it.close()
+
+
+@contextmanager
+def count_calls():
+    counter = Counter()
+    og_stat, og_lstat, og_scandir = os.stat, os.lstat, os.scandir
+
+    def stat(*args, **kw):
+        counter["os.stat"] += 1
+        return og_stat(*args, **kw)
+
+    def lstat(*args, **kw):
+        counter["os.lstat"] += 1
+        return og_lstat(*args, **kw)
+
+    def scandir(*args, **kw):
+        counter["os.scandir"] += 1
+        return _CountingScandir(og_scandir(*args, **kw), counter)
+
+    os.stat, os.lstat, os.scandir = stat, lstat, scandir
+    try:
+        yield counter
+    finally:
+        os.stat, os.lstat, os.scandir = og_stat, og_lstat, og_scandir
+
+
+def strace_count(root: str, engine: str) -> int:
+    """Count stat-family and getdents system calls using strace."""
+    code = (
+        "from datajoint_file_validator.snapshot import _snapshot_to_cls; "
+        f"_snapshot_to_cls({root!r}, {engine!r})"
+    )
+    proc = subprocess.run(
+        [
+            "strace",
+            "-f",
+            "-c",
+            "-e",
+            "trace=%stat,getdents64",
+            sys.executable,
+            "-c",
+            code,
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = [line for line in proc.stderr.splitlines() if line.endswith("total")]
+    return int(total[0].split()[2]) if total else -1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dirs", type=int, default=100)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="djfval-bench-")
+    try:
+        make_tree(root, args.dirs, args.files)
+        n_entries = args.dirs * (args.files + 1)
+        print(f"Synthetic tree: {n_entries} entries at {root}")
+        has_strace = shutil.which("strace") is not None
+        for engine in ENGINES:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                _snapshot_to_cls(root, engine)
+                timings.append(time.perf_counter() - start)
+            with count_calls() as counter:
+                _snapshot_to_cls(root, engine)
+            calls = sum(counter.values())
+            print(
+                f"{engine:>10}: best of {args.repeat}: {min(timings):.3f}s, "
+                f"{calls} calls ({calls / n_entries:.2f}/entry) {dict(counter)}"
+            )
+            if has_strace:
+                print(f"{'':>10}  strace: {strace_count(root, engine)} syscalls")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from . import snapshot, main, manifest, result
+from . import snapshot, main, manifest, result, diff
 from .snapshot import Snapshot
 from .manifest import Manifest
 from .result import ValidationResult
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+from stat import S_ISDIR, S_ISREG
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from .config import config
+from .walker import (
+    DescendFilter,
+    WalkEntry,
+    Listing,
+    _scan_dir,
+    _walk,
+    _walk_entry,
+)
+from .log import logger
+
+# Version of the on-disk format. Caches written in another format are ignored.
+CACHE_VERSION = 1
+# Directories modified this close to the start of the walk that cached them
+# may have changed again within the same mtime tick, so they are re-listed.
+RACY_WINDOW_NS = 2_000_000_000
+
+
+class _CachedDirEntry(NamedTuple):
+    """Stands in for the `os.DirEntry` of a directory listed from the cache."""
+
+    name: str
+    path: str
+    symlink: bool
+
+    def is_symlink(self) -> bool:
+        return self.symlink
+
+
+class SnapshotCache:
+    """
+    A persistent cache of the directory listings under a root path.
+
+    Only the names and types of the entries of each directory are cached,
+    along with the mtime of the directory they were listed from. When
+    the root is walked again, a directory whose mtime has not changed is
+    not listed again. Sizes and timestamps of entries are never cached:
+    they are stat'ed on every walk, so files that are modified in place,
+    which leaves the mtime of their directory unchanged, are always
+    reported correctly.
+
+    Caches are stored as JSON under `config.snapshot_cache_dir`, in a file
+    named after a hash of the real path of the root.
+    """
+
+    def __init__(self, root: str, cache_dir: Optional[os.PathLike] = None):
+        self.root = os.path.realpath(root)
+        cache_dir = Path(cache_dir or config.snapshot_cache_dir).expanduser()
+        digest = hashlib.sha256(self.root.encode()).hexdigest()
+        self.path = cache_dir / f"{digest}.json"
+        self.hits = 0
+        self.misses = 0
+        self._started_ns = 0
+        # Listings from the last walk, keyed by relative path of the directory
+        self._dirs: Dict[str, Tuple[int, List[Tuple[str, bool, bool, bool]]]] = {}
+        # Listings seen during the current walk
+        self._seen: Dict[str, Tuple[int, List[Tuple[str, bool, bool, bool]]]] = {}
+        self.load()
+
+    def load(self):
+        """Load cached listings from disk, if any."""
+        try:
+            with open(self.path) as f:
+                data: Dict[str, Any] = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != CACHE_VERSION or data.get("root") != self.root:
+            logger.debug(f"Ignoring snapshot cache at '{self.path}'")
+            return
+        self._started_ns = data["started_ns"]
+        self._dirs = {
+            rel_dir: (mtime_ns, [tuple(entry) for entry in entries])
+            for rel_dir, (mtime_ns, entries) in data["dirs"].items()
+        }
+
+    def save(self):
+        """Write listings to disk atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = dict(
+            version=CACHE_VERSION,
+            root=self.root,
+            started_ns=self._started_ns,
+            dirs=self._dirs,
+        )
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def clear(self):
+        """Remove the cache from disk and memory."""
+        self._dirs = {}
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _is_fresh(self, rel_dir: str, mtime_ns: int) -> bool:
+        cached = self._dirs.get(rel_dir)
+        return (
+            cached is not None
+            and cached[0] == mtime_ns
+            and mtime_ns < self._started_ns - RACY_WINDOW_NS
+        )
+
+    def _list_dir(self, rel_dir: str, abs_dir: str, stat: bool = True) -> Listing:
+        mtime_ns = os.stat(abs_dir or ".").st_mtime_ns
+        if self._is_fresh(rel_dir, mtime_ns):
+            try:
+                listing = self._list_cached(rel_dir, abs_dir, stat)
+            except FileNotFoundError:
+                # Changed while walking, so the mtime will differ next time
+                listing = None
+            if listing is not None:
+                self.hits += 1
+                self._seen[rel_dir] = self._dirs[rel_dir]
+                return listing
+
+        self.misses += 1
+        listing = []
+        entries = []
+        for entry in _scan_dir(abs_dir):
+            walk_entry = _walk_entry(rel_dir, abs_dir, entry, stat)
+            listing.append((walk_entry, entry))
+            entries.append(
+                (
+                    entry.name,
+                    walk_entry.is_file,
+                    walk_entry.is_dir,
+                    entry.is_symlink(),
+                )
+            )
+        self._seen[rel_dir] = (mtime_ns, entries)
+        return listing
+
+    def _list_cached(self, rel_dir: str, abs_dir: str, stat: bool) -> Listing:
+        listing = []
+        for name, is_file, is_dir, is_symlink in self._dirs[rel_dir][1]:
+            st = None
+            # The target of a symbolic link can change without changing
+            # the mtime of its directory, so its type is always re-read
+            if stat or is_symlink:
+                st = os.stat(abs_dir + name)
+                is_file, is_dir = S_ISREG(st.st_mode), S_ISDIR(st.st_mode)
+            suffix = "" if is_file else "/"
+            walk_entry = WalkEntry(
+                name=name,
+                rel_path=rel_dir + name + suffix,
+                abs_path=abs_dir + name + suffix,
+                is_file=is_file,
+                is_dir=is_dir,
+                stat=st if stat else None,
+            )
+            entry = _CachedDirEntry(name, os.path.join(abs_dir, name), is_symlink)
+            listing.append((walk_entry, entry))
+        return listing
+
+    def walk(
+        self, path: str, *, stat: bool = True, descend: Optional[DescendFilter] = None
+    ) -> Iterator[WalkEntry]:
+        """
+        Walk a file or directory at local `path`, which must resolve to
+        the root of this cache, reusing cached listings where possible.
+        Yields the same entries in the same order as `walker.scandir_walk`.
+
+        The cache is written to disk once the walk is complete, with the
+        listings of the directories that were walked. Cached listings
+        under the directories that `descend` skips are kept as well, so
+        that a later walk without the filter can reuse them.
+        """
+        if os.path.realpath(path) != self.root:
+            raise ValueError(f"Path '{path}' is not the root of this cache")
+        started_ns = time.time_ns()
+        self._seen = {}
+        self.hits = self.misses = 0
+        skipped: List[str] = []
+        if descend is not None:
+            filter_ = descend
+
+            def descend(rel_dir: str) -> bool:
+                if filter_(rel_dir):
+                    return True
+                skipped.append(rel_dir)
+                return False
+
+        yield from _walk(path, partial(self._list_dir, stat=stat), descend)
+        if skipped:
+            # Only listings that were not racy when they were cached are
+            # kept, since they are checked against the new start time
+            prefixes = tuple(skipped)
+            for rel_dir, listing in self._dirs.items():
+                if (
+                    rel_dir.startswith(prefixes)
+                    and rel_dir not in self._seen
+                    and listing[0] < self._started_ns - RACY_WINDOW_NS
+                ):
+                    self._seen[rel_dir] = listing
+        # Other directories that were not visited have been removed
+        self._dirs, self._started_ns = self._seen, started_ns
+        logger.debug(
+            f"Snapshot cache for '{self.root}': {self.hits} directories "
+            f"reused, {self.misses} listed"
+        )
+        if os.path.isdir(self.root):
+            self.save()
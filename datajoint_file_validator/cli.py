@@ -9,6 +9,9 @@ from rich import print as rprint
 from rich.console import Console
 from rich.table import Table
 from . import main, registry
+from .snapshot import iter_snapshot
+from .planner import QueryCache
+from .serialize import save_snapshot
 
 console = Console()
 app = typer.Typer()
@@ -30,6 +33,12 @@ class DisplayFormat(str, Enum):
     json = "json"
 
 
+class Compression(str, Enum):
+    none = "none"
+    gzip = "gzip"
+    zstd = "zstd"
+
+
 @app.command()
 def validate(
     target: Annotated[str, typer.Argument(..., exists=True)],
@@ -38,11 +47,14 @@ def validate(
     format: DisplayFormat = DisplayFormat.table,
 ):
     """
-    Validate a target against a manifest.
+    Validate a target against a manifest. The target is a file, a
+    directory, or a snapshot file saved by the `snapshot` command.
     """
+    cache = QueryCache()
     success, report = main.validate(
-        target, manifest, verbose=False, raise_err=raise_err
+        target, manifest, verbose=False, raise_err=raise_err, cache=cache
     )
+    rprint(f"Query cache: {cache.hits} hits, {cache.misses} misses", file=sys.stderr)
     if success:
         rprint(":heavy_check_mark: Validation successful!", file=sys.stderr)
         return
@@ -60,6 +72,27 @@ def validate(
     raise typer.Exit(code=1)
 
 
+@app.command()
+def snapshot(
+    target: Annotated[str, typer.Argument(..., exists=True)],
+    output: Annotated[str, typer.Argument(...)],
+    compression: Compression = Compression.none,
+):
+    """
+    Take a snapshot of a target and save it to a file, which can be
+    validated later, possibly on another machine.
+    """
+    n = save_snapshot(
+        iter_snapshot(target),
+        output,
+        compression=None if compression == Compression.none else compression.value,
+    )
+    rprint(
+        f":heavy_check_mark: Saved snapshot of {n} entries to '{output}'",
+        file=sys.stderr,
+    )
+
+
 @manifest_app.command(name="list")
 def list_manifests(
     query: Optional[str] = typer.Option(
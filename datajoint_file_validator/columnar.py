@@ -0,0 +1,452 @@
+from array import array
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+from .snapshot import FileMetadata, Snapshot, iter_snapshot
+from .index import SnapshotIndex
+
+FIELDS = FileMetadata.FIELDS
+INT_FIELDS = ("size", "mtime_ns", "ctime_ns", "atime_ns")
+INTERNED_FIELDS = ("extension", "type")
+# Fields that are usually derivable from other fields, and are only
+# stored when they are not
+DERIVED_FIELDS = ("name", "rel_path", "abs_path", "last_modified")
+
+
+class _Interned:
+    """
+    A column of repeated strings, stored as indices into a table of
+    unique values.
+    """
+
+    __slots__ = ("table", "ids", "_lookup")
+
+    def __init__(self, table: Optional[List] = None, ids: Optional[array] = None):
+        self.table = table if table is not None else []
+        self.ids = ids if ids is not None else array("L")
+        self._lookup: Optional[Dict[Any, int]] = None
+
+    def append(self, value: Any):
+        if self._lookup is None:
+            self._lookup = {v: i for i, v in enumerate(self.table)}
+        i = self._lookup.get(value)
+        if i is None:
+            i = self._lookup[value] = len(self.table)
+            self.table.append(value)
+        self.ids.append(i)
+
+    def take(self, indices: Iterable[int]) -> "_Interned":
+        ids = self.ids
+        return _Interned(self.table, array("L", (ids[i] for i in indices)))
+
+    def __getitem__(self, i: int) -> Any:
+        return self.table[self.ids[i]]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator:
+        table = self.table
+        return (table[i] for i in self.ids)
+
+    @classmethod
+    def concat(cls, columns: List["_Interned"]) -> "_Interned":
+        """Concatenate interned columns, merging their tables."""
+        out = cls(list(columns[0].table), array("L", columns[0].ids))
+        lookup = {v: i for i, v in enumerate(out.table)}
+        for column in columns[1:]:
+            mapping = []
+            for value in column.table:
+                i = lookup.get(value)
+                if i is None:
+                    i = lookup[value] = len(out.table)
+                    out.table.append(value)
+                mapping.append(i)
+            out.ids.extend(array("L", map(mapping.__getitem__, column.ids)))
+        return out
+
+
+def _take(column: Union[_Interned, array, List], indices: List[int]):
+    """Select rows at `indices` from a column."""
+    if isinstance(column, _Interned):
+        return column.take(indices)
+    if isinstance(column, array):
+        return array(column.typecode, (column[i] for i in indices))
+    return [column[i] for i in indices]
+
+
+def _concat(columns: List[Union[_Interned, array, List]]):
+    """Concatenate columns of the same kind."""
+    if isinstance(columns[0], _Interned):
+        return _Interned.concat(columns)
+    out = columns[0][:]
+    for column in columns[1:]:
+        out.extend(column)
+    return out
+
+
+def _split_path(path: str):
+    """Split `path` into its parent directory, base name and trailing slash."""
+    stripped = path.rstrip("/")
+    parent, sep, base = stripped.rpartition("/")
+    return parent + sep, base, path[len(stripped) :]
+
+
+class _Builder:
+    """Builds the columns of a ColumnarSnapshot one entry at a time."""
+
+    def __init__(self):
+        self.n = 0
+        self.dirs = _Interned()
+        self.bases: List[str] = []
+        self.trailing = _Interned()
+        self.interned = {field: _Interned() for field in INTERNED_FIELDS}
+        self.ints: Dict[str, Union[array, List]] = {
+            field: array("q") for field in INT_FIELDS
+        }
+        # Derived fields, until a value that cannot be derived is seen
+        self.derived = set(DERIVED_FIELDS)
+        self.abs_prefix: Optional[str] = None
+        self.stored: Dict[str, List] = {}
+        self.extra: Dict[str, List] = {}
+
+    def _derive(self, field: str, i: int) -> Any:
+        return ColumnarSnapshot._derive_value(
+            field,
+            self.dirs[i] + self.bases[i] + self.trailing[i],
+            self.bases[i],
+            self.ints["mtime_ns"][i],
+            self.abs_prefix,
+        )
+
+    def _store(self, field: str, value: Any):
+        """Stop deriving `field`, storing its values for all rows instead."""
+        self.derived.discard(field)
+        self.stored[field] = [self._derive(field, i) for i in range(self.n)]
+        self.stored[field].append(value)
+
+    def append(self, record: Dict[str, Any]):
+        if "path" not in record:
+            raise ValueError(f"Snapshot entry is missing a 'path': {record}")
+        path = record["path"]
+        parent, base, trailing = _split_path(path)
+        self.dirs.append(parent)
+        self.bases.append(base)
+        self.trailing.append(trailing)
+        for field in INTERNED_FIELDS:
+            self.interned[field].append(record.get(field))
+        for field in INT_FIELDS:
+            value, column = record.get(field), self.ints[field]
+            if value is None and isinstance(column, array):
+                column = self.ints[field] = column.tolist()
+            column.append(value)
+
+        # Absolute paths are derived using the prefix of the first entry
+        abs_path = record.get("abs_path")
+        if self.n == 0 and isinstance(abs_path, str) and abs_path.endswith(path):
+            self.abs_prefix = abs_path[: len(abs_path) - len(path)]
+        for field in DERIVED_FIELDS:
+            value = record.get(field)
+            if field not in self.derived:
+                self.stored[field].append(value)
+            elif value != self._derive(field, self.n):
+                self._store(field, value)
+
+        for key, value in record.items():
+            if key in FIELDS:
+                continue
+            if key not in self.extra:
+                self.extra[key] = [None] * self.n
+            self.extra[key].append(value)
+        for key, values in self.extra.items():
+            if len(values) == self.n:
+                values.append(None)
+        self.n += 1
+
+    def build(self) -> "ColumnarSnapshot":
+        return ColumnarSnapshot(
+            dirs=self.dirs,
+            bases=self.bases,
+            trailing=self.trailing,
+            columns={**self.interned, **self.ints, **self.stored},
+            extra=self.extra,
+            abs_prefix=self.abs_prefix,
+        )
+
+
+class ColumnarSnapshot(Sequence):
+    """
+    A Snapshot stored as columns, rather than as a list of dictionaries.
+
+    Paths are split into an interned table of parent directories and a list
+    of base names. Extensions and types are interned. Sizes and timestamps
+    are stored in arrays of 64-bit integers. `name`, `rel_path`, `abs_path`
+    and `last_modified` are derived from the other columns when possible.
+
+    A ColumnarSnapshot is a sequence of snapshot entries, so it can be used
+    anywhere a Snapshot is expected. Entries are converted to dictionaries
+    only when they are accessed.
+    """
+
+    def __init__(
+        self,
+        dirs: _Interned,
+        bases: List[str],
+        trailing: _Interned,
+        columns: Dict[str, Union[_Interned, array, List]],
+        extra: Optional[Dict[str, List]] = None,
+        abs_prefix: Optional[str] = None,
+    ):
+        self._dirs = dirs
+        self._bases = bases
+        self._trailing = trailing
+        self._columns = columns
+        self._extra = extra or {}
+        self._abs_prefix = abs_prefix
+        self._index: Optional[SnapshotIndex] = None
+
+    @staticmethod
+    def _derive_value(
+        field: str,
+        path: str,
+        base: str,
+        mtime_ns: Optional[int],
+        abs_prefix: Optional[str],
+    ) -> Any:
+        if field == "name":
+            return base
+        if field == "rel_path":
+            return path
+        if field == "abs_path":
+            return None if abs_prefix is None else abs_prefix + path
+        if field == "last_modified":
+            return None if mtime_ns is None else FileMetadata.to_iso_8601(mtime_ns)
+        raise ValueError(f"Field '{field}' is not derived")
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "ColumnarSnapshot":
+        """
+        Create a ColumnarSnapshot from a Snapshot, or any other iterable of
+        snapshot entries. Entries are consumed one at a time.
+        """
+        builder = _Builder()
+        for record in records:
+            builder.append(record)
+        return builder.build()
+
+    @classmethod
+    def from_path(cls, path: str) -> "ColumnarSnapshot":
+        """Generate a ColumnarSnapshot of a file or directory at local `path`."""
+        return cls.from_records(iter_snapshot(path))
+
+    @classmethod
+    def concat(cls, snapshots: List["ColumnarSnapshot"]) -> "ColumnarSnapshot":
+        """Concatenate ColumnarSnapshots into one."""
+        if not snapshots:
+            return cls.from_records([])
+        if len(snapshots) == 1:
+            return snapshots[0]
+        first = snapshots[0]
+
+        def layout(snapshot):
+            return (
+                snapshot._abs_prefix,
+                {k: type(v) for k, v in snapshot._columns.items()},
+                list(snapshot._extra),
+            )
+
+        if any(layout(s) != layout(first) for s in snapshots):
+            # Columns are stored differently, so rebuild them from scratch
+            return cls.from_records(
+                record for snapshot in snapshots for record in snapshot
+            )
+        return cls(
+            dirs=_Interned.concat([s._dirs for s in snapshots]),
+            bases=_concat([s._bases for s in snapshots]),
+            trailing=_Interned.concat([s._trailing for s in snapshots]),
+            columns={
+                k: _concat([s._columns[k] for s in snapshots]) for k in first._columns
+            },
+            extra={k: _concat([s._extra[k] for s in snapshots]) for k in first._extra},
+            abs_prefix=first._abs_prefix,
+        )
+
+    def to_records(self) -> Snapshot:
+        """Convert to a Snapshot, a list of dictionaries."""
+        return list(self)
+
+    def column(self, field: str) -> Sequence:
+        """Return the values of `field` for every entry."""
+        if field == "path":
+            return [
+                parent + base + trailing
+                for parent, base, trailing in zip(
+                    self._dirs, self._bases, self._trailing
+                )
+            ]
+        if field in self._columns:
+            return self._columns[field]
+        if field in self._extra:
+            return self._extra[field]
+        if field == "name":
+            return self._bases
+        if field == "rel_path":
+            return self.column("path")
+        if field == "abs_path" and self._abs_prefix is not None:
+            prefix = self._abs_prefix
+            return [prefix + path for path in self.column("path")]
+        if field in DERIVED_FIELDS:
+            return [self._value(field, i) for i in range(len(self))]
+        raise KeyError(field)
+
+    @property
+    def snapshot_index(self) -> SnapshotIndex:
+        """A SnapshotIndex of this snapshot, built on first use."""
+        if self._index is None:
+            try:
+                types = self.column("type")
+            except KeyError:
+                types = None
+            self._index = SnapshotIndex(self.column("path"), types, self.column)
+        return self._index
+
+    def take(self, indices: Iterable[int]) -> "ColumnarSnapshot":
+        """Return a new ColumnarSnapshot with the entries at `indices`."""
+        indices = list(indices)
+        return self.__class__(
+            dirs=self._dirs.take(indices),
+            bases=_take(self._bases, indices),
+            trailing=self._trailing.take(indices),
+            columns={k: _take(v, indices) for k, v in self._columns.items()},
+            extra={k: _take(v, indices) for k, v in self._extra.items()},
+            abs_prefix=self._abs_prefix,
+        )
+
+    def _value(self, field: str, i: int) -> Any:
+        if field == "path":
+            return self._dirs[i] + self._bases[i] + self._trailing[i]
+        if field in self._columns:
+            return self._columns[field][i]
+        mtime_ns = self._columns["mtime_ns"][i]
+        return self._derive_value(
+            field, self._value("path", i), self._bases[i], mtime_ns, self._abs_prefix
+        )
+
+    def _row(self, i: int) -> Dict[str, Any]:
+        row = {}
+        for field in FIELDS:
+            value = self._value(field, i)
+            if value is not None:
+                row[field] = value
+        for field, values in self._extra.items():
+            if values[i] is not None:
+                row[field] = values[i]
+        return row
+
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            return self.take(range(*i.indices(len(self))))
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("ColumnarSnapshot index out of range")
+        return self._row(i)
+
+    def __len__(self) -> int:
+        return len(self._bases)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self._row(i) for i in range(len(self)))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(<{len(self)} entries>)"
+
+
+def _numpy():
+    """Return the `numpy` module, or None if it is not installed."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class Columns:
+    """
+    A read-only, column-oriented view of a snapshot, for eval functions that
+    set a `columnar` attribute (see `EvalConstraint`). Indexing it with a
+    field, such as `columns["size"]`, returns the values of that field for
+    every entry, and `len(columns)` is the number of entries.
+
+    If NumPy is installed, columns are NumPy arrays, so that checks can be
+    vectorized. Sizes and timestamps are arrays of 64-bit integers, which
+    are masked where a value is missing. Other fields, such as `path` and
+    `extension`, are arrays of Python objects. Without NumPy, sizes and
+    timestamps are read-only memoryviews, or tuples if values are missing,
+    and other fields are tuples.
+    """
+
+    def __init__(self, snapshot: Union[ColumnarSnapshot, Iterable[Dict]]):
+        if not isinstance(snapshot, ColumnarSnapshot):
+            snapshot = ColumnarSnapshot.from_records(snapshot)
+        self._snapshot = snapshot
+        self._np = _numpy()
+        self._cache: Dict[str, Any] = {}
+
+    @property
+    def fields(self) -> List[str]:
+        """Fields that have a column."""
+        snapshot = self._snapshot
+        fields = ["path", *DERIVED_FIELDS, *snapshot._columns, *snapshot._extra]
+        if snapshot._abs_prefix is None and "abs_path" not in snapshot._columns:
+            fields.remove("abs_path")
+        return list(dict.fromkeys(fields))
+
+    def _objects(self, values: Sequence) -> Any:
+        if self._np is None:
+            return tuple(values)
+        # Not numpy.array, which would make a 2-D array of list values
+        return self._np.fromiter(values, dtype=object, count=len(values))
+
+    def _column(self, field: str) -> Any:
+        np, column = self._np, self._snapshot.column(field)
+        if isinstance(column, array):
+            if np is None:
+                return memoryview(column).toreadonly()
+            values = (
+                np.frombuffer(column, dtype=np.int64)
+                if column
+                else np.array([], dtype=np.int64)
+            )
+            # A view of the snapshot's storage
+            values.flags.writeable = False
+            return values
+        if field in INT_FIELDS:
+            # Some values are missing
+            if np is None:
+                return tuple(column)
+            missing = [value is None for value in column]
+            return np.ma.masked_array(
+                [0 if value is None else value for value in column],
+                mask=missing,
+                dtype=np.int64,
+            )
+        if isinstance(column, _Interned) and np is not None:
+            table = self._objects(column.table)
+            if not column.ids:
+                return table[:0]
+            return table[np.frombuffer(column.ids, dtype=f"u{column.ids.itemsize}")]
+        return self._objects(column)
+
+    def __getitem__(self, field: str) -> Any:
+        if field not in self._cache:
+            self._cache[field] = self._column(field)
+        return self._cache[field]
+
+    def __contains__(self, field: str) -> bool:
+        return field in self.fields
+
+    def __len__(self) -> int:
+        return len(self._snapshot)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(<{len(self)} entries>)"
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Optional
 from .base_settings import BaseSettings
 from . import __path__ as MODULE_HOMES
 
@@ -9,9 +10,18 @@ class Config(BaseSettings):
     ENV_PATH = ".env"
 
     allow_eval: bool = True
+    eval_cache_size: int = 256
+    eval_workers: int = 0
+    eval_timeout: Optional[float] = None
+    eval_memory_limit: Optional[int] = None
     debug: bool = False
     enable_path_handle: bool = True
     default_query: str = "**"
+    snapshot_walker: str = "scandir"
+    snapshot_workers: int = 8
+    snapshot_max_pending: int = 256
+    snapshot_cache: bool = False
+    snapshot_cache_dir: Path = Path("~/.cache/datajoint-file-validator/snapshots")
     manifest_schema_parts: Path = next(
         Path(module_home) / Path("manifest_schemas/parts")
         for module_home in MODULE_HOMES
@@ -1,16 +1,52 @@
 import re
+import ast
 import sys
+import hashlib
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Any, Iterable, Callable, Tuple, List, Dict
+from functools import lru_cache
+from typing import (
+    Any,
+    FrozenSet,
+    Iterable,
+    Callable,
+    Tuple,
+    List,
+    Dict,
+    Optional,
+    Sequence,
+)
 from abc import ABC, abstractmethod
 from cerberus import Validator
 from pprint import pprint, pformat
 from ..config import config
-from ..snapshot import Snapshot
+from ..snapshot import Snapshot, ALL_FIELDS
+from ..columnar import ColumnarSnapshot, Columns
 from ..result import ValidationResult
 from ..error import DJFileValidatorError
+from .schema import Errors, Schema, compile_schema
 
-Schema = Any
+
+class Accumulator(ABC):
+    """
+    Validates a constraint over a stream of snapshot entries, one entry at
+    a time, without keeping the entries. Start one with `Constraint.start`,
+    `update` it with each entry of the snapshot, then `finish` it.
+    """
+
+    @abstractmethod
+    def update(self, entry: Dict[str, Any]):
+        """Add an entry of the snapshot."""
+        pass
+
+    @abstractmethod
+    def finish(self) -> ValidationResult:
+        """
+        Return the result of the constraint for the entries added so far.
+        The context of the result has no `snapshot`.
+        """
+        pass
 
 
 @dataclass(frozen=True)
@@ -22,43 +58,99 @@ class Constraint(ABC):
         """Validate a snapshot against a single constraint."""
         pass
 
+    def start(self) -> Optional[Accumulator]:
+        """
+        Start validating a stream of snapshot entries. Returns None if this
+        constraint can only validate a whole snapshot with `validate`, such
+        as `EvalConstraint`.
+        """
+        return None
+
     @property
     def name(self):
         _name = getattr(self, "_name", None)
         return _name if _name is not None else self.__class__.__name__
 
+    @property
+    def fields(self) -> FrozenSet[str]:
+        """Fields of a Snapshot entry that this constraint reads."""
+        return ALL_FIELDS
+
 
 @dataclass(frozen=True)
-class CountMinConstraint(Constraint):
-    """Constraint for `count_min`."""
+class CountConstraint(Constraint):
+    """
+    A constraint on the number of files in a Snapshot. Results can be
+    updated by the change in that number, without the Snapshot.
+    """
 
-    val: int
+    @property
+    def fields(self) -> FrozenSet[str]:
+        return frozenset()
 
-    def validate(self, snapshot: Snapshot) -> ValidationResult:
-        status = len(snapshot) >= self.val
+    @abstractmethod
+    def _check(self, count: int) -> Tuple[bool, str]:
+        """Return whether `count` passes, and a message if it does not."""
+        pass
+
+    def _result(self, count: int, snapshot: Optional[Snapshot]) -> ValidationResult:
+        status, message = self._check(count)
         return ValidationResult(
             status=status,
-            message=None
-            if status
-            else f"constraint `{self.name}` failed: {len(snapshot)} < {self.val}",
-            context=dict(snapshot=snapshot, constraint=self),
+            message=None if status else message,
+            context=dict(snapshot=snapshot, constraint=self, count=count),
         )
 
+    def validate(self, snapshot: Snapshot) -> ValidationResult:
+        return self._result(len(snapshot), snapshot)
+
+    def start(self) -> "_CountAccumulator":
+        return _CountAccumulator(self)
+
+    def update(self, result: ValidationResult, delta: int) -> ValidationResult:
+        """
+        Update a `result` of this constraint after `delta` files were added
+        to the Snapshot, or removed if negative. The context of the updated
+        result has no `snapshot`.
+        """
+        return self._result(result.context["count"] + delta, None)
+
+
+class _CountAccumulator(Accumulator):
+    def __init__(self, constraint: CountConstraint):
+        self.constraint = constraint
+        self.count = 0
+
+    def update(self, entry: Dict[str, Any]):
+        self.count += 1
+
+    def finish(self) -> ValidationResult:
+        return self.constraint._result(self.count, None)
+
 
 @dataclass(frozen=True)
-class CountMaxConstraint(Constraint):
+class CountMinConstraint(CountConstraint):
+    """Constraint for `count_min`."""
+
+    val: int
+
+    def _check(self, count: int) -> Tuple[bool, str]:
+        return (
+            count >= self.val,
+            f"constraint `{self.name}` failed: {count} < {self.val}",
+        )
+
+
+@dataclass(frozen=True)
+class CountMaxConstraint(CountConstraint):
     """Constraint for `count_max`."""
 
     val: int
 
-    def validate(self, snapshot: Snapshot) -> ValidationResult:
-        status = len(snapshot) <= self.val
-        return ValidationResult(
-            status=status,
-            message=None
-            if status
-            else f"constraint `{self.name}` failed: {len(snapshot)} > {self.val}",
-            context=dict(snapshot=snapshot, constraint=self),
+    def _check(self, count: int) -> Tuple[bool, str]:
+        return (
+            count <= self.val,
+            f"constraint `{self.name}` failed: {count} > {self.val}",
         )
 
 
@@ -72,34 +164,80 @@ class SchemaConvertibleConstraint(Constraint):
         """
         pass
 
+    @property
+    def fields(self) -> FrozenSet[str]:
+        """Fields of a Snapshot entry that this constraint reads."""
+        return frozenset(self.to_schema())
+
     @staticmethod
     def _validate_file(schema: Schema, file: dict) -> Validator:
         v = Validator(allow_unknown=True)
         v.validate(file, schema)
         return v
 
+    def checker(self) -> Callable[[Dict], Errors]:
+        """
+        Return a function that returns the Cerberus errors of a file against
+        this constraint's schema. The schema is compiled to plain Python
+        checks if it only uses rules that `schema.compile_schema` supports,
+        and each file is validated with Cerberus otherwise.
+        """
+        try:
+            return _checker(self)
+        except TypeError:
+            # Unhashable constraint values are not cached
+            return _checker.__wrapped__(self)
+
+    def start(self) -> "_SchemaAccumulator":
+        return _SchemaAccumulator(self)
+
     def validate(self, snapshot: Snapshot) -> ValidationResult:
         """Validate a snapshot against a single constraint."""
-        schema: Schema = self.to_schema()
-        validators: Iterable[Validator] = list(
-            map(lambda file: self._validate_file(schema, file), snapshot)
-        )
-        status = bool(
-            not any(getattr(validator, "errors", None) for validator in validators)
-        )
+        check = self.checker()
+        file_errors: List[Errors] = [check(file) for file in snapshot]
+        status = not any(file_errors)
         return ValidationResult(
             status=status,
             message=None
             if status
             else {
-                file["path"]: validator.errors
-                for file, validator in zip(snapshot, validators)
-                if validator.errors
+                file["path"]: errors
+                for file, errors in zip(snapshot, file_errors)
+                if errors
             },
             context=dict(snapshot=snapshot, constraint=self),
         )
 
 
+class _SchemaAccumulator(Accumulator):
+    def __init__(self, constraint: SchemaConvertibleConstraint):
+        self.constraint = constraint
+        self.check = constraint.checker()
+        # Errors of the files that failed, by path
+        self.message: Dict[str, Errors] = {}
+
+    def update(self, entry: Dict[str, Any]):
+        errors = self.check(entry)
+        if errors:
+            self.message[entry["path"]] = errors
+
+    def finish(self) -> ValidationResult:
+        return ValidationResult(
+            status=not self.message,
+            message=self.message or None,
+            context=dict(snapshot=None, constraint=self.constraint),
+        )
+
+
+@lru_cache(maxsize=1024)
+def _checker(constraint: SchemaConvertibleConstraint) -> Callable[[Dict], Errors]:
+    schema: Schema = constraint.to_schema()
+    compiled = compile_schema(schema)
+    if compiled is not None:
+        return compiled
+    return lambda file: constraint._validate_file(schema, file).errors
+
+
 @dataclass(frozen=True)
 class RegexConstraint(SchemaConvertibleConstraint):
     """Constraint for `regex`."""
@@ -116,7 +254,14 @@ class RegexConstraint(SchemaConvertibleConstraint):
 
 @dataclass(frozen=True)
 class EvalConstraint(Constraint):
-    """Constraint for `eval`."""
+    """
+    Constraint for `eval`.
+
+    The function is called with the snapshot, a list of entries. Functions
+    that set a `columnar` attribute to True are called with a `Columns`
+    view of the snapshot instead, such as NumPy arrays of every path and
+    size, so that they can check large snapshots without a Python loop.
+    """
 
     val: str
 
@@ -137,26 +282,87 @@ class EvalConstraint(Constraint):
         assert function_name in locals()
         return locals()[function_name], function_name
 
-    def validate(self, snapshot: Snapshot) -> ValidationResult:
+    @property
+    def fields(self) -> FrozenSet[str]:
+        """
+        Fields of a Snapshot entry that this constraint reads, declared by
+        setting a `fields` attribute on the function to a literal list, such
+        as `func.fields = ["extension"]`. The definition is parsed, not run,
+        so that no user code runs while planning. Defaults to all fields.
+        """
+        if not config.allow_eval:
+            return ALL_FIELDS
+        match = re.search(r"def (\w+)", self.val)
+        try:
+            module = ast.parse(self.val)
+        except (SyntaxError, ValueError):
+            # Errors are raised when the constraint is validated
+            return ALL_FIELDS
+        if match is None:
+            return ALL_FIELDS
+        fields = None
+        for node in module.body:
+            if not isinstance(node, ast.Assign):
+                continue
+            for target in node.targets:
+                if (
+                    isinstance(target, ast.Attribute)
+                    and target.attr == "fields"
+                    and isinstance(target.value, ast.Name)
+                    and target.value.id == match.group(1)
+                ):
+                    try:
+                        fields = ast.literal_eval(node.value)
+                    except (ValueError, TypeError):
+                        # Not a literal, so the fields cannot be known
+                        fields = None
+        if not isinstance(fields, (list, tuple, set, frozenset)) or not all(
+            isinstance(field, str) for field in fields
+        ):
+            return ALL_FIELDS
+        return frozenset(fields)
+
+    @staticmethod
+    def check_allowed():
+        """Raise an error if eval constraints are not allowed."""
         if not config.allow_eval:
             raise DJFileValidatorError(
                 "Eval constraint is not allowed. "
                 "Set `Config.allow_eval = True` to allow."
             )
-        try:
-            function, function_name = self._eval_function(self.val)
-        except Exception as e:
-            raise DJFileValidatorError(
-                f"Error parsing function in '{self.name}' constraint: {type(e).__name__}: {e}"
-            ) from e
-        try:
-            status = function(snapshot)
-        except Exception as e:
-            raise DJFileValidatorError(
-                f"Error was raised while executing validation function "
-                f"'{function_name}' in "
-                f"constraint '{self.name}': {type(e).__name__}: {e}"
-            ) from e
+
+    def parse_error(self, error: str) -> DJFileValidatorError:
+        """The error for an `error` raised while parsing the function."""
+        return DJFileValidatorError(
+            f"Error parsing function in '{self.name}' constraint: {error}"
+        )
+
+    def call_error(self, function_name: str, error: str) -> DJFileValidatorError:
+        """The error for an `error` raised by the function."""
+        return DJFileValidatorError(
+            f"Error was raised while executing validation function "
+            f"'{function_name}' in "
+            f"constraint '{self.name}': {error}"
+        )
+
+    @staticmethod
+    def call(function: Callable, snapshot: Snapshot) -> Any:
+        """
+        Call a compiled `function` with `snapshot`, or a `Columns` view of it
+        if the function is columnar, and return the status it returned.
+        Other functions are always called with a list of dictionaries.
+        """
+        if getattr(function, "columnar", False):
+            # Such as numpy.bool_, which ValidationResult cannot use
+            return bool(function(Columns(snapshot)))
+        if isinstance(snapshot, ColumnarSnapshot):
+            snapshot = snapshot.to_records()
+        return function(snapshot)
+
+    def result(
+        self, status: Any, function_name: str, snapshot: Snapshot
+    ) -> ValidationResult:
+        """The result of a call to the function that returned `status`."""
         return ValidationResult(
             status=status,
             message=None
@@ -165,6 +371,226 @@ class EvalConstraint(Constraint):
             context=dict(snapshot=snapshot, constraint=self),
         )
 
+    def validate(self, snapshot: Snapshot) -> ValidationResult:
+        self.check_allowed()
+        try:
+            function, function_name = eval_cache.get(self.val)
+        except Exception as e:
+            raise self.parse_error(f"{type(e).__name__}: {e}") from e
+        try:
+            status = self.call(function, snapshot)
+        except Exception as e:
+            raise self.call_error(function_name, f"{type(e).__name__}: {e}") from e
+        return self.result(status, function_name, snapshot)
+
+
+class EvalCache:
+    """
+    Functions compiled from the definitions of eval constraints, keyed by
+    a hash of the definition. One cache is shared by the whole process, so
+    that a manifest validated against many filesets compiles each function
+    once. The type and arguments of errors raised while compiling are
+    cached too, and a new error is raised from them without compiling. At
+    most `config.eval_cache_size` definitions are kept, evicting the least
+    recently used. The cache may be shared between threads.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, Tuple[Any, Optional[Tuple[type, tuple]]]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        # Number of definitions found in the cache, and compiled
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(definition: str) -> str:
+        return hashlib.sha256(definition.encode("utf-8")).hexdigest()
+
+    def get(self, definition: str) -> Tuple[Callable, str]:
+        """
+        Return the function defined by `definition` and its name, compiling
+        it with `EvalConstraint._eval_function` if it is not cached.
+        """
+        key = self.key(definition)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                compiled, error = self._entries[key]
+            else:
+                self.misses += 1
+                compiled, error = None, None
+                try:
+                    compiled = EvalConstraint._eval_function(definition)
+                except Exception as e:
+                    # Not the exception itself, which would keep its
+                    # traceback alive and chain onto every later raise
+                    error = (type(e), e.args)
+                self._entries[key] = (compiled, error)
+                while len(self._entries) > max(config.eval_cache_size, 0):
+                    self._entries.popitem(last=False)
+        if error is not None:
+            error_type, args = error
+            try:
+                new_error = error_type(*args)
+            except Exception:
+                new_error = DJFileValidatorError(*args)
+            raise new_error
+        return compiled
+
+    def clear(self):
+        """Remove every function from the cache, and reset its counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+eval_cache = EvalCache()
+
+
+# Backreferences and conditionals refer to groups by number, which would
+# shift if their pattern were combined with others
+_GROUP_REFERENCE = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+
+
+# Global flags at the start of a pattern, which must be scoped to it
+# before it is combined with others
+_GLOBAL_FLAGS = re.compile(r"\(\?([aiLmsux]+)\)")
+
+
+def _match_patterns(patterns: List[str]) -> Optional[Callable[[str], int]]:
+    """
+    Compile regex `patterns` to a single pattern that tries each of them in
+    turn, as a chain of optional lookaheads, each capturing a group if its
+    pattern matches. Each pattern is anchored at the end, as Cerberus
+    anchors it. Returns a function that returns the patterns that match a
+    path, as a bitmask. Patterns that cannot be combined, such as patterns
+    with backreferences, never match, and None is returned if none can.
+    """
+    parts = []
+    for k, pattern in enumerate(patterns):
+        if _GROUP_REFERENCE.search(pattern):
+            continue
+        anchored = pattern if pattern.endswith("$") else pattern + "$"
+        flags = _GLOBAL_FLAGS.match(anchored)
+        if flags:
+            anchored = f"(?{flags.group(1)}:{anchored[flags.end():]})"
+        try:
+            re.compile(anchored)
+        except re.error:
+            continue
+        parts.append((k, f"(?:(?=(?P<_p{k}>{anchored}))|)"))
+    if not parts:
+        return None
+    try:
+        combined = re.compile("".join(part for _, part in parts))
+    except re.error:
+        return None
+    groups = [(1 << k, combined.groupindex[f"_p{k}"]) for k, _ in parts]
+    match = combined.match
+
+    def matches(path: str) -> int:
+        regs = match(path).regs
+        return sum(bit for bit, group in groups if regs[group][0] != -1)
+
+    return matches
+
+
+class RegexBatch:
+    """
+    Regex constraints, such as those of every rule in a manifest, whose
+    patterns are matched against each path at once, in a single regex call.
+    Each constraint is validated against its own entries, with `validate`
+    or `start`, and only entries whose path its pattern does not match are
+    checked against its schema. The patterns that match a path are reused
+    for as long as it is the latest path matched, or for the whole batch if
+    `keep_matches` is True.
+    """
+
+    def __init__(
+        self, constraints: Sequence[RegexConstraint], keep_matches: bool = False
+    ):
+        self.constraints = list(constraints)
+        self.checkers = [constraint.checker() for constraint in self.constraints]
+        patterns = list(dict.fromkeys(constraint.val for constraint in constraints))
+        self.bits = [1 << patterns.index(constraint.val) for constraint in constraints]
+        self._match = _match_patterns(patterns)
+        self._matches: Optional[Dict[str, int]] = {} if keep_matches else None
+        self._last: Tuple[Optional[str], int] = (None, 0)
+
+    def matches(self, path: Any) -> int:
+        """Return the patterns that match `path`, as a bitmask."""
+        if self._match is None or not isinstance(path, str):
+            return 0
+        last_path, mask = self._last
+        if path == last_path:
+            return mask
+        if self._matches is None:
+            mask = self._match(path)
+        else:
+            mask = self._matches.get(path)
+            if mask is None:
+                mask = self._matches[path] = self._match(path)
+        self._last = (path, mask)
+        return mask
+
+    def validate(self, k: int, snapshot: Snapshot) -> ValidationResult:
+        """
+        Validate a snapshot against the `k`th constraint. Returns the same
+        result as `RegexConstraint.validate`.
+        """
+        bit, check = self.bits[k], self.checkers[k]
+        if isinstance(snapshot, ColumnarSnapshot):
+            paths = snapshot.column("path")
+        else:
+            paths = [file.get("path") for file in snapshot]
+        message: Dict[str, Errors] = {}
+        for i, path in enumerate(paths):
+            if self.matches(path) & bit:
+                continue
+            file = snapshot[i]
+            errors = check(file)
+            if errors:
+                message[file["path"]] = errors
+        return ValidationResult(
+            status=not message,
+            message=message or None,
+            context=dict(snapshot=snapshot, constraint=self.constraints[k]),
+        )
+
+    def start(self, k: int) -> Accumulator:
+        """Start validating a stream of entries against the `k`th constraint."""
+        return _RegexAccumulator(self, k)
+
+
+class _RegexAccumulator(_SchemaAccumulator):
+    def __init__(self, batch: RegexBatch, k: int):
+        super().__init__(batch.constraints[k])
+        self.batch = batch
+        self.bit = batch.bits[k]
+
+    def update(self, entry: Dict[str, Any]):
+        if not self.batch.matches(entry.get("path")) & self.bit:
+            super().update(entry)
+
+
+def validate_regex_constraints(
+    constraints: Sequence[RegexConstraint], snapshot: Snapshot
+) -> List[ValidationResult]:
+    """
+    Validate a snapshot against several regex constraints, matching each
+    path against the patterns of all constraints at once (see
+    `RegexBatch`). Returns the result of each constraint, the same as
+    `RegexConstraint.validate`.
+    """
+    batch = RegexBatch(constraints, keep_matches=True)
+    return [batch.validate(k, snapshot) for k in range(len(batch.constraints))]
+
 
 CONSTRAINT_MAP = {
     "count_min": CountMinConstraint,
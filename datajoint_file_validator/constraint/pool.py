@@ -0,0 +1,275 @@
+import os
+import time
+import pickle
+import tempfile
+import atexit
+import signal
+import itertools
+import multiprocessing
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from . import EvalConstraint, eval_cache
+from ..config import config
+from ..result import ValidationResult
+from ..snapshot import Snapshot
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where memory limits are not enforced
+    resource = None
+
+# Time allowed past the timeout of a call for its worker to report back,
+# before the pool is terminated
+GRACE_PERIOD = 1.0
+# Seconds between checks for calls that have started, while waiting
+POLL_INTERVAL = 0.05
+
+# In workers: queue to report the id and start time of each call to
+_started: Any = None
+# In workers: the directory of the batch of calls last run, and the
+# snapshots of that batch loaded so far, by path
+_snapshots: Tuple[Optional[str], Dict[str, Snapshot]] = (None, {})
+# In the parent: the pool reused across validations, with the number of
+# workers and memory limit it was started with, and its start queue
+_pool: Optional[Tuple[Tuple[int, Optional[int]], Any, Any]] = None
+_call_ids = itertools.count()
+
+
+class _Timeout(BaseException):
+    """
+    Raised in a worker when a call times out. Not an Exception, so that
+    functions that catch every Exception cannot swallow it.
+    """
+
+
+def _on_alarm(signum, frame):
+    raise _Timeout()
+
+
+def _init_worker(started, memory_limit: Optional[int]):
+    global _started
+    _started = started
+    if memory_limit is not None and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def _write_snapshot(snapshot: Snapshot, path: str):
+    """Pickle `snapshot` to `path`, for workers to load."""
+    with open(path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _load_snapshot(path: str) -> Snapshot:
+    """
+    Load the snapshot at `path`, in a worker. Each snapshot is loaded once
+    per worker, and kept until a call of another batch is run.
+    """
+    global _snapshots
+    batch = os.path.dirname(path)
+    if _snapshots[0] != batch:
+        _snapshots = (batch, {})
+    loaded = _snapshots[1]
+    if path not in loaded:
+        with open(path, "rb") as f:
+            loaded[path] = pickle.load(f)
+    return loaded[path]
+
+
+def _call(
+    call_id: int, definition: str, snapshot_path: str, timeout: Optional[float]
+) -> Tuple[str, Any]:
+    """
+    Call the function defined by `definition` with the snapshot at
+    `snapshot_path`, in a worker. Returns "ok" and the status it returned,
+    "error" and the error it raised, or "timeout".
+    """
+    # Monotonic clocks are shared by all processes on the machine
+    _started.put((call_id, time.monotonic()))
+    function, _ = eval_cache.get(definition)
+    alarm = timeout is not None and hasattr(signal, "setitimer")
+    if alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return "ok", EvalConstraint.call(function, _load_snapshot(snapshot_path))
+    except _Timeout:
+        return "timeout", None
+    except Exception as e:
+        return "error", f"{type(e).__name__}: {e}"
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def _get_pool(workers: int, memory_limit: Optional[int]) -> Tuple[Any, Any]:
+    """
+    Return a pool of `workers` processes, each limited to `memory_limit`,
+    and the queue its workers report the start of calls to. The pool is
+    reused by later calls with the same arguments.
+    """
+    global _pool
+    key = (workers, memory_limit)
+    if _pool is not None and _pool[0] != key:
+        terminate_pool()
+    if _pool is None:
+        # Not a Queue, whose feeder thread cannot run while a call that
+        # holds the GIL blocks, such as in C code
+        started = multiprocessing.SimpleQueue()
+        pool = multiprocessing.Pool(
+            workers, initializer=_init_worker, initargs=(started, memory_limit)
+        )
+        _pool = (key, pool, started)
+    return _pool[1], _pool[2]
+
+
+@atexit.register
+def terminate_pool():
+    """Stop the worker processes of the pool, if any."""
+    global _pool
+    if _pool is not None:
+        _, pool, started = _pool
+        _pool = None
+        pool.terminate()
+        started.close()
+
+
+def _wait(
+    async_result, call_id: int, started, starts: Dict[int, float], timeout: float
+) -> Optional[Tuple[str, Any]]:
+    """
+    Wait for the result of a call, or return None if it has not returned
+    `GRACE_PERIOD` seconds after its timeout, counted from when it started.
+    """
+    while True:
+        while not started.empty():
+            started_id, start = started.get()
+            starts[started_id] = start
+        wait = POLL_INTERVAL
+        if call_id in starts:
+            remaining = starts[call_id] + timeout + GRACE_PERIOD - time.monotonic()
+            if remaining <= 0:
+                return None
+            wait = min(wait, remaining)
+        try:
+            return async_result.get(wait)
+        except multiprocessing.TimeoutError:
+            continue
+
+
+def validate_eval_constraints(
+    calls: Sequence[Tuple[EvalConstraint, Snapshot]],
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+) -> List[ValidationResult]:
+    """
+    Validate eval constraints, each against its own snapshot, in parallel
+    in a pool of worker processes. Returns the result of each constraint,
+    the same as `EvalConstraint.validate`, and raises the same errors, in
+    the order of `calls`.
+
+    The pool is reused by later validations with the same `workers` and
+    `memory_limit`. Each distinct snapshot is pickled once, to a temporary
+    file, and loaded by each worker that runs a call on it at most once,
+    however many constraints validate it.
+
+    Parameters
+    ----------
+    calls : Sequence[Tuple[EvalConstraint, Snapshot]]
+        Constraints, and the snapshot to validate each against.
+    workers : int
+        Number of worker processes. Defaults to `config.eval_workers`, or
+        the number of CPUs if that is 0.
+    timeout : float
+        Seconds that each call may run for, after which it fails with a
+        TimeoutError. Defaults to `config.eval_timeout`, or no timeout.
+        Calls are interrupted with `SIGALRM`. A call that does not return
+        control to Python within `GRACE_PERIOD` of its timeout, counted
+        from when it started, is stopped by terminating the pool.
+    memory_limit : int
+        Bytes of address space that each worker may use, including its copy
+        of each snapshot it loaded. Functions that exceed it fail with a MemoryError.
+        Defaults to `config.eval_memory_limit`, or no limit. Not enforced
+        on Windows.
+    """
+    if not calls:
+        return []
+    EvalConstraint.check_allowed()
+    workers = workers or config.eval_workers or os.cpu_count() or 1
+    timeout = config.eval_timeout if timeout is None else timeout
+    memory_limit = config.eval_memory_limit if memory_limit is None else memory_limit
+
+    # Functions are parsed here as well, so that parse errors are raised
+    # without calling any function
+    parsed: List[Tuple[Optional[str], Optional[Exception]]] = []
+    for constraint, _ in calls:
+        try:
+            parsed.append((eval_cache.get(constraint.val)[1], None))
+        except Exception as e:
+            parsed.append((None, e))
+
+    pool, started = _get_pool(workers, memory_limit)
+    with tempfile.TemporaryDirectory(prefix="djfv-eval-") as batch:
+        # Snapshots shared by several constraints, such as of rules with the
+        # same query, are written once
+        paths: Dict[int, str] = {}
+        for (_, snapshot), (_, error) in zip(calls, parsed):
+            if error is None and id(snapshot) not in paths:
+                paths[id(snapshot)] = os.path.join(batch, str(len(paths)))
+                _write_snapshot(snapshot, paths[id(snapshot)])
+        return _run_calls(calls, parsed, paths, pool, started, timeout)
+
+
+def _run_calls(
+    calls: Sequence[Tuple[EvalConstraint, Snapshot]],
+    parsed: List[Tuple[Optional[str], Optional[Exception]]],
+    paths: Dict[int, str],
+    pool,
+    started,
+    timeout: Optional[float],
+) -> List[ValidationResult]:
+    """
+    Run the calls of `validate_eval_constraints` in `pool`, on the snapshots
+    written to `paths`, by id, and return their results.
+    """
+    try:
+        pending = [
+            None
+            if error is not None
+            else (
+                call_id,
+                pool.apply_async(
+                    _call, (call_id, constraint.val, paths[id(snapshot)], timeout)
+                ),
+            )
+            for (constraint, snapshot), (_, error), call_id in zip(
+                calls, parsed, _call_ids
+            )
+        ]
+        starts: Dict[int, float] = {}
+        results = []
+        for (constraint, snapshot), (function_name, error), call in zip(
+            calls, parsed, pending
+        ):
+            if error is not None:
+                raise constraint.parse_error(
+                    f"{type(error).__name__}: {error}"
+                ) from error
+            call_id, async_result = call
+            if timeout is None:
+                outcome, value = async_result.get()
+            else:
+                returned = _wait(async_result, call_id, started, starts, timeout)
+                outcome, value = ("timeout", None) if returned is None else returned
+            if outcome == "timeout":
+                raise constraint.call_error(
+                    function_name, f"TimeoutError: timed out after {timeout}s"
+                )
+            if outcome == "error":
+                raise constraint.call_error(function_name, value)
+            results.append(constraint.result(value, function_name, snapshot))
+        return results
+    except BaseException:
+        # Calls that are still running would hold up later validations
+        terminate_pool()
+        raise
@@ -0,0 +1,186 @@
+import re
+from collections.abc import Iterable, Mapping
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from cerberus import Validator, errors
+from cerberus.errors import BasicErrorHandler, ErrorDefinition
+
+Schema = Any
+# Errors of a single entry, by field, as reported by `cerberus.Validator.errors`
+Errors = Dict[str, List[str]]
+# A check of one rule against a value, returning an error message, if any
+_Check = Callable[[Any], Optional[str]]
+
+_TYPES = Validator.types_mapping
+# Rules that compile_schema supports
+RULES = frozenset(("type", "required", "nullable", "regex", "min", "max", "allowed"))
+
+
+def _message(
+    error: ErrorDefinition, field: str, constraint: Any, value: Any, *info
+) -> str:
+    """Format an error message exactly as `cerberus.Validator.errors` does."""
+    return BasicErrorHandler.messages[error.code].format(
+        *info, constraint=constraint, field=field, value=value
+    )
+
+
+def _is_type(name: str, value: Any) -> bool:
+    definition = _TYPES[name]
+    return isinstance(value, definition.included_types) and not isinstance(
+        value, definition.excluded_types
+    )
+
+
+def _compile_type(data_type: Any) -> Optional[Callable[[Any], bool]]:
+    types = (data_type,) if isinstance(data_type, str) else data_type
+    if not types or not isinstance(types, (list, tuple)):
+        return None
+    if not all(isinstance(name, str) and name in _TYPES for name in types):
+        # Such as types with a custom `_validate_type_*` method
+        return None
+    definitions = [
+        (_TYPES[name].included_types, _TYPES[name].excluded_types) for name in types
+    ]
+    return lambda value: any(
+        isinstance(value, included) and not isinstance(value, excluded)
+        for included, excluded in definitions
+    )
+
+
+def _compile_rule(field: str, rule: str, constraint: Any) -> Optional[_Check]:
+    """Compile a single rule of `field`, or return None if not supported."""
+    if rule == "regex":
+        if not isinstance(constraint, str):
+            return None
+        try:
+            match = re.compile(
+                constraint if constraint.endswith("$") else constraint + "$"
+            ).match
+        except re.error:
+            # Cerberus raises the error when a value is checked
+            return None
+
+        def check(value):
+            if isinstance(value, str) and not match(value):
+                return _message(errors.REGEX_MISMATCH, field, constraint, value)
+
+    elif rule == "allowed":
+        if not _is_type("container", constraint):
+            return None
+
+        def check(value):
+            if isinstance(value, Iterable) and not isinstance(value, str):
+                unallowed = tuple(x for x in value if x not in constraint)
+                if unallowed:
+                    return _message(
+                        errors.UNALLOWED_VALUES, field, constraint, value, unallowed
+                    )
+            elif value not in constraint:
+                return _message(errors.UNALLOWED_VALUE, field, constraint, value)
+
+    elif rule in ("min", "max"):
+        if constraint is None:
+            return None
+        is_min = rule == "min"
+
+        def check(value):
+            try:
+                failed = value < constraint if is_min else value > constraint
+            except TypeError:
+                return None
+            if failed:
+                error = errors.MIN_VALUE if is_min else errors.MAX_VALUE
+                return _message(error, field, constraint, value)
+
+    else:
+        return None
+    return check
+
+
+class CompiledSchema:
+    """
+    A Cerberus schema compiled to plain Python checks, for the subset of
+    rules in `RULES`. Calling it with an entry returns the same errors, in
+    the same order and with the same messages, as validating the entry
+    with `cerberus.Validator(allow_unknown=True)`, without building a
+    Validator per entry. See `compile_schema`.
+    """
+
+    def __init__(self, fields: List[Tuple]):
+        # For each field: name, required, nullable, type check and
+        # constraint, and the checks of the other rules
+        self._fields = fields
+
+    def __call__(self, entry: Mapping) -> Errors:
+        found = []
+        for field, required, nullable, is_type, data_type, checks in self._fields:
+            if field not in entry:
+                if required:
+                    found.append(
+                        (
+                            field,
+                            "required",
+                            _message(errors.REQUIRED_FIELD, field, True, None),
+                        )
+                    )
+                continue
+            value = entry[field]
+            # Cerberus skips every other rule after these
+            if value is None:
+                if not nullable:
+                    message = _message(errors.NOT_NULLABLE, field, nullable, value)
+                    found.append((field, "nullable", message))
+                continue
+            if is_type is not None and not is_type(value):
+                message = _message(errors.BAD_TYPE, field, data_type, value)
+                found.append((field, "type", message))
+                continue
+            for rule, check in checks:
+                message = check(value)
+                if message is not None:
+                    found.append((field, rule, message))
+        if not found:
+            return {}
+        # Cerberus sorts errors by field, then by rule
+        found.sort(key=lambda error: error[:2])
+        result: Errors = {}
+        for field, _, message in found:
+            result.setdefault(field, []).append(message)
+        return result
+
+
+def compile_schema(schema: Schema) -> Optional[CompiledSchema]:
+    """
+    Compile a Cerberus `schema` for snapshot entries to a CompiledSchema.
+    Returns None if the schema uses a rule outside of `RULES`, or a
+    constraint that Cerberus would reject, so that the caller can fall back
+    to validating with Cerberus.
+    """
+    if not isinstance(schema, Mapping):
+        return None
+    fields = []
+    for field, rules in schema.items():
+        if not isinstance(field, str) or not isinstance(rules, Mapping):
+            return None
+        if not RULES.issuperset(rules):
+            return None
+        required = rules.get("required", False)
+        nullable = rules.get("nullable", False)
+        if not isinstance(required, bool) or not isinstance(nullable, bool):
+            return None
+        is_type = data_type = None
+        if "type" in rules:
+            data_type = rules["type"]
+            is_type = _compile_type(data_type)
+            if is_type is None:
+                return None
+        checks = []
+        for rule, constraint in rules.items():
+            if rule in ("type", "required", "nullable"):
+                continue
+            check = _compile_rule(field, rule, constraint)
+            if check is None:
+                return None
+            checks.append((rule, check))
+        fields.append((field, required, nullable, is_type, data_type, checks))
+    return CompiledSchema(fields)
@@ -0,0 +1,103 @@
+from collections.abc import Sequence as SequenceABC
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Sequence, Set, Tuple, Union
+from .snapshot import Snapshot
+from .columnar import ColumnarSnapshot
+
+Entry = Dict[str, Any]
+
+
+@dataclass
+class SnapshotDiff:
+    """Changes between two snapshots of the same fileset."""
+
+    added: Snapshot = field(default_factory=list)
+    removed: Snapshot = field(default_factory=list)
+    # Pairs of (old, new) entries
+    modified: List[Tuple[Entry, Entry]] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.modified)
+
+    @property
+    def changed_paths(self) -> Set[str]:
+        """Paths of all entries that were added, removed or modified."""
+        return {
+            *(entry["path"] for entry in self.added),
+            *(entry["path"] for entry in self.removed),
+            *(new["path"] for _, new in self.modified),
+        }
+
+
+def _columns(snapshot: Sequence[Entry]) -> Tuple[Sequence, Sequence, Sequence]:
+    """Return the relative paths, mtimes and sizes of a snapshot."""
+    if isinstance(snapshot, ColumnarSnapshot):
+        return (
+            snapshot.column("rel_path"),
+            snapshot.column("mtime_ns"),
+            snapshot.column("size"),
+        )
+    return (
+        [entry.get("rel_path", entry.get("path")) for entry in snapshot],
+        [entry.get("mtime_ns") for entry in snapshot],
+        [entry.get("size") for entry in snapshot],
+    )
+
+
+def _take(snapshot: Sequence[Entry], indices: List[int]) -> Snapshot:
+    if isinstance(snapshot, ColumnarSnapshot):
+        return snapshot.take(indices)
+    return [snapshot[i] for i in indices]
+
+
+def diff_snapshots(
+    old: Union[Snapshot, Iterable[Entry]], new: Union[Snapshot, Iterable[Entry]]
+) -> SnapshotDiff:
+    """
+    Find the entries that were added, removed or modified between two
+    snapshots. Entries are matched by `rel_path`, and a matched entry is
+    modified if its `mtime_ns` or `size` changed. Entries of snapshots
+    taken without stat'ing have neither, so they are never modified.
+
+    Runs in linear time, using a hash join on `rel_path`. Columns of a
+    ColumnarSnapshot are compared without converting entries to
+    dictionaries, and only the entries that changed are converted.
+
+    Parameters
+    ----------
+    old : Snapshot | Iterable[Dict[str, Any]]
+        The earlier snapshot.
+    new : Snapshot | Iterable[Dict[str, Any]]
+        The later snapshot.
+
+    Returns
+    -------
+    diff : SnapshotDiff
+        Added and removed entries, and (old, new) pairs of modified
+        entries, each in the order of the snapshot they were taken from.
+    """
+    if not isinstance(old, SequenceABC):
+        old = list(old)
+    if not isinstance(new, SequenceABC):
+        new = list(new)
+    old_paths, old_mtimes, old_sizes = _columns(old)
+    new_paths, new_mtimes, new_sizes = _columns(new)
+
+    old_index = {path: i for i, path in enumerate(old_paths)}
+    added, modified_old, modified_new = [], [], []
+    for j, path in enumerate(new_paths):
+        i = old_index.pop(path, None)
+        if i is None:
+            added.append(j)
+        elif old_mtimes[i] != new_mtimes[j] or old_sizes[i] != new_sizes[j]:
+            modified_old.append(i)
+            modified_new.append(j)
+    # Entries left in the index were not matched by any new entry. Dicts
+    # keep insertion order, so they are still in the order of `old`.
+    removed = list(old_index.values())
+
+    return SnapshotDiff(
+        added=_take(new, added),
+        removed=_take(old, removed),
+        modified=list(zip(_take(old, modified_old), _take(new, modified_new))),
+    )
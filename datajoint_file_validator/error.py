@@ -12,3 +12,7 @@ class InvalidRuleError(DJFileValidatorError):
 
 class InvalidQueryError(DJFileValidatorError):
     pass
+
+
+class InvalidSnapshotError(DJFileValidatorError):
+    pass
@@ -0,0 +1,445 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from .snapshot import Snapshot
+from .path_utils import GLOB_FLAGS, GlobMatcher, Patterns, compile_glob, _freeze
+from wcmatch import glob
+
+# Characters that make a pattern segment match more than one name
+MAGIC_CHARS = frozenset("*?[]\\")
+# Indexes assume that matching is case sensitive, as it is on POSIX
+_CASE_SENSITIVE = not glob.globmatch("A", "a", flags=GLOB_FLAGS)
+
+# A plan to find candidates for a pattern: the literal directory segments
+# that prefix it, the number of segments after them, or None if the
+# pattern can span any number of segments, and the extension that every
+# match must have, if any
+GlobPlan = Tuple[Tuple[str, ...], Optional[int], Optional[str]]
+
+
+class _Node:
+    """A directory in a PathTrie."""
+
+    __slots__ = ("children", "entries", "self_index")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        # Indices of the entries directly inside this directory
+        self.entries: List[int] = []
+        # Index of the entry of this directory itself, if any
+        self.self_index: Optional[int] = None
+
+
+def _is_magic(segment: str) -> bool:
+    return not MAGIC_CHARS.isdisjoint(segment)
+
+
+def _extension(name: str) -> str:
+    """The extension of an entry `name`, from its last dot, if any."""
+    i = name.rfind(".")
+    return "" if i < 0 else name[i:]
+
+
+def _literal_extension(segment: str) -> Optional[str]:
+    """
+    The extension of every name that matches pattern `segment`, if it ends
+    with a literal that contains a dot, as in `*.png`.
+    """
+    tail = segment
+    for i in range(len(segment) - 1, -1, -1):
+        if segment[i] in MAGIC_CHARS:
+            tail = segment[i + 1 :]
+            break
+    return _extension(tail) or None
+
+
+def _plan_pattern(pattern: str) -> Optional[GlobPlan]:
+    segments = pattern.split("/")
+    if len(segments) > 1 and segments[-1] == "":
+        # Trailing slash, which only matches directories
+        segments.pop()
+    if any(segment in ("", ".", "..") for segment in segments):
+        return None
+    prefix = []
+    for segment in segments[:-1]:
+        if _is_magic(segment):
+            break
+        prefix.append(segment)
+    rest = segments[len(prefix) :]
+    depth = None if "**" in rest else len(rest)
+    return tuple(prefix), depth, _literal_extension(segments[-1])
+
+
+# The plan of a pattern that can match any entry, such as `**`
+FULL_PLAN: GlobPlan = ((), None, None)
+
+
+@lru_cache(maxsize=1024)
+def _plan(patterns) -> Optional[Tuple[GlobPlan, ...]]:
+    if not _CASE_SENSITIVE:
+        return None
+    if isinstance(patterns, str):
+        patterns = (patterns,)
+    plans = tuple(_plan_pattern(pattern) for pattern in patterns)
+    if not plans or any(plan is None for plan in plans):
+        return None
+    return plans
+
+
+def glob_plan(patterns: Patterns) -> Optional[Tuple[GlobPlan, ...]]:
+    """
+    Plan how to find the entries that match glob `patterns` using a
+    SnapshotIndex. Returns None if the index cannot narrow down the
+    entries to check, such as for `**`.
+    """
+    plans = _plan(_freeze(patterns))
+    if plans is None or FULL_PLAN in plans:
+        return None
+    return plans
+
+
+@lru_cache(maxsize=1024)
+def _prune_matcher(patterns, exclude) -> Optional[GlobMatcher]:
+    if not exclude or _plan(patterns) is None:
+        return None
+    if isinstance(exclude, str):
+        exclude = (exclude,)
+    subtrees = tuple(pattern for pattern in exclude if pattern.endswith("/**"))
+    if not subtrees:
+        return None
+    # Wildcards never match hidden names, so `x/**` does not exclude hidden
+    # entries under `x/`. Only prune if no pattern could match them.
+    if isinstance(patterns, str):
+        patterns = (patterns,)
+    for pattern in patterns:
+        if any(segment[:1] in (".", "[", "\\") for segment in pattern.split("/")):
+            return None
+    return compile_glob(subtrees)
+
+
+def prune_matcher(
+    patterns: Patterns, exclude: Optional[Patterns]
+) -> Optional[GlobMatcher]:
+    """
+    Return a matcher for the directories, with a trailing slash, whose
+    every entry matching glob `patterns` is excluded by `exclude`, such as
+    `scratch/` for `scratch/**`. Returns None if no directory can be pruned.
+    """
+    return _prune_matcher(_freeze(patterns), _freeze(exclude))
+
+
+class PathTrie:
+    """
+    The directory tree of a snapshot. Each directory node holds the indices
+    of the entries directly inside it.
+    """
+
+    def __init__(self, paths: Iterable[Optional[str]]):
+        self.root = _Node()
+        # Nodes by path of their directory, without trailing slash
+        nodes: Dict[str, _Node] = {"": self.root}
+        for i, path in enumerate(paths):
+            if path is None:
+                continue
+            stripped = path.rstrip("/")
+            parent, _, name = stripped.rpartition("/")
+            node = nodes.get(parent)
+            if node is None:
+                node = nodes[parent] = self._make_dirs(parent)
+            node.entries.append(i)
+            if len(stripped) != len(path):
+                child = node.children.get(name)
+                if child is None:
+                    child = node.children[name] = _Node()
+                    nodes[stripped] = child
+                child.self_index = i
+
+    def _make_dirs(self, rel_dir: str) -> _Node:
+        node = self.root
+        for name in rel_dir.split("/"):
+            child = node.children.get(name)
+            if child is None:
+                child = node.children[name] = _Node()
+            node = child
+        return node
+
+    def find(self, segments: Sequence[str]) -> Optional[_Node]:
+        """Return the node of directory `segments`, if any."""
+        node = self.root
+        for name in segments:
+            node = node.children.get(name)
+            if node is None:
+                return None
+        return node
+
+    @staticmethod
+    def _children(node: _Node, path: str, skip: Optional[Callable]):
+        """Child nodes of `node` at `path`, and their paths, unless skipped."""
+        for name, child in node.children.items():
+            child_path = path + name + "/"
+            if not skip(child_path):
+                yield child, child_path
+
+    @classmethod
+    def subtree(
+        cls, node: _Node, path: str = "", skip: Optional[Callable] = None
+    ) -> List[int]:
+        """
+        Indices of the directory `node` at `path` and every entry under it.
+        Subdirectories for which `skip` returns true are not descended into.
+        """
+        indices = [] if node.self_index is None else [node.self_index]
+        if skip is None:
+            stack = [node]
+            while stack:
+                node = stack.pop()
+                indices.extend(node.entries)
+                stack.extend(node.children.values())
+            return indices
+        stack = [(node, path)]
+        while stack:
+            node, path = stack.pop()
+            indices.extend(node.entries)
+            stack.extend(cls._children(node, path, skip))
+        return indices
+
+    @classmethod
+    def at_depth(
+        cls,
+        node: _Node,
+        depth: int,
+        path: str = "",
+        skip: Optional[Callable] = None,
+    ) -> List[int]:
+        """
+        Indices of the entries `depth` levels under the directory `node` at
+        `path`. Subdirectories for which `skip` returns true are not
+        descended into.
+        """
+        if skip is None:
+            nodes = [node]
+            for _ in range(depth - 1):
+                nodes = [child for node in nodes for child in node.children.values()]
+            return [i for node in nodes for i in node.entries]
+        level = [(node, path)]
+        for _ in range(depth - 1):
+            level = [
+                child
+                for node, path in level
+                for child in cls._children(node, path, skip)
+            ]
+        return [i for node, _ in level for i in node.entries]
+
+    def candidates(
+        self,
+        prefix: Sequence[str],
+        depth: Optional[int],
+        skip: Optional[Callable] = None,
+    ) -> List[int]:
+        """
+        Indices of the entries under directory `prefix`, `depth` levels
+        down, or at any depth if `depth` is None. Not in snapshot order.
+        Directories for which `skip` returns true are pruned.
+        """
+        node = self.find(prefix)
+        if node is None:
+            return []
+        path = "".join(name + "/" for name in prefix)
+        if skip is not None and path and skip(path):
+            return []
+        if depth is None:
+            return self.subtree(node, path, skip)
+        return self.at_depth(node, depth, path, skip)
+
+
+def _group(keys: Iterable) -> Dict[Any, List[int]]:
+    """Group indices by key. Each group is in snapshot order."""
+    groups: Dict[Any, List[int]] = {}
+    for i, key in enumerate(keys):
+        group = groups.get(key)
+        if group is None:
+            groups[key] = [i]
+        else:
+            group.append(i)
+    return groups
+
+
+class SnapshotIndex:
+    """
+    Indexes over the entries of a snapshot, for answering queries without
+    scanning every entry. Each index is built on first use, once per
+    snapshot; the snapshot must not be modified afterwards.
+
+    - `trie`: the directory tree, for patterns with a literal prefix.
+    - `extensions`: entries by extension, for patterns like `**/*.png`.
+    - `depths`: entries by number of path segments, for patterns like `*`.
+    - `types`: entries by type, for queries like `{type: file}`.
+    - `sorted_by(field)`: entries sorted by an integer field, such as
+      `size` or `mtime_ns`, for range queries.
+    """
+
+    def __init__(
+        self,
+        paths: Sequence[Optional[str]],
+        types: Optional[Sequence[Optional[str]]] = None,
+        column: Optional[Callable[[str], Sequence]] = None,
+    ):
+        self.paths = paths
+        self._types_column = types
+        # Returns the values of any other field, for range indexes
+        self._column = column
+        self._trie: Optional[PathTrie] = None
+        self._extensions: Optional[Dict[str, List[int]]] = None
+        self._depths: Optional[Dict[int, List[int]]] = None
+        self._types: Optional[Dict[Optional[str], List[int]]] = None
+        self._sorted: Dict[str, Tuple[array, array]] = {}
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Snapshot) -> "SnapshotIndex":
+        return cls(
+            [metadata.get("path") for metadata in snapshot],
+            [metadata.get("type") for metadata in snapshot],
+            lambda field: [metadata.get(field) for metadata in snapshot],
+        )
+
+    @property
+    def trie(self) -> PathTrie:
+        if self._trie is None:
+            self._trie = PathTrie(self.paths)
+        return self._trie
+
+    @property
+    def extensions(self) -> Dict[str, List[int]]:
+        if self._extensions is None:
+            self._extensions = _group(
+                None if path is None else _extension(path.rstrip("/"))
+                for path in self.paths
+            )
+        return self._extensions
+
+    @property
+    def depths(self) -> Dict[int, List[int]]:
+        if self._depths is None:
+            self._depths = _group(
+                None if path is None else path.rstrip("/").count("/") + 1
+                for path in self.paths
+            )
+        return self._depths
+
+    @property
+    def types(self) -> Dict[Optional[str], List[int]]:
+        if self._types is None:
+            # Without a types column, no entry has a type
+            self._types = _group(self._types_column or ())
+        return self._types
+
+    def _candidates(
+        self, plan: GlobPlan, skip: Optional[Callable] = None
+    ) -> Tuple[List[int], bool]:
+        """
+        Indices of the entries that could match a pattern with `plan`, and
+        whether they are in snapshot order.
+        """
+        prefix, depth, extension = plan
+        if prefix or plan == FULL_PLAN:
+            return self.trie.candidates(prefix, depth, skip), False
+        options = []
+        if depth is not None:
+            options.append(self.depths.get(depth, []))
+        if extension is not None:
+            options.append(self.extensions.get(extension, []))
+        return min(options, key=len), True
+
+    def glob(
+        self, patterns: Patterns, exclude: Optional[Patterns] = None
+    ) -> Optional[List[int]]:
+        """
+        Return the indices of the entries that match glob `patterns`, and
+        none of `exclude`, in snapshot order. Only entries under the literal
+        directory prefix of each pattern, or with its extension or depth,
+        are checked, and subtrees that `exclude` rules out entirely, such
+        as `scratch/**`, are never visited. Returns None if the index cannot
+        narrow down the entries to check.
+        """
+        plans = _plan(_freeze(patterns))
+        skip = prune_matcher(patterns, exclude)
+        if plans is None or (skip is None and FULL_PLAN in plans):
+            return None
+        match = compile_glob(patterns, exclude=exclude)
+        paths = self.paths
+        if len(plans) == 1:
+            candidates, ordered = self._candidates(plans[0], skip)
+            if ordered:
+                return [i for i in candidates if match(paths[i])]
+        else:
+            candidates = set()
+            for plan in plans:
+                candidates.update(self._candidates(plan, skip)[0])
+        if skip is None and len(candidates) > len(paths) // 2:
+            # Sorting would cost more than checking every entry
+            return [i for i, path in enumerate(paths) if path and match(path)]
+        return [i for i in sorted(candidates) if match(paths[i])]
+
+    def of_type(self, file_type: Optional[str]) -> List[int]:
+        """Return the indices of the entries of type `file_type`."""
+        return self.types.get(file_type, [])
+
+    def sorted_by(self, field: str) -> Tuple[array, array]:
+        """
+        Return the values of integer `field`, sorted, and the index of the
+        entry of each value. Entries without a value are left out.
+        """
+        if field not in self._sorted:
+            values = [] if self._column is None else self._column(field)
+            pairs = sorted(
+                (value, i) for i, value in enumerate(values) if value is not None
+            )
+            self._sorted[field] = (
+                array("q", (value for value, _ in pairs)),
+                array("q", (i for _, i in pairs)),
+            )
+        return self._sorted[field]
+
+    def in_range(
+        self, field: str, min: Optional[int] = None, max: Optional[int] = None
+    ) -> List[int]:
+        """
+        Return the indices of the entries whose integer `field` is between
+        `min` and `max`, inclusive, in snapshot order, so that indexed and
+        unindexed snapshots filter alike. Costs O(log n + k log k) for k
+        entries in the range, once the field is sorted.
+        """
+        values, indices = self.sorted_by(field)
+        lo = 0 if min is None else bisect_left(values, min)
+        hi = len(values) if max is None else bisect_right(values, max)
+        return sorted(indices[lo:hi])
+
+
+class IndexedSnapshot(list):
+    """
+    A Snapshot with a SnapshotIndex, which is built on first use. Queries
+    use the index to avoid scanning every entry.
+    """
+
+    _index: Optional[SnapshotIndex] = None
+
+    @property
+    def snapshot_index(self) -> SnapshotIndex:
+        if self._index is None:
+            self._index = SnapshotIndex.from_snapshot(self)
+        return self._index
+
+
+def get_index(snapshot: Sequence) -> Optional[SnapshotIndex]:
+    """Return the SnapshotIndex of `snapshot`, if it has one."""
+    index = getattr(snapshot, "snapshot_index", None)
+    return index if isinstance(index, SnapshotIndex) else None
+
+
+def select(snapshot: Sequence, indices: List[int]) -> Snapshot:
+    """Return the entries of `snapshot` at `indices`."""
+    take = getattr(snapshot, "take", None)
+    if take is not None:
+        return take(indices)
+    return [snapshot[i] for i in indices]
@@ -1,33 +1,59 @@
 import sys
 import json
 import yaml
-from typing import List, Dict, Any, Optional, Union, Tuple
+from collections.abc import Sequence as SequenceABC
+from typing import List, Dict, Any, Iterable, Optional, Union, Tuple
 from rich import print as rprint
 from rich.console import Console
 from rich.table import Table
 from .manifest import Manifest, Rule
-from .snapshot import Snapshot, create_snapshot, PathLike
+from .constraint import (
+    Accumulator,
+    EvalConstraint,
+    RegexConstraint,
+    RegexBatch,
+)
+from .constraint.pool import validate_eval_constraints
+from .config import config
+from .snapshot import Snapshot, iter_snapshot, PathLike
+from .serialize import is_snapshot_file, load_snapshot
+from .index import IndexedSnapshot
+from .planner import QueryCache, QueryPlan, descend_filter
 from .result import ValidationResult
 from .registry import find_manifest
+from .diff import SnapshotDiff
 from .error import DJFileValidatorError
+from .log import logger
+
 
 ErrorReport = List[Dict[str, Any]]
 
 
 def validate(
-    target: Union[Snapshot, PathLike],
+    target: Union[Snapshot, Iterable[Dict[str, Any]], PathLike],
     manifest: Union[Manifest, PathLike],
     verbose=False,
     raise_err=False,
     format="table",
+    cache: Optional[QueryCache] = None,
 ) -> Tuple[bool, ErrorReport]:
     """
     Validate a target against a manifest.
 
     Parameters
     ----------
-    target : PathLike | Snapshot
-        A path to a file or directory, or an instance of a Snapshot object.
+    target : PathLike | Snapshot | Iterable[Dict[str, Any]]
+        A path to a file or directory, a path to a snapshot file saved with
+        `serialize.save_snapshot`, an instance of a Snapshot object, or
+        an iterable of snapshot entries, such as `snapshot.iter_snapshot`.
+        Paths are walked as a stream. Entries that match rules whose
+        constraints all validate a stream (see `Rule.start`) are not kept,
+        but rules with other constraints, such as `eval`, keep every entry
+        their query matches until they are validated, which for a rule
+        matching `**` is the whole fileset. Entries are only stat'ed if the
+        manifest needs a size or timestamp (see `Manifest.fields`).
+        Directories that no rule's query can match inside, or that the
+        manifest ignores, are not walked (see `planner.descend_filter`).
     manifest : PathLike | Manifest
         Path to a manifest file, or an instance of a Manifest object.
     verbose : bool
@@ -36,6 +62,9 @@ def validate(
         Raise an error if validation fails.
     format : str
         Format for error report. One of "table", "yaml", or "json".
+    cache : QueryCache, optional
+        Cache for the results of queries, as in `validate_rules`. Pass a
+        cache to read its hit and miss counters afterwards.
 
     Returns
     -------
@@ -48,12 +77,19 @@ def validate(
     else:
         mani = Manifest.from_yaml(find_manifest(manifest))
 
-    # Infer how to create snapshot
-    if isinstance(target, str):
-        target = create_snapshot(target)
+    # Infer how to create snapshot, collecting only the fields and walking
+    # only the directories that are needed
+    if isinstance(target, str) and is_snapshot_file(target):
+        target = load_snapshot(target)
+    elif isinstance(target, str):
+        target = iter_snapshot(
+            target,
+            fields=mani.fields,
+            descend=descend_filter([rule.query for rule in mani.rules]),
+        )
 
     return validate_snapshot(
-        target, mani, verbose=verbose, raise_err=raise_err, format=format
+        target, mani, verbose=verbose, raise_err=raise_err, format=format, cache=cache
     )
 
 
@@ -82,37 +118,267 @@ def table_from_report(report: ErrorReport) -> Table:
     return table
 
 
-def validate_snapshot(
+def validate_rules(
+    snapshot: Union[Snapshot, Iterable[Dict[str, Any]]],
+    manifest: Manifest,
+    cache: Optional[QueryCache] = None,
+) -> List[Dict[str, ValidationResult]]:
+    """
+    Validate a snapshot against every rule in a manifest.
+
+    Parameters
+    ----------
+    snapshot : Snapshot | Iterable[Dict[str, Any]]
+        A snapshot, or an iterable of snapshot entries. The queries of all
+        rules are filtered in a single pass over the snapshot, so iterables
+        are consumed once. Lists are indexed, so that queries the index can
+        answer only check the entries they could match. Entries of
+        iterables that are not sequences are streamed to the constraints
+        that support it (see `Rule.start`), and only kept for rules with
+        other constraints, such as `eval`.
+    manifest : Manifest
+        The manifest to validate against.
+    cache : QueryCache, optional
+        Cache for the results of queries against the snapshot. Rules with
+        identical queries share a result, which is evaluated once. Pass a
+        cache to read its hit and miss counters afterwards. Iterables that
+        are streamed are not kept in the cache, but rules with identical
+        queries still share one check of each entry, counted as a hit.
+
+    Returns
+    -------
+    results : List[Dict[str, ValidationResult]]
+        For each rule, the result of each of its constraints.
+    """
+    if isinstance(snapshot, list) and not isinstance(snapshot, IndexedSnapshot):
+        # Rules share one index of the snapshot, built when first needed
+        snapshot = IndexedSnapshot(snapshot)
+    if cache is None:
+        cache = QueryCache()
+    plan = QueryPlan([rule.query for rule in manifest.rules])
+    if isinstance(snapshot, SequenceABC):
+        filtered_snapshots = plan.filter(snapshot, cache=cache)
+        streamed: List[Dict[str, ValidationResult]] = [{} for _ in manifest.rules]
+    else:
+        filtered_snapshots, streamed = _stream_rules(
+            manifest.rules, plan, snapshot, cache
+        )
+    logger.debug(f"Query cache: {cache.hits} hits, {cache.misses} misses")
+    batched = _validate_regex_rules(manifest.rules, filtered_snapshots)
+    for results, rule_streamed in zip(batched, streamed):
+        results.update(rule_streamed)
+    if config.eval_workers:
+        # Eval rules run in parallel in worker processes
+        eval_results = _validate_eval_rules(manifest.rules, filtered_snapshots)
+        for results, rule_eval_results in zip(batched, eval_results):
+            results.update(rule_eval_results)
+    return [
+        rule.validate_constraints(filtered_snapshot, results)
+        for rule, filtered_snapshot, results in zip(
+            manifest.rules, filtered_snapshots, batched
+        )
+    ]
+
+
+def _stream_rules(
+    rules: List[Rule],
+    plan: QueryPlan,
+    entries: Iterable[Dict[str, Any]],
+    cache: QueryCache,
+) -> Tuple[List[Optional[Snapshot]], List[Dict[str, ValidationResult]]]:
+    """
+    Validate rules in a single pass over `entries`, streaming the entries
+    that match each rule's query to the accumulators of its constraints.
+    The regex constraints of all streamed rules are batched (see
+    `RegexBatch`).
+    Rules with a constraint that cannot stream get a filtered snapshot
+    instead. Returns the filtered snapshot of each rule, or None if it
+    streamed, and the results of the rules that streamed.
+
+    Filtered snapshots are not kept, so `cache` is not consulted, but
+    rules with identical queries share a bucket of the plan, which counts
+    as a hit, and each bucket as a miss.
+    """
+    cache.misses += plan.n_buckets
+    cache.hits += len(plan.queries) - plan.n_buckets
+    accumulators = [rule.start() for rule in rules]
+    # Regex constraints of all streamed rules match each entry's path once
+    members = _regex_members(
+        rules, [rule_accumulators is not None for rule_accumulators in accumulators]
+    )
+    if members:
+        batch = RegexBatch([constraint for _, constraint in members])
+        for k, (i, constraint) in enumerate(members):
+            accumulators[i][constraint.name] = batch.start(k)
+
+    def consumer(rule_accumulators: Dict[str, Accumulator]):
+        updates = [accumulator.update for accumulator in rule_accumulators.values()]
+
+        def consume(entry: Dict[str, Any]):
+            for update in updates:
+                update(entry)
+
+        return consume
+
+    filtered_snapshots = plan.stream(
+        entries,
+        [
+            None if rule_accumulators is None else consumer(rule_accumulators)
+            for rule_accumulators in accumulators
+        ],
+    )
+    results = [
+        {}
+        if rule_accumulators is None
+        else {
+            name: accumulator.finish()
+            for name, accumulator in rule_accumulators.items()
+        }
+        for rule_accumulators in accumulators
+    ]
+    return filtered_snapshots, results
+
+
+def _regex_members(
+    rules: List[Rule], streamed: List[bool]
+) -> List[Tuple[int, RegexConstraint]]:
+    """
+    Return the regex constraints of the rules that are `streamed`, or that
+    are not, with the index of their rule, if there are enough of them to
+    batch.
+    """
+    members = [
+        (i, constraint)
+        for i, (rule, rule_streamed) in enumerate(zip(rules, streamed))
+        if rule_streamed
+        for constraint in rule.constraints
+        if isinstance(constraint, RegexConstraint)
+    ]
+    return members if len(members) >= 2 else []
+
+
+def _validate_regex_rules(
+    rules: List[Rule], filtered_snapshots: List[Optional[Snapshot]]
+) -> List[Dict[str, ValidationResult]]:
+    """
+    Validate the regex constraints of all rules that were not streamed in a
+    single batch, matching each path against every pattern once, whichever
+    rules' queries matched it (see `RegexBatch`). Returns the results of the
+    batched constraints of each rule.
+    """
+    members = _regex_members(
+        rules,
+        [filtered_snapshot is not None for filtered_snapshot in filtered_snapshots],
+    )
+    results: List[Dict[str, ValidationResult]] = [{} for _ in rules]
+    if not members:
+        return results
+    batch = RegexBatch([constraint for _, constraint in members], keep_matches=True)
+    for k, (i, constraint) in enumerate(members):
+        results[i][constraint.name] = batch.validate(k, filtered_snapshots[i])
+    return results
+
+
+def _validate_eval_rules(
+    rules: List[Rule], filtered_snapshots: List[Snapshot]
+) -> List[Dict[str, ValidationResult]]:
+    """
+    Validate the eval constraints of all rules in parallel, in a pool of
+    `config.eval_workers` processes. See `validate_eval_constraints`.
+    Returns the results of the eval constraints of each rule.
+    """
+    members = [
+        (i, constraint)
+        for i, rule in enumerate(rules)
+        for constraint in rule.constraints
+        if isinstance(constraint, EvalConstraint)
+    ]
+    results: List[Dict[str, ValidationResult]] = [{} for _ in rules]
+    pool_results = validate_eval_constraints(
+        [(constraint, filtered_snapshots[i]) for i, constraint in members]
+    )
+    for (i, constraint), result in zip(members, pool_results):
+        results[i][constraint.name] = result
+    return results
+
+
+def revalidate_rules(
     snapshot: Snapshot,
     manifest: Manifest,
+    previous: List[Dict[str, ValidationResult]],
+    diff: SnapshotDiff,
+) -> List[Dict[str, ValidationResult]]:
+    """
+    Validate a snapshot that changed by `diff` since it was validated
+    against the same manifest, reusing the `previous` results of rules that
+    are not affected by the change. See `Rule.revalidate`.
+
+    Parameters
+    ----------
+    snapshot : Snapshot
+        The current snapshot.
+    manifest : Manifest
+        The manifest that `previous` was validated against.
+    previous : List[Dict[str, ValidationResult]]
+        Results from `validate_rules` or `revalidate_rules`.
+    diff : SnapshotDiff
+        Changes since the snapshot that `previous` was validated against,
+        such as from `diff.diff_snapshots`.
+
+    Returns
+    -------
+    results : List[Dict[str, ValidationResult]]
+        For each rule, the result of each of its constraints.
+    """
+    if len(previous) != len(manifest.rules):
+        raise ValueError(
+            f"Expected previous results for {len(manifest.rules)} rules, "
+            f"got {len(previous)}"
+        )
+    results = [
+        rule.revalidate(snapshot, rule_results, diff)
+        for rule, rule_results in zip(manifest.rules, previous)
+    ]
+    n_reused = sum(
+        result is rule_results for result, rule_results in zip(results, previous)
+    )
+    logger.debug(f"Reused results of {n_reused}/{len(results)} rules")
+    return results
+
+
+def report_results(
+    results: List[Dict[str, ValidationResult]],
+    manifest: Manifest,
     verbose=False,
     raise_err=False,
     format="table",
+    cache: Optional[QueryCache] = None,
 ) -> Tuple[bool, ErrorReport]:
     """
-    Validate a snapshot against a manifest.
+    Generate an error report from the `results` of validating against
+    a manifest, such as from `validate_rules`.
 
     Parameters
     ----------
-    snapshot : Snapshot
-        A snapshot dictionary.
-    manifest_path : PathLike
-        Path to a manifest file.
+    results : List[Dict[str, ValidationResult]]
+        For each rule of the manifest, the result of each of its constraints.
+    manifest : Manifest
+        The manifest that was validated against.
     verbose : bool
         Print verbose output.
     raise_err : bool
         Raise an error if validation fails.
     format : str
         Format for error report. One of "table", "yaml", or "json".
+    cache : QueryCache, optional
+        The query cache used to validate. If verbose, its hit and miss
+        counters are printed with the report.
 
     Returns
     -------
     result : dict
         A dictionary with the validation result.
     """
-    results: List[Dict[str, ValidationResult]] = list(
-        map(lambda rule: rule.validate(snapshot), manifest.rules)
-    )
     success = all(map(lambda result: all(result.values()), results))
 
     # Generate error report
@@ -130,6 +396,11 @@ def validate_snapshot(
                     "errors": valresult.message,
                 }
             )
+    if verbose and cache is not None:
+        rprint(
+            f"Query cache: {cache.hits} hits, {cache.misses} misses",
+            file=sys.stderr,
+        )
     if verbose and not success:
         rprint("Validation failed with the following errors:", file=sys.stderr)
         if format == "table":
@@ -146,3 +417,48 @@ def validate_snapshot(
         raise DJFileValidatorError("Validation failed.")
 
     return success, error_report
+
+
+def validate_snapshot(
+    snapshot: Union[Snapshot, Iterable[Dict[str, Any]]],
+    manifest: Manifest,
+    verbose=False,
+    raise_err=False,
+    format="table",
+    cache: Optional[QueryCache] = None,
+) -> Tuple[bool, ErrorReport]:
+    """
+    Validate a snapshot against a manifest.
+
+    Parameters
+    ----------
+    snapshot : Snapshot | Iterable[Dict[str, Any]]
+        A snapshot, or an iterable of snapshot entries. Iterables that are
+        not sequences are consumed in a single pass.
+    manifest_path : PathLike
+        Path to a manifest file.
+    verbose : bool
+        Print verbose output.
+    raise_err : bool
+        Raise an error if validation fails.
+    format : str
+        Format for error report. One of "table", "yaml", or "json".
+    cache : QueryCache, optional
+        Cache for the results of queries, as in `validate_rules`. Pass a
+        cache to read its hit and miss counters afterwards.
+
+    Returns
+    -------
+    result : dict
+        A dictionary with the validation result.
+    """
+    if cache is None:
+        cache = QueryCache()
+    return report_results(
+        validate_rules(snapshot, manifest, cache=cache),
+        manifest,
+        verbose=verbose,
+        raise_err=raise_err,
+        format=format,
+        cache=cache,
+    )
@@ -1,6 +1,6 @@
 import yaml
-from dataclasses import dataclass, field, asdict
-from typing import Dict, List, Any, Optional, Tuple
+from dataclasses import dataclass, field, asdict, replace
+from typing import Dict, FrozenSet, List, Any, Optional, Tuple
 from pathlib import Path
 from cerberus import Validator, schema_registry
 from pprint import pformat as pf
@@ -10,6 +10,7 @@ from .result import ValidationResult
 from .snapshot import Snapshot, PathLike, FileMetadata
 from .config import config
 from .rule import Rule
+from .query import exclude_paths
 from .hash_utils import generate_id
 from .log import logger
 
@@ -27,15 +28,30 @@ class Manifest:
     description: Optional[str] = None
     uri: Optional[str] = None
     rules: List[Rule] = field(default_factory=list)
+    # Glob patterns of paths that no rule matches, nor anything inside them
+    ignore: List[str] = field(default_factory=list)
     # Additional, unchecked metadata for the manifest
     _meta: Dict[str, Any] = field(default_factory=dict)
 
     def __post_init__(self):
+        if self.ignore:
+            self.rules = [
+                replace(rule, query=exclude_paths(rule.query, self.ignore))
+                for rule in self.rules
+            ]
         if not self.id:
             self.id = generate_id(self)
 
     def __hash__(self):
-        return hash((self.id, self.version, tuple(self.rules)))
+        return hash((self.id, self.version, tuple(self.rules), tuple(self.ignore)))
+
+    @property
+    def fields(self) -> FrozenSet[str]:
+        """
+        Fields of a Snapshot entry that any rule in this manifest reads.
+        Only these fields need to be collected when taking a snapshot.
+        """
+        return frozenset().union(*(rule.fields for rule in self.rules))
 
     @staticmethod
     def _update_cerberus_schema_registry():
@@ -93,6 +109,7 @@ class Manifest:
             version=d.get("version"),
             description=d.get("description"),
             rules=[Rule.from_dict(rule) for rule in d.get("rules", [])],
+            ignore=d.get("ignore", []),
         )
         return self_
 
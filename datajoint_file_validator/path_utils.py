@@ -1,21 +1,83 @@
-from typing import List, Generator
+import re
+from functools import lru_cache
+from typing import Callable, Iterable, List, Generator, Optional, Sequence, Union
 import os.path
 from .snapshot import FileMetadata, Snapshot
 from wcmatch import glob
 
 GLOB_FLAGS = glob.GLOBSTAR | glob.MARK | glob.FOLLOW
 
+Patterns = Union[str, Sequence[str]]
+
+
+class GlobMatcher:
+    """
+    Glob patterns compiled to a single regular expression. Matches a path
+    exactly as `wcmatch.glob.globmatch` would with the same patterns and
+    flags, without touching the filesystem.
+    """
+
+    __slots__ = ("_include", "_exclude")
+
+    def __init__(
+        self, patterns: Patterns, flags: int = GLOB_FLAGS, exclude: Patterns = None
+    ):
+        include, exclude = glob.translate(patterns, flags=flags, exclude=exclude)
+        self._include = self._compile(include)
+        self._exclude = self._compile(exclude)
+
+    @staticmethod
+    def _compile(regexes: List[str]) -> Optional[Callable]:
+        if not regexes:
+            return None
+        return re.compile("|".join(f"(?:{regex})" for regex in regexes)).fullmatch
+
+    def __call__(self, path: str) -> bool:
+        """Check if `path` matches."""
+        if self._include is None or self._include(path) is None:
+            return False
+        return self._exclude is None or self._exclude(path) is None
+
+    def filter(self, paths: Iterable[str]) -> List[str]:
+        """Return the paths that match, in a single pass."""
+        return [path for path in paths if self(path)]
+
+
+def _freeze(patterns: Optional[Patterns]):
+    if patterns is None or isinstance(patterns, (str, bytes)):
+        return patterns
+    return tuple(patterns)
+
+
+@lru_cache(maxsize=1024)
+def _compile_glob(patterns, flags: int, exclude) -> GlobMatcher:
+    return GlobMatcher(patterns, flags=flags, exclude=exclude)
+
+
+def compile_glob(
+    patterns: Patterns, flags: int = GLOB_FLAGS, exclude: Optional[Patterns] = None
+) -> GlobMatcher:
+    """
+    Compile glob `patterns` to a GlobMatcher. Matchers are cached, so each
+    distinct set of patterns is only compiled once.
+    """
+    return _compile_glob(_freeze(patterns), flags, _freeze(exclude))
+
 
 def find_matching_paths(filenames, patterns, flags=GLOB_FLAGS, **kw):
-    return glob.globfilter(filenames, patterns, flags=flags, **kw)
+    if set(kw) - {"exclude"}:
+        return glob.globfilter(filenames, patterns, flags=flags, **kw)
+    return compile_glob(patterns, flags, **kw).filter(filenames)
+
+
+def path_matches(filename, patterns, flags=GLOB_FLAGS, **kw) -> bool:
+    if set(kw) - {"exclude"}:
+        return glob.globmatch(filename, patterns, flags=flags, **kw)
+    return compile_glob(patterns, flags, **kw)(filename)
 
 
 def find_matching_files(
-    snapshot: Snapshot, patterns
+    snapshot: Snapshot, patterns, exclude=None
 ) -> Generator[FileMetadata, None, None]:
-    filenames = [file.get("path") for file in snapshot]
-    return (
-        file
-        for file in snapshot
-        if file.get("path") in set(find_matching_paths(filenames, patterns))
-    )
+    match = compile_glob(patterns, exclude=exclude)
+    return (file for file in snapshot if match(file.get("path")))
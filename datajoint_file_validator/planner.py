@@ -0,0 +1,375 @@
+from collections.abc import Sequence as SequenceABC
+from functools import lru_cache
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+from .snapshot import Snapshot
+from .query import Query, GlobQuery, TypeQuery, CompositeQuery
+from .path_utils import GlobMatcher, compile_glob, _freeze
+from .index import get_index, glob_plan, prune_matcher, _extension, _plan
+from .walker import DescendFilter
+
+# Distinct glob patterns that an entry must match, and types it must have.
+# Glob patterns are pairs of patterns to include and to exclude.
+Condition = Tuple[Tuple[int, ...], Tuple[Any, ...]]
+
+
+def _decompose(query: Query) -> Optional[Tuple[List[Any], List[Any]]]:
+    """
+    Split a query into the glob patterns and types that an entry must
+    match. Returns None for queries that are not made of GlobQuery and
+    TypeQuery parts.
+    """
+    if isinstance(query, GlobQuery):
+        return [query.patterns], []
+    if isinstance(query, TypeQuery):
+        return [], [] if query.file_type is None else [query.file_type]
+    if isinstance(query, CompositeQuery):
+        globs, types = [], []
+        for part in query.parts:
+            parts = _decompose(part)
+            if parts is None:
+                return None
+            globs.extend(parts[0])
+            types.extend(parts[1])
+        return globs, types
+    return None
+
+
+def _is_hashable(query: Query) -> bool:
+    try:
+        hash(query)
+    except TypeError:
+        # Such as a GlobQuery with a list of patterns
+        return False
+    return True
+
+
+class QueryCache:
+    """
+    Results of queries against one snapshot, by query. Rules with identical
+    queries, such as the default query of rules that do not set one, share
+    one result, and the query is only evaluated once. Use one cache per
+    validation; it is cleared if used with a different snapshot.
+    """
+
+    def __init__(self):
+        self.results: Dict[Query, Snapshot] = {}
+        # Number of queries answered from the cache, and evaluated
+        self.hits = 0
+        self.misses = 0
+        self._snapshot: Any = None
+
+    def bind(self, snapshot: Any):
+        """Use this cache for queries against `snapshot`."""
+        if snapshot is not self._snapshot:
+            self.results.clear()
+            self._snapshot = snapshot
+
+
+class QueryPlan:
+    """
+    A plan to filter a snapshot by many queries in a single pass.
+
+    The glob patterns of all queries are deduplicated and compiled once.
+    Each entry is only matched against the patterns that could match it:
+    patterns that end in a literal extension, like `**/*.png`, are looked
+    up by the extension of the entry, and patterns with a literal directory
+    prefix are skipped unless the entry's path starts with it. Queries with
+    the same patterns and types share one filtered snapshot.
+    """
+
+    def __init__(self, queries: Sequence[Query]):
+        self.queries = list(queries)
+        self._matchers: List[GlobMatcher] = []
+        glob_ids: Dict[Any, int] = {}
+        # Queries with the same condition share a bucket of entries. Each
+        # bucket is checked once per entry, for the first query in it.
+        self._buckets: List[int] = []
+        self._checks: List[Tuple[int, Query, Optional[Condition]]] = []
+        bucket_ids: Dict[Condition, int] = {}
+        for query in self.queries:
+            parts = _decompose(query)
+            condition = None
+            if parts is not None:
+                globs, types = parts
+                ids = []
+                for key in globs:
+                    if key not in glob_ids:
+                        glob_ids[key] = len(self._matchers)
+                        include, exclude = key
+                        self._matchers.append(compile_glob(include, exclude=exclude))
+                    ids.append(glob_ids[key])
+                condition = (tuple(sorted(set(ids))), tuple(types))
+                if condition in bucket_ids:
+                    self._buckets.append(bucket_ids[condition])
+                    continue
+                bucket_ids[condition] = len(self._checks)
+            self._buckets.append(len(self._checks))
+            self._checks.append((len(self._checks), query, condition))
+
+        # Patterns to check for every entry, and by extension of the entry,
+        # each with the literal directory prefix of matching paths, if any
+        self._unguarded: List[Tuple[int, Optional[str]]] = []
+        self._by_extension: Dict[str, List[Tuple[int, Optional[str]]]] = {}
+        for (include, _), glob_id in glob_ids.items():
+            plans = glob_plan(include)
+            if plans is None or len(plans) > 1:
+                self._unguarded.append((glob_id, None))
+                continue
+            prefix, _, extension = plans[0]
+            prefix = "/".join(prefix) + "/" if prefix else None
+            if extension is None:
+                self._unguarded.append((glob_id, prefix))
+            else:
+                self._by_extension.setdefault(extension, []).append((glob_id, prefix))
+
+    @property
+    def n_buckets(self) -> int:
+        """
+        Number of buckets of entries, each checked once per entry. Queries
+        with the same patterns and types share a bucket.
+        """
+        return len(self._checks)
+
+    def _matched_globs(self, path: Optional[str]) -> set:
+        """Return the ids of the glob patterns that `path` matches."""
+        matched = set()
+        if path is None:
+            return matched
+        globs = self._unguarded
+        if self._by_extension:
+            name = path.rstrip("/")
+            extension = _extension(name[name.rfind("/") + 1 :])
+            globs = globs + self._by_extension.get(extension, [])
+        matchers = self._matchers
+        for glob_id, prefix in globs:
+            if prefix is not None and not path.startswith(prefix):
+                continue
+            if matchers[glob_id](path):
+                matched.add(glob_id)
+        return matched
+
+    def scan(self, snapshot: Union[Snapshot, Iterable[Dict]]) -> List[Snapshot]:
+        """
+        Filter a snapshot by every query in a single pass. Returns the
+        filtered snapshot of each query, in order. Matching entries are
+        kept in a list for each distinct query, so an iterable is consumed
+        once but not in bounded memory; see `stream` to pass entries on
+        instead of keeping them.
+        """
+        return self.stream(snapshot, [None] * len(self.queries))
+
+    def stream(
+        self,
+        snapshot: Union[Snapshot, Iterable[Dict]],
+        consumers: Sequence[Optional[Callable[[Dict], None]]],
+    ) -> List[Optional[Snapshot]]:
+        """
+        Filter a snapshot by every query in a single pass, passing each
+        entry that matches a query to its consumer, if it has one, such as
+        `Accumulator.update`. Only the entries of queries without a
+        consumer are kept. Returns the filtered snapshot of each query
+        without a consumer, and None for the others, in order.
+        """
+        by_index = isinstance(snapshot, SequenceABC) and hasattr(snapshot, "take")
+        keep = [False] * len(self._checks)
+        feeds: List[List[Callable[[Dict], None]]] = [[] for _ in self._checks]
+        for bucket, consumer in zip(self._buckets, consumers):
+            if consumer is None:
+                keep[bucket] = True
+            else:
+                feeds[bucket].append(consumer)
+        buckets: List[List] = [[] for _ in self._checks]
+        checks = [
+            (bucket, query, condition, feeds[bucket], keep[bucket])
+            for bucket, query, condition in self._checks
+            if feeds[bucket] or keep[bucket]
+        ]
+        for i, metadata in enumerate(snapshot):
+            matched = self._matched_globs(metadata.get("path"))
+            file_type = metadata.get("type")
+            item = i if by_index else metadata
+            for bucket, query, condition, feed, kept in checks:
+                if condition is None:
+                    if not query.match(metadata):
+                        continue
+                elif not matched.issuperset(condition[0]) or any(
+                    file_type != t for t in condition[1]
+                ):
+                    continue
+                for consume in feed:
+                    consume(metadata)
+                if kept:
+                    buckets[bucket].append(item)
+        if by_index:
+            buckets = [
+                snapshot.take(indices) if kept else indices
+                for indices, kept in zip(buckets, keep)
+            ]
+        return [
+            buckets[bucket] if consumer is None else None
+            for bucket, consumer in zip(self._buckets, consumers)
+        ]
+
+    def filter(
+        self,
+        snapshot: Union[Snapshot, Iterable[Dict]],
+        cache: Optional[QueryCache] = None,
+    ) -> List[Snapshot]:
+        """
+        Filter a snapshot by every query. Each distinct query is evaluated
+        once, and its result is stored in `cache`, if given. If the
+        snapshot is indexed, queries that the index can answer filter it
+        directly, and the rest are filtered in a single pass. Returns the
+        filtered snapshot of each query, in order.
+        """
+        if cache is None:
+            cache = QueryCache()
+        cache.bind(snapshot)
+        results: List[Optional[Snapshot]] = [None] * len(self.queries)
+        evaluated, pending = [], set()
+        for i, query in enumerate(self.queries):
+            if _is_hashable(query):
+                if query in cache.results or query in pending:
+                    cache.hits += 1
+                    continue
+                pending.add(query)
+            cache.misses += 1
+            evaluated.append(i)
+
+        index = get_index(snapshot)
+        scanned = []
+        for i in evaluated:
+            query = self.queries[i]
+            if index is not None and query.uses_index:
+                results[i] = query.filter(snapshot)
+            else:
+                scanned.append(i)
+        if scanned:
+            plan = QueryPlan([self.queries[i] for i in scanned])
+            for i, filtered in zip(scanned, plan.scan(snapshot)):
+                results[i] = filtered
+        for i in evaluated:
+            if _is_hashable(self.queries[i]):
+                cache.results[self.queries[i]] = results[i]
+        return [
+            cache.results[query] if result is None else result
+            for query, result in zip(self.queries, results)
+        ]
+
+
+# Segments of a glob pattern, each with a matcher for a single directory
+# name, or None for `**`
+Segments = Tuple[Tuple[str, Optional[GlobMatcher]], ...]
+
+
+@lru_cache(maxsize=1024)
+def _segments(include) -> Optional[Tuple[Segments, ...]]:
+    """
+    Split each of the `include` patterns into segments. Returns None if
+    any pattern can match inside every directory, such as `**/*.png`, or
+    cannot be matched one directory at a time.
+    """
+    if _plan(include) is None:
+        return None
+    if isinstance(include, str):
+        include = (include,)
+    split = []
+    for pattern in include:
+        names = pattern.rstrip("/").split("/")
+        if names[0] == "**" or "\\" in pattern:
+            return None
+        if any(name.count("[") != name.count("]") for name in names):
+            # A character class that spans a slash
+            return None
+        split.append(
+            tuple(
+                (name, None if name == "**" else compile_glob(name)) for name in names
+            )
+        )
+    return tuple(split)
+
+
+def _skip_globstars(segments: Segments, states: Iterable[int]) -> set:
+    """Add the states that `**` reaches by matching no directories."""
+    skipped = set()
+    for j in states:
+        while j < len(segments) and segments[j][1] is None:
+            skipped.add(j)
+            j += 1
+        skipped.add(j)
+    return skipped
+
+
+def _can_match_inside(segments: Segments, names: List[str]) -> bool:
+    """
+    Check if a pattern with `segments` can match an entry inside the
+    directory at path `names`, by matching the names one at a time.
+    States are the number of segments matched so far.
+    """
+    states = _skip_globstars(segments, (0,))
+    for name in names:
+        matched = set()
+        for j in states:
+            if j == len(segments):
+                continue
+            segment, match = segments[j]
+            if match is None:
+                # Wildcards never match hidden names
+                if not name.startswith("."):
+                    matched.add(j)
+            elif match(name + "/"):
+                matched.add(j + 1)
+        if not matched:
+            return False
+        states = _skip_globstars(segments, matched)
+    return any(j < len(segments) for j in states)
+
+
+def descend_filter(queries: Sequence[Query]) -> Optional[DescendFilter]:
+    """
+    Return a filter for the directories whose contents can match any of
+    `queries`, to pass as `descend` to `snapshot.create_snapshot`. The
+    filter takes the relative path of a directory, such as `raw/`, and a
+    directory passes if any pattern could match inside it, as `raw/**`
+    does, and no exclude pattern prunes it, as `raw/cache/**` does. Returns
+    None if no directory can be skipped, such as for `**/*.csv`, or for
+    queries that are not made of GlobQuery and TypeQuery parts.
+    """
+    # For each query, the globs that must reach inside a directory
+    reach: List[List[Tuple[Optional[Tuple[Segments, ...]], Any]]] = []
+    for query in queries:
+        parts = _decompose(query)
+        if parts is None:
+            return None
+        globs = []
+        for include, exclude in parts[0]:
+            segments = _segments(_freeze(include))
+            prune = prune_matcher(include, exclude)
+            if segments is not None or prune is not None:
+                globs.append((segments, prune))
+        if not globs:
+            return None
+        reach.append(globs)
+
+    def reaches(rel_dir: str, segments, prune) -> bool:
+        if prune is not None and prune(rel_dir):
+            return False
+        if segments is None:
+            return True
+        names = rel_dir.rstrip("/").split("/")
+        return any(_can_match_inside(pattern, names) for pattern in segments)
+
+    def descend(rel_dir: str) -> bool:
+        return any(all(reaches(rel_dir, *glob) for glob in globs) for globs in reach)
+
+    return descend
@@ -1,11 +1,33 @@
 import os
-from typing import Generator, List, Dict, Optional
+import time
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+from typing import (
+    Any,
+    Callable,
+    FrozenSet,
+    Generator,
+    List,
+    Dict,
+    Optional,
+    Sequence,
+    Tuple,
+)
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from pathlib import PurePath
 from enum import Enum
-from .snapshot import Snapshot, PathLike
-from .path_utils import find_matching_files
+from .snapshot import Snapshot, PathLike, ALL_FIELDS
+from .columnar import ColumnarSnapshot
+from .path_utils import (
+    Patterns,
+    _freeze,
+    compile_glob,
+    find_matching_files,
+    find_matching_paths,
+    path_matches,
+)
+from .index import get_index, glob_plan, prune_matcher, select
 from .config import config
 from .error import InvalidQueryError
 
@@ -19,6 +41,37 @@ class Query(ABC):
         """Filter a Snapshot based on this query. Virtual method."""
         pass
 
+    def match(self, metadata: Dict) -> bool:
+        """Check if a single entry of a Snapshot matches this query."""
+        return bool(self.filter([metadata]))
+
+    def matcher(self) -> Callable[[Dict], bool]:
+        """Return a function that checks if a single entry matches this query."""
+        return self.match
+
+    @property
+    def fields(self) -> FrozenSet[str]:
+        """Fields of a Snapshot entry that this query reads."""
+        return ALL_FIELDS
+
+    @property
+    def cost(self) -> float:
+        """Relative cost of matching one entry, to order query parts."""
+        return 100.0
+
+    @property
+    def uses_index(self) -> bool:
+        """Whether this query filters an indexed snapshot without a scan."""
+        return False
+
+    @property
+    def time_relative(self) -> bool:
+        """
+        Whether the entries that match this query change as time passes,
+        even if the snapshot does not.
+        """
+        return False
+
     def __and__(self, other: "Query") -> "Query":
         """Combine two queries with an AND operator."""
         return CompositeQuery([self, other])
@@ -26,17 +79,81 @@ class Query(ABC):
 
 @dataclass(frozen=True)
 class GlobQuery(Query):
-    """A query that filters based on path. Includes support for glob wildcards."""
+    """
+    A query that filters based on path. Includes support for glob wildcards.
+    Entries that match any of the `exclude` patterns, or a pattern in `path`
+    that starts with `!`, are left out.
+    """
+
+    path: Patterns = config.default_query
+    exclude: Optional[Patterns] = None
 
-    path: str = config.default_query
+    @property
+    def patterns(self) -> Tuple[Patterns, Optional[Patterns]]:
+        """The patterns to include, and the patterns to exclude."""
+        return _split_negated(_freeze(self.path), _freeze(self.exclude))
 
     def filter(self, snapshot: Snapshot) -> Snapshot:
         """Filter a Snapshot based on this query."""
+        include, exclude = self.patterns
+        if self.uses_index:
+            index = get_index(snapshot)
+            if index is not None:
+                return select(snapshot, index.glob(include, exclude))
+        if isinstance(snapshot, ColumnarSnapshot):
+            paths = snapshot.column("path")
+            matched = set(find_matching_paths(paths, include, exclude=exclude))
+            return snapshot.take(i for i, path in enumerate(paths) if path in matched)
         return list(self._filter_generator(snapshot))
 
     def _filter_generator(self, snapshot: Snapshot) -> Generator:
         """Filter a Snapshot based on this query. Returns a generator."""
-        return find_matching_files(snapshot, self.path)
+        include, exclude = self.patterns
+        return find_matching_files(snapshot, include, exclude=exclude)
+
+    def match(self, metadata: Dict) -> bool:
+        """Check if a single entry of a Snapshot matches this query."""
+        include, exclude = self.patterns
+        return path_matches(metadata.get("path"), include, exclude=exclude)
+
+    def matcher(self) -> Callable[[Dict], bool]:
+        """Return a function that checks if a single entry matches this query."""
+        include, exclude = self.patterns
+        match = compile_glob(include, exclude=exclude)
+        return lambda metadata: match(metadata.get("path"))
+
+    @property
+    def fields(self) -> FrozenSet[str]:
+        """Fields of a Snapshot entry that this query reads."""
+        return frozenset(("path",))
+
+    @property
+    def cost(self) -> float:
+        """Relative cost of matching one entry, to order query parts."""
+        return 10.0
+
+    @property
+    def uses_index(self) -> bool:
+        """Whether this query filters an indexed snapshot without a scan."""
+        include, exclude = self.patterns
+        return (
+            glob_plan(include) is not None
+            or prune_matcher(include, exclude) is not None
+        )
+
+
+@lru_cache(maxsize=1024)
+def _split_negated(path, exclude) -> Tuple[Patterns, Optional[Patterns]]:
+    """Move patterns in `path` that start with `!` to `exclude`."""
+    patterns = (path,) if isinstance(path, str) else path
+    negated = tuple(pattern[1:] for pattern in patterns if pattern.startswith("!"))
+    if not negated:
+        return path, exclude
+    include = tuple(pattern for pattern in patterns if not pattern.startswith("!"))
+    if exclude is not None:
+        negated += (exclude,) if isinstance(exclude, str) else exclude
+    # Negated patterns alone exclude from the default query
+    return include or (config.default_query,), negated
 
 
 class FileType(Enum):
@@ -52,14 +169,202 @@ class TypeQuery(Query):
 
     def filter(self, snapshot: Snapshot) -> Snapshot:
         """Filter a Snapshot based on this query."""
+        if self.file_type is not None:
+            index = get_index(snapshot)
+            if index is not None:
+                return select(snapshot, index.of_type(self.file_type))
+        if isinstance(snapshot, ColumnarSnapshot):
+            if self.file_type is None:
+                return snapshot
+            return snapshot.take(
+                i
+                for i, file_type in enumerate(snapshot.column("type"))
+                if file_type == self.file_type
+            )
         return list(self._filter_generator(snapshot))
 
     def _filter_generator(self, snapshot: Snapshot) -> Generator:
         """Filter a Snapshot based on this query."""
         for metadata in snapshot:
-            if self.file_type is None or metadata.get("type") == self.file_type:
+            if self.match(metadata):
                 yield metadata
 
+    def match(self, metadata: Dict) -> bool:
+        """Check if a single entry of a Snapshot matches this query."""
+        return self.file_type is None or metadata.get("type") == self.file_type
+
+    def matcher(self) -> Callable[[Dict], bool]:
+        """Return a function that checks if a single entry matches this query."""
+        file_type = self.file_type
+        if file_type is None:
+            return lambda metadata: True
+        return lambda metadata: metadata.get("type") == file_type
+
+    @property
+    def fields(self) -> FrozenSet[str]:
+        """Fields of a Snapshot entry that this query reads."""
+        return frozenset() if self.file_type is None else frozenset(("type",))
+
+    @property
+    def cost(self) -> float:
+        """Relative cost of matching one entry, to order query parts."""
+        return 0.0 if self.file_type is None else 1.0
+
+    @property
+    def uses_index(self) -> bool:
+        """Whether this query filters an indexed snapshot without a scan."""
+        return self.file_type is not None
+
+
+@dataclass(frozen=True)
+class RangeQuery(Query):
+    """
+    A query that filters on a range of an integer field, such as `size`.
+    Bounds are inclusive, and entries without a value never match.
+    """
+
+    key: str = "size"
+    min: Optional[int] = None
+    max: Optional[int] = None
+
+    def bounds(self) -> Tuple[Optional[int], Optional[int]]:
+        """Return the lower and upper bounds of the range."""
+        return self.min, self.max
+
+    def filter(self, snapshot: Snapshot) -> Snapshot:
+        """Filter a Snapshot based on this query."""
+        index = get_index(snapshot)
+        if index is not None:
+            return select(snapshot, index.in_range(self.key, *self.bounds()))
+        return list(filter(self.matcher(), snapshot))
+
+    def match(self, metadata: Dict) -> bool:
+        """Check if a single entry of a Snapshot matches this query."""
+        return self.matcher()(metadata)
+
+    def matcher(self) -> Callable[[Dict], bool]:
+        """Return a function that checks if a single entry matches this query."""
+        key = self.key
+        lo, hi = self.bounds()
+
+        def match(metadata: Dict) -> bool:
+            value = metadata.get(key)
+            return (
+                value is not None
+                and (lo is None or value >= lo)
+                and (hi is None or value <= hi)
+            )
+
+        return match
+
+    @property
+    def fields(self) -> FrozenSet[str]:
+        """Fields of a Snapshot entry that this query reads."""
+        return frozenset((self.key,))
+
+    @property
+    def cost(self) -> float:
+        """Relative cost of matching one entry, to order query parts."""
+        return 2.0
+
+    @property
+    def uses_index(self) -> bool:
+        """Whether this query filters an indexed snapshot without a scan."""
+        return True
+
+    @staticmethod
+    def _check_keys(d: Any, allowed: Tuple[str, ...], name: str):
+        if not isinstance(d, dict):
+            raise InvalidQueryError(f"Query '{name}' must be a dict, not {type(d)}")
+        unknown = set(d) - set(allowed)
+        if unknown:
+            raise InvalidQueryError(
+                f"Unknown keys in query '{name}': {sorted(unknown)}. "
+                f"Allowed keys are {list(allowed)}"
+            )
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "RangeQuery":
+        """Create a RangeQuery on `size` from a dict with `min` and `max` bytes."""
+        cls._check_keys(d, ("min", "max"), "size")
+        query = cls(key="size", min=d.get("min"), max=d.get("max"))
+        query._check_bounds()
+        return query
+
+    def _check_bounds(self):
+        if self.min is not None and self.max is not None and self.min > self.max:
+            raise InvalidQueryError(
+                f"Query on '{self.key}' has min {self.min} greater than max {self.max}"
+            )
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _to_ns(value: Any) -> int:
+    """
+    Convert a datetime, or an ISO 8601 string, to nanoseconds since the
+    epoch. Times without a timezone are in UTC.
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError as e:
+            raise InvalidQueryError(f"Invalid ISO 8601 timestamp: '{value}'") from e
+    if not isinstance(value, datetime):
+        raise InvalidQueryError(f"Expected a timestamp, not {type(value)}")
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // timedelta(microseconds=1) * 1000
+
+
+@dataclass(frozen=True)
+class MtimeQuery(RangeQuery):
+    """
+    A query that filters on modification time, in nanoseconds since the
+    epoch. `max_age` is in seconds before the time that the query runs.
+    """
+
+    key: str = "mtime_ns"
+    max_age: Optional[float] = None
+
+    def bounds(self) -> Tuple[Optional[int], Optional[int]]:
+        """Return the lower and upper bounds of the range."""
+        lo = self.min
+        if self.max_age is not None:
+            cutoff = time.time_ns() - int(self.max_age * 1e9)
+            lo = cutoff if lo is None else max(lo, cutoff)
+        return lo, self.max
+
+    @property
+    def time_relative(self) -> bool:
+        return self.max_age is not None
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> "MtimeQuery":
+        """
+        Create an MtimeQuery from a dict with `min` and `max` timestamps,
+        and `max_age` in seconds.
+        """
+        cls._check_keys(d, ("min", "max", "max_age"), "mtime")
+        query = cls(
+            min=None if d.get("min") is None else _to_ns(d["min"]),
+            max=None if d.get("max") is None else _to_ns(d["max"]),
+            max_age=d.get("max_age"),
+        )
+        query._check_bounds()
+        return query
+
+
+def _conjunction(matchers: List[Callable[[Dict], bool]]) -> Callable[[Dict], bool]:
+    """Combine matchers into one that checks each in order, stopping early."""
+    if not matchers:
+        return lambda metadata: True
+    if len(matchers) == 1:
+        return matchers[0]
+    first, second = matchers[0], _conjunction(matchers[1:])
+    return lambda metadata: first(metadata) and second(metadata)
+
 
 @dataclass(frozen=True)
 class CompositeQuery(Query):
@@ -70,11 +375,72 @@ class CompositeQuery(Query):
     def __hash__(self):
         return hash(tuple(self.parts))
 
+    @property
+    def ordered_parts(self) -> List[Query]:
+        """Parts of this query, cheapest to match first."""
+        return sorted(self.parts, key=lambda part: part.cost)
+
     def filter(self, snapshot: Snapshot) -> Snapshot:
-        """Filter a Snapshot based on this query."""
-        for part in self.parts:
-            snapshot = part.filter(snapshot)
-        return snapshot
+        """
+        Filter a Snapshot based on this query. If the snapshot is indexed,
+        the first part that can use the index filters it. The remaining
+        parts are fused into a single pass, cheapest first, without
+        building a list for each part.
+        """
+        parts = self.ordered_parts
+        if get_index(snapshot) is not None:
+            for i, part in enumerate(parts):
+                if part.uses_index:
+                    snapshot = part.filter(snapshot)
+                    del parts[i]
+                    break
+        if isinstance(snapshot, ColumnarSnapshot):
+            # Each part filters whole columns, which beats matching entries
+            for part in parts:
+                snapshot = part.filter(snapshot)
+            return snapshot
+        return list(self._filter_generator(snapshot, parts))
+
+    def _filter_generator(
+        self, snapshot: Snapshot, parts: Optional[List[Query]] = None
+    ) -> Generator:
+        """Filter a Snapshot by every part in a single pass."""
+        # Parts that cost nothing to match, match every entry
+        match = _conjunction(
+            [
+                part.matcher()
+                for part in (self.ordered_parts if parts is None else parts)
+                if part.cost > 0
+            ]
+        )
+        return filter(match, snapshot)
+
+    def match(self, metadata: Dict) -> bool:
+        """Check if a single entry of a Snapshot matches this query."""
+        return all(part.match(metadata) for part in self.ordered_parts)
+
+    def matcher(self) -> Callable[[Dict], bool]:
+        """Return a function that checks if a single entry matches this query."""
+        return _conjunction([part.matcher() for part in self.ordered_parts])
+
+    @property
+    def fields(self) -> FrozenSet[str]:
+        """Fields of a Snapshot entry that this query reads."""
+        return frozenset().union(*(part.fields for part in self.parts))
+
+    @property
+    def cost(self) -> float:
+        """Relative cost of matching one entry, to order query parts."""
+        return sum(part.cost for part in self.parts)
+
+    @property
+    def uses_index(self) -> bool:
+        """Whether this query filters an indexed snapshot without a scan."""
+        return any(part.uses_index for part in self.parts)
+
+    @property
+    def time_relative(self) -> bool:
+        return any(part.time_relative for part in self.parts)
 
     def __bool__(self):
         return bool(self.parts)
@@ -88,9 +454,42 @@ class CompositeQuery(Query):
             raise InvalidQueryError("CompositeQuery cannot be empty")
         path = d.get("path", config.default_query)
         file_type = d.get("type", None)
-        return cls(
-            parts=[
-                GlobQuery(path=path),
-                TypeQuery(file_type=file_type),
-            ]
+        exclude = d.get("exclude")
+        if isinstance(exclude, list):
+            exclude = tuple(exclude)
+        parts = [
+            GlobQuery(path=path, exclude=exclude),
+            TypeQuery(file_type=file_type),
+        ]
+        if d.get("size") is not None:
+            parts.append(RangeQuery.from_dict(d["size"]))
+        if d.get("mtime") is not None:
+            parts.append(MtimeQuery.from_dict(d["mtime"]))
+        return cls(parts=parts)
+
+
+def exclude_paths(query: Query, patterns: Sequence[str]) -> Query:
+    """
+    Return a copy of `query` that also excludes the entries matching glob
+    `patterns`, and every entry inside a directory that matches them, such
+    as `cache/x.txt` for `cache`. Only GlobQuery parts are changed, so
+    queries without one are returned as is. Patterns that the query
+    already excludes are not added again, so excluding the same patterns
+    twice returns an equal query.
+    """
+    if isinstance(query, CompositeQuery):
+        return replace(
+            query, parts=[exclude_paths(part, patterns) for part in query.parts]
         )
+    if not isinstance(query, GlobQuery):
+        return query
+    subtrees = tuple(pattern.rstrip("/") + "/**" for pattern in patterns)
+    exclude = _freeze(query.exclude) or ()
+    if isinstance(exclude, str):
+        exclude = (exclude,)
+    added = tuple(
+        pattern
+        for pattern in dict.fromkeys((*patterns, *subtrees))
+        if pattern not in exclude
+    )
+    return replace(query, exclude=exclude + added) if added else query
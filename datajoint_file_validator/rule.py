@@ -1,9 +1,11 @@
 from dataclasses import dataclass, field
-from typing import Dict, List, Any, Optional
-from .constraint import Constraint, CONSTRAINT_MAP
+from typing import Dict, FrozenSet, Iterable, List, Any, Optional, Union
+from .constraint import Accumulator, Constraint, CountConstraint, CONSTRAINT_MAP
 from .result import ValidationResult
 from .snapshot import Snapshot, PathLike, FileMetadata
+from .diff import SnapshotDiff
 from .query import Query, GlobQuery, CompositeQuery
+from .index import get_index
 from .config import config
 from .error import InvalidRuleError, InvalidQueryError
 from .hash_utils import generate_id
@@ -25,19 +27,138 @@ class Rule:
     def __hash__(self):
         return hash((self.id, self.query, tuple(self.constraints)))
 
-    def validate(self, snapshot: Snapshot) -> Dict[str, ValidationResult]:
-        filtered_snapshot: Snapshot = self.query.filter(snapshot)
-        results = list(
-            map(
-                lambda constraint: constraint.validate(filtered_snapshot),
-                self.constraints,
-            )
+    @property
+    def fields(self) -> FrozenSet[str]:
+        """Fields of a Snapshot entry that this rule's query and constraints read."""
+        return self.query.fields.union(
+            *(constraint.fields for constraint in self.constraints)
         )
+
+    def start(self) -> Optional[Dict[str, Accumulator]]:
+        """
+        Start validating a stream of entries that match this rule's query,
+        with an Accumulator for each constraint. Returns None if any
+        constraint can only validate a whole snapshot (see
+        `Constraint.start`).
+        """
+        accumulators = {}
+        for constraint in self.constraints:
+            accumulator = constraint.start()
+            if accumulator is None:
+                return None
+            accumulators[constraint.name] = accumulator
+        return accumulators
+
+    def validate(
+        self, snapshot: Union[Snapshot, Iterable[Dict[str, Any]]]
+    ) -> Dict[str, ValidationResult]:
+        """
+        Validate a snapshot, or an iterable of snapshot entries, against
+        each constraint. If every constraint can validate a stream of
+        entries, matching entries are streamed to them in a single pass,
+        without filtering the snapshot first. The snapshot is filtered if
+        its index can answer the query instead.
+        """
+        accumulators = self.start()
+        if not accumulators or (
+            self.query.uses_index and get_index(snapshot) is not None
+        ):
+            filtered_snapshot: Snapshot = self.query.filter(snapshot)
+            return self.validate_constraints(filtered_snapshot)
+        match = self.query.match
+        for entry in snapshot:
+            if match(entry):
+                for accumulator in accumulators.values():
+                    accumulator.update(entry)
         return {
-            constraint.name: result
-            for constraint, result in zip(self.constraints, results)
+            name: accumulator.finish() for name, accumulator in accumulators.items()
         }
 
+    def validate_constraints(
+        self,
+        filtered_snapshot: Snapshot,
+        results: Optional[Dict[str, ValidationResult]] = None,
+    ) -> Dict[str, ValidationResult]:
+        """
+        Validate a snapshot that has already been filtered by this
+        rule's query against each constraint. Constraints with a result in
+        `results`, such as from `constraint.validate_regex_constraints`,
+        are not validated again.
+        """
+        results = results or {}
+        return {
+            constraint.name: results[constraint.name]
+            if constraint.name in results
+            else constraint.validate(filtered_snapshot)
+            for constraint in self.constraints
+        }
+
+    def count_delta(self, diff: SnapshotDiff) -> Optional[int]:
+        """
+        Return the change in the number of files matched by this rule's
+        query, given the changes in `diff`. Returns None if the query
+        matches none of the entries that changed. Raises a ValueError if
+        the query is time relative (see `Query.time_relative`), since
+        unchanged entries can then stop or start matching.
+        """
+        if self.query.time_relative:
+            raise ValueError(
+                "Cannot count the change in files matched by a time relative query"
+            )
+        match = self.query.match
+        affected = False
+        delta = 0
+        for metadata in diff.added:
+            if match(metadata):
+                affected = True
+                delta += 1
+        for metadata in diff.removed:
+            if match(metadata):
+                affected = True
+                delta -= 1
+        for old, new in diff.modified:
+            matched_old, matched_new = match(old), match(new)
+            if matched_old or matched_new:
+                affected = True
+                delta += matched_new - matched_old
+        return delta if affected else None
+
+    def revalidate(
+        self,
+        snapshot: Snapshot,
+        previous: Dict[str, ValidationResult],
+        diff: SnapshotDiff,
+    ) -> Dict[str, ValidationResult]:
+        """
+        Validate a snapshot that changed by `diff` since it was validated
+        with results `previous`. If this rule's query matches none of the
+        entries that changed, `previous` is returned as is. Otherwise, count
+        constraints are updated by the change in the number of files, and
+        other constraints are validated again. Rules with a time relative
+        query, such as an `mtime` with a `max_age`, are always validated
+        again.
+        """
+        if self.query.time_relative:
+            return self.validate_constraints(self.query.filter(snapshot))
+        delta = self.count_delta(diff)
+        if delta is None:
+            return previous
+        filtered_snapshot: Optional[Snapshot] = None
+        results = {}
+        for constraint in self.constraints:
+            result = previous.get(constraint.name)
+            if (
+                isinstance(constraint, CountConstraint)
+                and result is not None
+                and "count" in result.context
+            ):
+                results[constraint.name] = constraint.update(result, delta)
+                continue
+            if filtered_snapshot is None:
+                filtered_snapshot = self.query.filter(snapshot)
+            results[constraint.name] = constraint.validate(filtered_snapshot)
+        return results
+
     @staticmethod
     def compile_query(raw: Any) -> "Query":
         if isinstance(raw, dict):
@@ -0,0 +1,283 @@
+"""
+Save and load snapshots as compact binary files.
+
+A snapshot file starts with an 8-byte magic string, a format version and
+a compression code. The rest of the file, which is compressed as a whole
+if requested, is a stream of chunks, each holding the columns of a
+`ColumnarSnapshot` of up to `chunk_size` entries:
+
+    file    := MAGIC VERSION:u8 COMPRESSION:u8 body
+    body    := chunk* u64(0)
+    chunk   := u64(len(header)) header payload*
+    header  := JSON {"n": int, "abs_prefix": str | null,
+                     "columns": [[group, name, kind], ...]}
+    payload := u64(len(data)) data
+
+Integers are little-endian. Each column is stored as one of the
+following kinds:
+
+- `interned`: a JSON table of unique values, then uint32 indices into it.
+- `int64`: packed int64 values.
+- `str`: UTF-8 strings joined by NUL characters.
+- `json`: a JSON list, for columns that fit none of the above.
+
+Since entries are written and read one chunk at a time, a snapshot can be
+saved while it is walked, and loaded without holding the whole file in
+memory (see `iter_load_snapshot`).
+"""
+import io
+import sys
+import gzip
+import json
+import struct
+from array import array
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Union
+from .snapshot import Snapshot, PathLike
+from .columnar import ColumnarSnapshot, _Builder, _Interned
+from .error import InvalidSnapshotError
+
+MAGIC = b"DJFVSNAP"
+VERSION = 1
+COMPRESSION_CODES = {None: 0, "gzip": 1, "zstd": 2}
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+_U64 = struct.Struct("<Q")
+_PREAMBLE = struct.Struct(f"<{len(MAGIC)}sBB")
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise InvalidSnapshotError(
+            "Package `zstandard` is required for zstd compression. "
+            "Install it with `pip install zstandard`."
+        ) from e
+    return zstandard
+
+
+@contextmanager
+def _compressed_writer(f: BinaryIO, compression: Optional[str]):
+    if compression is None:
+        yield f
+    elif compression == "gzip":
+        with gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6) as gz:
+            yield gz
+    elif compression == "zstd":
+        with _zstandard().ZstdCompressor().stream_writer(f, closefd=False) as zst:
+            yield zst
+    else:
+        raise ValueError(
+            f"Unknown compression '{compression}'. "
+            f"Must be one of {list(COMPRESSION_CODES)}."
+        )
+
+
+def _compressed_reader(f: BinaryIO, code: int) -> BinaryIO:
+    if code == COMPRESSION_CODES[None]:
+        return f
+    if code == COMPRESSION_CODES["gzip"]:
+        return gzip.GzipFile(fileobj=f, mode="rb")
+    if code == COMPRESSION_CODES["zstd"]:
+        return io.BufferedReader(_zstandard().ZstdDecompressor().stream_reader(f))
+    raise InvalidSnapshotError(f"Unknown compression code {code}")
+
+
+def _le_bytes(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le_bytes(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _encode_column(values: Union[_Interned, array, List]):
+    """Return the kind of a column and its payloads."""
+    if isinstance(values, _Interned):
+        table = json.dumps(values.table).encode()
+        return "interned", [table, _le_bytes(array("I", values.ids))]
+    if isinstance(values, array) and values.typecode == "q":
+        return "int64", [_le_bytes(values)]
+    if all(type(value) is str for value in values):
+        blob = "\0".join(values)
+        if blob.count("\0") == max(len(values) - 1, 0):
+            return "str", [blob.encode()]
+    return "json", [json.dumps(list(values)).encode()]
+
+
+def _decode_column(kind: str, payloads: List[bytes], n: int):
+    if kind == "interned":
+        table = json.loads(payloads[0])
+        return _Interned(table, array("L", _from_le_bytes("I", payloads[1])))
+    if kind == "int64":
+        return _from_le_bytes("q", payloads[0])
+    if kind == "str":
+        return payloads[0].decode().split("\0") if n else []
+    if kind == "json":
+        return json.loads(payloads[0])
+    raise InvalidSnapshotError(f"Unknown column kind '{kind}'")
+
+
+def _n_payloads(kind: str) -> int:
+    return 2 if kind == "interned" else 1
+
+
+def _write_chunk(f: BinaryIO, snapshot: ColumnarSnapshot):
+    columns = [
+        ("dirs", "", snapshot._dirs),
+        ("bases", "", snapshot._bases),
+        ("trailing", "", snapshot._trailing),
+        *(("columns", k, v) for k, v in snapshot._columns.items()),
+        *(("extra", k, v) for k, v in snapshot._extra.items()),
+    ]
+    layout, payloads = [], []
+    for group, name, values in columns:
+        kind, data = _encode_column(values)
+        layout.append([group, name, kind])
+        payloads.extend(data)
+    header = json.dumps(
+        dict(n=len(snapshot), abs_prefix=snapshot._abs_prefix, columns=layout)
+    ).encode()
+    for data in (header, *payloads):
+        f.write(_U64.pack(len(data)))
+        f.write(data)
+
+
+def _read_exactly(f: BinaryIO, n: int) -> bytes:
+    data = f.read(n)
+    if len(data) != n:
+        raise InvalidSnapshotError("Snapshot file is truncated")
+    return data
+
+
+def _read_payload(f: BinaryIO) -> bytes:
+    (n,) = _U64.unpack(_read_exactly(f, _U64.size))
+    return _read_exactly(f, n)
+
+
+def _read_chunk(f: BinaryIO) -> Optional[ColumnarSnapshot]:
+    header = _read_payload(f)
+    if not header:
+        return None
+    header: Dict[str, Any] = json.loads(header)
+    n = header["n"]
+    groups: Dict[str, Any] = dict(columns={}, extra={})
+    for group, name, kind in header["columns"]:
+        payloads = [_read_payload(f) for _ in range(_n_payloads(kind))]
+        values = _decode_column(kind, payloads, n)
+        if len(values) != n:
+            raise InvalidSnapshotError(f"Column '{group}/{name}' has wrong length")
+        if group in ("columns", "extra"):
+            groups[group][name] = values
+        else:
+            groups[group] = values
+    return ColumnarSnapshot(abs_prefix=header["abs_prefix"], **groups)
+
+
+def _chunks(
+    snapshot: Union[Snapshot, Iterable[Dict[str, Any]]], chunk_size: int
+) -> Iterator[ColumnarSnapshot]:
+    if isinstance(snapshot, ColumnarSnapshot):
+        if len(snapshot) <= chunk_size:
+            yield snapshot
+            return
+        for start in range(0, len(snapshot), chunk_size):
+            yield snapshot[start : start + chunk_size]
+        return
+    builder = _Builder()
+    for record in snapshot:
+        builder.append(record)
+        if builder.n == chunk_size:
+            yield builder.build()
+            builder = _Builder()
+    if builder.n:
+        yield builder.build()
+
+
+def save_snapshot(
+    snapshot: Union[Snapshot, Iterable[Dict[str, Any]]],
+    path: PathLike,
+    compression: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int:
+    """
+    Save a snapshot to a binary file at `path`. Returns the number of
+    entries written.
+
+    Parameters
+    ----------
+    snapshot : Snapshot | Iterable[Dict[str, Any]]
+        A snapshot, a ColumnarSnapshot, or an iterable of snapshot entries,
+        such as `snapshot.iter_snapshot`. Iterables are written as they
+        are consumed, one chunk at a time.
+    path : PathLike
+        Path of the file to write.
+    compression : str
+        One of None, "gzip", or "zstd". zstd requires the `zstandard`
+        package.
+    chunk_size : int
+        Maximum number of entries per chunk.
+    """
+    if compression not in COMPRESSION_CODES:
+        raise ValueError(
+            f"Unknown compression '{compression}'. "
+            f"Must be one of {list(COMPRESSION_CODES)}."
+        )
+    with open(path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION, COMPRESSION_CODES[compression]))
+        n = 0
+        with _compressed_writer(f, compression) as body:
+            for chunk in _chunks(snapshot, chunk_size):
+                _write_chunk(body, chunk)
+                n += len(chunk)
+            body.write(_U64.pack(0))
+    return n
+
+
+def _iter_chunks(path: PathLike) -> Iterator[ColumnarSnapshot]:
+    with open(path, "rb") as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) != _PREAMBLE.size or not preamble.startswith(MAGIC):
+            raise InvalidSnapshotError(f"'{path}' is not a snapshot file")
+        _, version, code = _PREAMBLE.unpack(preamble)
+        if version != VERSION:
+            raise InvalidSnapshotError(
+                f"Unsupported snapshot file version {version} in '{path}'"
+            )
+        body = _compressed_reader(f, code)
+        while True:
+            chunk = _read_chunk(body)
+            if chunk is None:
+                return
+            yield chunk
+
+
+def load_snapshot(path: PathLike) -> ColumnarSnapshot:
+    """Load a snapshot saved with `save_snapshot` from `path`."""
+    return ColumnarSnapshot.concat(list(_iter_chunks(path)))
+
+
+def iter_load_snapshot(path: PathLike) -> Iterator[Dict[str, Any]]:
+    """
+    Load a snapshot saved with `save_snapshot` from `path`, yielding each
+    entry. Only one chunk is held in memory at a time.
+    """
+    for chunk in _iter_chunks(path):
+        yield from chunk
+
+
+def is_snapshot_file(path: PathLike) -> bool:
+    """Check if `path` is a file written by `save_snapshot`."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
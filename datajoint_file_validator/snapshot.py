@@ -1,44 +1,123 @@
 import os
+from stat import S_ISREG
 from datetime import datetime
 import pytz
-from dataclasses import dataclass, field, asdict
 from wcmatch import pathlib
 from wcmatch.pathlib import Path
-from typing import List, Dict, Any, Optional, Union
+from pathlib import PurePath
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Union
 from .config import config
+from .walker import WALKERS, DescendFilter, WalkEntry
+from .cache import SnapshotCache
 
 
-@dataclass
 class FileMetadata:
     """
     Metadata for a file.
+
+    Records are slotted to keep memory usage low on large filesets. `path`
+    is an alias of `rel_path`, and `abs_path` is formed from a prefix shared
+    by all entries of a snapshot. `abs_path`, `extension` and
+    `last_modified` are computed on first access.
     """
 
-    name: str
-    path: str = field(init=False)
-    abs_path: str
-    rel_path: str
-    extension: str
-    size: int
-    type: str
-    last_modified: str
-    mtime_ns: int
-    ctime_ns: int
-    atime_ns: int
-    _path: Optional[Path] = field(default=None, repr=False)
-
-    def __post_init__(self):
-        self.path = self.rel_path
+    __slots__ = (
+        "name",
+        "rel_path",
+        "type",
+        "size",
+        "mtime_ns",
+        "ctime_ns",
+        "atime_ns",
+        "_abs_prefix",
+        "_abs_path",
+        "_extension",
+        "_last_modified",
+    )
+    # Order of keys in `asdict`
+    FIELDS = (
+        "name",
+        "path",
+        "abs_path",
+        "rel_path",
+        "extension",
+        "size",
+        "type",
+        "last_modified",
+        "mtime_ns",
+        "ctime_ns",
+        "atime_ns",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        abs_path: Optional[str] = None,
+        rel_path: Optional[str] = None,
+        extension: Optional[str] = None,
+        size: Optional[int] = None,
+        type: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        mtime_ns: Optional[int] = None,
+        ctime_ns: Optional[int] = None,
+        atime_ns: Optional[int] = None,
+        _path: Optional[Path] = None,
+        *,
+        abs_prefix: Optional[str] = None,
+    ):
+        # Positional arguments are in the order of the former dataclass.
+        # `_path` is accepted for compatibility, and built on access instead.
+        if rel_path is None:
+            raise TypeError("FileMetadata() missing required argument: 'rel_path'")
+        self.name = name
+        self.rel_path = rel_path
+        self.type = type
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.ctime_ns = ctime_ns
+        self.atime_ns = atime_ns
+        self._abs_prefix = abs_prefix
+        self._abs_path = abs_path
+        self._extension = extension
+        self._last_modified = last_modified
+
+    @property
+    def path(self) -> str:
+        return self.rel_path
+
+    @property
+    def abs_path(self) -> Optional[str]:
+        if self._abs_path is None and self._abs_prefix is not None:
+            self._abs_path = self._abs_prefix + self.rel_path
+        return self._abs_path
+
+    @property
+    def extension(self) -> str:
+        if self._extension is None:
+            self._extension = PurePath(self.name).suffix
+        return self._extension
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        if self._last_modified is None and self.mtime_ns is not None:
+            self._last_modified = self.to_iso_8601(self.mtime_ns)
+        return self._last_modified
+
+    @property
+    def _path(self) -> Optional[Path]:
+        """A handle to this file, if `config.enable_path_handle` is set."""
+        return Path(self.abs_path) if config.enable_path_handle else None
 
     @staticmethod
     def to_iso_8601(time_ns: int):
-        time_ = datetime.fromtimestamp(time_ns / 1e9)
-        return time_.replace(tzinfo=pytz.UTC).isoformat()
+        # In UTC, regardless of the local timezone
+        return datetime.fromtimestamp(time_ns / 1e9, tz=pytz.UTC).isoformat()
 
     @classmethod
     def from_path(cls, path: Path, root: Path) -> "FileMetadata":
         """Return a FileMetadata object from a Path object."""
-        is_file = path.is_file()
+        st = path.stat()
+        is_file = S_ISREG(st.st_mode)
         rel_path = str(path.relative_to(root))
         abs_path = str(path)
         # Add trailing slash to directories
@@ -50,26 +129,51 @@ class FileMetadata:
             name=path.name,
             rel_path=rel_path,
             abs_path=abs_path,
-            size=path.stat().st_size,
+            size=st.st_size,
             type="file" if is_file else "directory",
-            last_modified=cls.to_iso_8601(path.stat().st_mtime_ns),
-            extension=path.suffix,
-            mtime_ns=path.stat().st_mtime_ns,
-            ctime_ns=path.stat().st_ctime_ns,
-            atime_ns=path.stat().st_atime_ns,
-            _path=path if config.enable_path_handle else None,
+            mtime_ns=st.st_mtime_ns,
+            ctime_ns=st.st_ctime_ns,
+            atime_ns=st.st_atime_ns,
+        )
+
+    @classmethod
+    def from_walk_entry(
+        cls, entry: WalkEntry, abs_prefix: Optional[str] = None
+    ) -> "FileMetadata":
+        """
+        Return a FileMetadata object from a WalkEntry, without further syscalls.
+        If `abs_prefix` is passed, `abs_path` is formed from it rather than
+        stored.
+        """
+        st = entry.stat
+        return cls(
+            name=entry.name,
+            rel_path=entry.rel_path,
+            abs_path=None if abs_prefix is not None else entry.abs_path,
+            abs_prefix=abs_prefix,
+            type="file" if entry.is_file else "directory",
+            size=None if st is None else st.st_size,
+            mtime_ns=None if st is None else st.st_mtime_ns,
+            ctime_ns=None if st is None else st.st_ctime_ns,
+            atime_ns=None if st is None else st.st_atime_ns,
         )
 
     def __repr__(self):
         return f"{self.__class__.__name__}(path={self.path!r}, type={self.type!r})"
 
-    @staticmethod
-    def _dict_factory(x):
-        exclude_fields = ("_path",)
-        return {k: v for (k, v) in x if ((v is not None) and (k not in exclude_fields))}
+    def __eq__(self, other):
+        if not isinstance(other, FileMetadata):
+            return NotImplemented
+        return self.asdict() == other.asdict()
 
-    def asdict(self):
-        return asdict(self, dict_factory=self._dict_factory)
+    def asdict(self) -> Dict[str, Any]:
+        """Convert to a dictionary, omitting fields that are None."""
+        d = {}
+        for k in self.FIELDS:
+            v = getattr(self, k)
+            if v is not None:
+                d[k] = v
+        return d
 
 
 # Define type aliases
@@ -77,25 +181,137 @@ S3URI = str
 PathLike = Union[str, Path, S3URI]
 Snapshot = List[Dict[str, Any]]
 
+ALL_FIELDS = frozenset(FileMetadata.FIELDS)
+# Fields that can only be read by stat'ing each entry
+STAT_FIELDS = frozenset(("size", "last_modified", "mtime_ns", "ctime_ns", "atime_ns"))
+
+
+def needs_stat(fields: Optional[Iterable[str]]) -> bool:
+    """
+    Check if any of `fields` can only be read by stat'ing each entry.
+    If `fields` is None, all fields are needed.
+    """
+    return fields is None or not STAT_FIELDS.isdisjoint(fields)
+
 
-def _snapshot_to_cls(
+def _glob_walk(
     path: str, flags=(pathlib.GLOBSTAR | pathlib.SPLIT | pathlib.FOLLOW)
-) -> List[FileMetadata]:
-    """Generate a snapshot of a file or directory at local `path`."""
+) -> Iterator[FileMetadata]:
+    """
+    Walk a file or directory at local `path` using `wcmatch.pathlib.Path.glob`.
+    """
     root = Path(path)
     if root.is_file():
-        files = [FileMetadata.from_path(root, root.parent)]
+        yield FileMetadata.from_path(root, root.parent)
     elif root.is_dir():
-        files = [FileMetadata.from_path(p, root) for p in root.glob("**", flags=flags)]
+        for p in root.glob("**", flags=flags):
+            yield FileMetadata.from_path(p, root)
     else:
         raise FileNotFoundError(f"path {path} is not a file or directory")
-    return files
 
 
-def create_snapshot(path: str) -> Snapshot:
+def _iter_snapshot_cls(
+    path: str,
+    walker: Optional[str] = None,
+    fields: Optional[Iterable[str]] = None,
+    cache: Optional[bool] = None,
+    descend: Optional[DescendFilter] = None,
+) -> Iterator[FileMetadata]:
+    """
+    Walk a file or directory at local `path`, yielding a FileMetadata
+    object for each entry.
+
+    Parameters
+    ----------
+    path : str
+        Path to a local file or directory.
+    walker : str
+        Name of the walker engine to use. One of "glob" or a key of
+        `walker.WALKERS`. Defaults to `config.snapshot_walker`.
+    fields : Iterable[str]
+        Fields of FileMetadata that are needed. If none of them require
+        a stat, entries are not stat'ed, and sizes and timestamps are
+        omitted. Defaults to all fields. Ignored by the "glob" walker.
+    cache : bool
+        Reuse the directory listings of the last walk of `path` from a
+        `cache.SnapshotCache`, instead of using `walker`. Defaults to
+        `config.snapshot_cache`.
+    descend : Callable[[str], bool]
+        If given, the contents of a directory are only walked if it returns
+        True for the relative path of the directory, such as `raw/`.
+        Ignored by the "glob" walker.
+    """
+    walker = walker or config.snapshot_walker
+    cache = config.snapshot_cache if cache is None else cache
+    stat = needs_stat(fields)
+    if cache:
+        return _from_walk(SnapshotCache(path).walk(path, stat=stat, descend=descend))
+    if walker == "glob":
+        return _glob_walk(path)
+    if walker not in WALKERS:
+        raise ValueError(
+            f"Unknown snapshot walker '{walker}'. "
+            f"Must be one of {['glob', *WALKERS]}."
+        )
+    return _from_walk(WALKERS[walker](path, stat=stat, descend=descend))
+
+
+def _from_walk(entries: Iterator[WalkEntry]) -> Iterator[FileMetadata]:
+    """
+    Convert the entries of a walk to FileMetadata objects that share a
+    single prefix for their absolute paths.
+    """
+    abs_prefix = None
+    for entry in entries:
+        if abs_prefix is None:
+            abs_prefix = entry.abs_path[: len(entry.abs_path) - len(entry.rel_path)]
+        yield FileMetadata.from_walk_entry(entry, abs_prefix=abs_prefix)
+
+
+def _snapshot_to_cls(path: str, walker: Optional[str] = None) -> List[FileMetadata]:
+    """Generate a snapshot of a file or directory at local `path`."""
+    return list(_iter_snapshot_cls(path, walker=walker))
+
+
+def iter_snapshot(
+    path: str,
+    fields: Optional[Iterable[str]] = None,
+    cache: Optional[bool] = None,
+    descend: Optional[DescendFilter] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Generate a snapshot of a file or directory at local `path`, yielding
+    each entry as it is walked. Unlike `create_snapshot`, the listing is
+    never held in memory as a whole. See `create_snapshot` for `fields`,
+    `cache` and `descend`.
+    """
+    return (
+        f.asdict()
+        for f in _iter_snapshot_cls(path, fields=fields, cache=cache, descend=descend)
+    )
+
+
+def create_snapshot(
+    path: str,
+    fields: Optional[Iterable[str]] = None,
+    cache: Optional[bool] = None,
+    descend: Optional[DescendFilter] = None,
+) -> Snapshot:
     """
     Generate a snapshot of a file or directory at local `path`.
     Converts the list of dataclasses to a Snapshot.
+
+    If `fields` is passed, only those fields are guaranteed to be present.
+    Entries are not stat'ed unless a size or timestamp is needed, such as
+    for a manifest with `Manifest.fields`.
+
+    If `cache` is True, or `config.snapshot_cache` is set, directories that
+    have not changed since the last snapshot of `path` are not listed again.
+    See `cache.SnapshotCache`.
+
+    If `descend` is passed, the contents of a directory are only walked if
+    it returns True for the relative path of the directory, such as `raw/`.
+    Skipped directories are still in the snapshot, without their contents.
+    See `planner.descend_filter`.
     """
-    files = _snapshot_to_cls(path)
-    return [f.asdict() for f in files]
+    return list(iter_snapshot(path, fields=fields, cache=cache, descend=descend))
@@ -0,0 +1,271 @@
+import os
+from stat import S_ISDIR, S_ISREG
+from pathlib import PurePath
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from .config import config
+
+
+class WalkEntry(NamedTuple):
+    """
+    A single entry yielded by a walker. This is the raw filesystem record
+    that a `snapshot.FileMetadata` is built from.
+    """
+
+    name: str
+    rel_path: str
+    abs_path: str
+    is_file: bool
+    is_dir: bool
+    stat: Optional[os.stat_result]
+
+
+# Entries of a directory, paired with the `os.DirEntry` they were listed from
+Listing = List[Tuple[WalkEntry, os.DirEntry]]
+
+
+def _abs_prefix(root: str) -> str:
+    """
+    Return the prefix that is prepended to relative paths to form the
+    `abs_path` of an entry. Mirrors how `pathlib.Path.glob` renders
+    children of `root`.
+    """
+    if root == ".":
+        return ""
+    return root if root.endswith("/") else root + "/"
+
+
+def _scan_dir(abs_dir: str) -> List[os.DirEntry]:
+    """
+    List a directory, sorted by name so that walks are deterministic.
+    Hidden entries are skipped, matching `**` without the `DOTGLOB` flag.
+    """
+    with os.scandir(abs_dir or ".") as it:
+        entries = [entry for entry in it if not entry.name.startswith(".")]
+    entries.sort(key=lambda entry: entry.name)
+    return entries
+
+
+def _root_entry(path: str) -> Tuple[str, Optional[WalkEntry]]:
+    """
+    Normalize the root `path` of a walk. Returns the normalized root, and
+    a `WalkEntry` if the root is a regular file.
+    """
+    root = str(PurePath(path))
+    try:
+        st = os.stat(root)
+    except FileNotFoundError:
+        st = None
+    if st is not None and S_ISREG(st.st_mode):
+        name = PurePath(root).name
+        return root, WalkEntry(
+            name=name, rel_path=name, abs_path=root, is_file=True, is_dir=False, stat=st
+        )
+    if st is None or not S_ISDIR(st.st_mode):
+        raise FileNotFoundError(f"path {path} is not a file or directory")
+    return root, None
+
+
+def _real_subdir(entry: os.DirEntry, real_ancestors: Tuple[str, ...]) -> Optional[str]:
+    """
+    Return the real path of the directory `entry`, or None if it is a
+    symbolic link that points back to one of its ancestors.
+    """
+    if not entry.is_symlink():
+        return os.path.join(real_ancestors[-1], entry.name)
+    real_dir = os.path.realpath(entry.path)
+    return None if real_dir in real_ancestors else real_dir
+
+
+def _list_dir(rel_dir: str, abs_dir: str, stat: bool = True) -> Listing:
+    """
+    List and stat the entries of a directory. Each entry is stat'ed exactly
+    once, and the file type is read from that single stat result. If `stat`
+    is False, entries are not stat'ed, and the file type is read from the
+    directory entry instead.
+    """
+    return [
+        (_walk_entry(rel_dir, abs_dir, entry, stat), entry)
+        for entry in _scan_dir(abs_dir)
+    ]
+
+
+def _walk_entry(
+    rel_dir: str, abs_dir: str, entry: os.DirEntry, stat: bool = True
+) -> WalkEntry:
+    """Create a WalkEntry for a directory entry `entry`."""
+    if stat:
+        st = entry.stat()
+        is_file, is_dir = S_ISREG(st.st_mode), S_ISDIR(st.st_mode)
+    else:
+        st = None
+        is_file, is_dir = entry.is_file(), entry.is_dir()
+    suffix = "" if is_file else "/"
+    return WalkEntry(
+        name=entry.name,
+        rel_path=rel_dir + entry.name + suffix,
+        abs_path=abs_dir + entry.name + suffix,
+        is_file=is_file,
+        is_dir=is_dir,
+        stat=st,
+    )
+
+
+# Whether to walk the contents of a directory, given its relative path
+DescendFilter = Callable[[str], bool]
+
+
+def _walk(
+    path: str,
+    list_dir: Callable[[str, str], Listing],
+    descend: Optional[DescendFilter] = None,
+) -> Iterator[WalkEntry]:
+    """
+    Walk a file or directory at local `path`, listing directories with
+    `list_dir`. Entries are yielded in pre-order, in the order returned
+    by `list_dir`. Directories for which `descend` returns False are
+    yielded, but their contents are not walked.
+    """
+    root, root_entry = _root_entry(path)
+    if root_entry is not None:
+        yield root_entry
+        return
+
+    abs_root = _abs_prefix(root)
+    # Stack of (remaining listing, real paths of ancestors)
+    stack = [(iter(list_dir("", abs_root)), (os.path.realpath(root),))]
+    while stack:
+        listing, real_ancestors = stack[-1]
+        item = next(listing, None)
+        if item is None:
+            stack.pop()
+            continue
+
+        walk_entry, entry = item
+        yield walk_entry
+
+        if not walk_entry.is_dir:
+            continue
+        if descend is not None and not descend(walk_entry.rel_path):
+            continue
+        real_dir = _real_subdir(entry, real_ancestors)
+        if real_dir is None:
+            continue
+        # Descend into this directory before visiting its siblings
+        stack.append(
+            (
+                iter(list_dir(walk_entry.rel_path, walk_entry.abs_path)),
+                real_ancestors + (real_dir,),
+            )
+        )
+
+
+def scandir_walk(
+    path: str, *, stat: bool = True, descend: Optional[DescendFilter] = None
+) -> Iterator[WalkEntry]:
+    """
+    Walk a file or directory at local `path` using `os.scandir`.
+
+    Entries are yielded in pre-order, sorted by name within each directory.
+    Each entry is stat'ed exactly once, and the file type is read from that
+    single stat result. If `stat` is False, entries are not stat'ed at all.
+    Symbolic links to directories are followed, unless they point back to
+    an ancestor. If `descend` is given, only the contents of directories
+    whose relative path it returns True for are walked.
+    """
+    return _walk(path, partial(_list_dir, stat=stat), descend)
+
+
+class _Prefetcher:
+    """
+    Lists directories ahead of a walk in a thread pool. When a directory
+    is listed, all of its subdirectories are submitted to the pool, so
+    that their round trips to the filesystem overlap. At most
+    `max_pending` listings are queued at once; past that, directories are
+    listed in the calling thread when the walk reaches them.
+    """
+
+    def __init__(
+        self,
+        pool: ThreadPoolExecutor,
+        max_pending: int,
+        stat: bool,
+        descend: Optional[DescendFilter] = None,
+    ):
+        self.pool = pool
+        self.max_pending = max_pending
+        self.stat = stat
+        self.descend = descend
+        self._pending: Dict[str, Future] = {}
+
+    def list_dir(self, rel_dir: str, abs_dir: str) -> Listing:
+        future = self._pending.pop(abs_dir, None)
+        if future is None:
+            listing = _list_dir(rel_dir, abs_dir, self.stat)
+        else:
+            listing = future.result()
+        for walk_entry, entry in listing:
+            # Symbolic links are listed lazily, since they may be skipped
+            if not walk_entry.is_dir or entry.is_symlink():
+                continue
+            if self.descend is None or self.descend(walk_entry.rel_path):
+                self._prefetch(walk_entry.rel_path, walk_entry.abs_path)
+        return listing
+
+    def _prefetch(self, rel_dir: str, abs_dir: str):
+        if len(self._pending) < self.max_pending:
+            self._pending[abs_dir] = self.pool.submit(
+                _list_dir, rel_dir, abs_dir, self.stat
+            )
+
+    def cancel(self):
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+
+
+def threaded_walk(
+    path: str,
+    workers: Optional[int] = None,
+    max_pending: Optional[int] = None,
+    *,
+    stat: bool = True,
+    descend: Optional[DescendFilter] = None,
+) -> Iterator[WalkEntry]:
+    """
+    Walk a file or directory at local `path`, listing directories in
+    parallel using a pool of threads. Useful on network filesystems, where
+    walking is bound by the latency of each directory listing.
+
+    Yields the same entries in the same order as `scandir_walk`.
+
+    Parameters
+    ----------
+    path : str
+        Path to a local file or directory.
+    workers : int
+        Number of threads. Defaults to `config.snapshot_workers`.
+    max_pending : int
+        Maximum number of directory listings queued ahead of the walk.
+        Defaults to `config.snapshot_max_pending`.
+    stat : bool
+        If False, entries are not stat'ed.
+    descend : Callable[[str], bool]
+        If given, only the contents of directories whose relative path it
+        returns True for are walked or prefetched.
+    """
+    workers = workers or config.snapshot_workers
+    max_pending = max_pending or config.snapshot_max_pending
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        prefetcher = _Prefetcher(pool, max_pending, stat, descend)
+        try:
+            yield from _walk(path, prefetcher.list_dir, descend)
+        finally:
+            prefetcher.cancel()
+
+
+WALKERS = {
+    "scandir": scandir_walk,
+    "threaded": threaded_walk,
+}
@@ -1,3 +1,5 @@
+import sys
+import time
 import pytest
 from typing import Dict
 from wcmatch import glob
@@ -13,6 +15,21 @@ def manifest_file_from_registry(request) -> str:
     return request.param
 
 
+@pytest.fixture
+def set_timezone(monkeypatch):
+    """Returns a function that sets the local timezone of the process."""
+    if sys.platform == "win32":
+        pytest.skip("time.tzset is not available on Windows")
+
+    def set_(tz: str):
+        monkeypatch.setenv("TZ", tz)
+        time.tzset()
+
+    yield set_
+    monkeypatch.undo()
+    time.tzset()
+
+
 @pytest.fixture
 def manifest_dict() -> Dict:
     """A valid dictionary that can be used to create a manifest."""
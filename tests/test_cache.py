@@ -0,0 +1,117 @@
+import os
+import pytest
+from datajoint_file_validator.cache import SnapshotCache
+from datajoint_file_validator.walker import scandir_walk
+from datajoint_file_validator.snapshot import create_snapshot
+from datajoint_file_validator.config import config
+
+# A time well before any walk in these tests, so that listings are not racy
+PAST_NS = 1_600_000_000_000_000_000
+
+
+def _age(root):
+    """Set the mtime of every directory under `root` to the past."""
+    for dirpath, _, _ in os.walk(root):
+        os.utime(dirpath, ns=(PAST_NS, PAST_NS))
+
+
+def _key(entries):
+    return [entry._replace(stat=None) for entry in entries]
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return tmp_path / "cache"
+
+
+@pytest.fixture
+def fileset(tmp_path):
+    root = tmp_path / "fileset"
+    (root / "a" / "b").mkdir(parents=True)
+    (root / "a" / "one.txt").write_text("1")
+    (root / "a" / "b" / "two.txt").write_text("22")
+    (root / "c").mkdir()
+    (root / "top.txt").write_text("")
+    _age(root)
+    return root
+
+
+class TestSnapshotCache:
+    def test_same_as_walker(self, fileset, cache_dir):
+        expected = _key(scandir_walk(str(fileset)))
+        cache = SnapshotCache(str(fileset), cache_dir)
+        assert _key(cache.walk(str(fileset))) == expected
+        assert (cache.hits, cache.misses) == (0, 4)
+        assert cache.path.parent == cache_dir
+
+        cache = SnapshotCache(str(fileset), cache_dir)
+        entries = list(cache.walk(str(fileset)))
+        assert _key(entries) == expected
+        assert all(entry.stat is not None for entry in entries)
+        assert (cache.hits, cache.misses) == (4, 0)
+
+    def test_without_stat(self, fileset, cache_dir):
+        list(SnapshotCache(str(fileset), cache_dir).walk(str(fileset)))
+        cache = SnapshotCache(str(fileset), cache_dir)
+        entries = list(cache.walk(str(fileset), stat=False))
+        assert _key(entries) == _key(scandir_walk(str(fileset)))
+        assert all(entry.stat is None for entry in entries)
+        assert cache.hits == 4
+
+    def test_added_and_removed(self, fileset, cache_dir):
+        list(SnapshotCache(str(fileset), cache_dir).walk(str(fileset)))
+        (fileset / "a" / "three.txt").touch()
+        os.rmdir(fileset / "c")
+
+        cache = SnapshotCache(str(fileset), cache_dir)
+        paths = [entry.rel_path for entry in cache.walk(str(fileset))]
+        assert "a/three.txt" in paths
+        assert "c/" not in paths
+        assert (cache.hits, cache.misses) == (1, 2)
+        assert "c/" not in SnapshotCache(str(fileset), cache_dir)._dirs
+
+    def test_modified_in_place(self, fileset, cache_dir):
+        list(SnapshotCache(str(fileset), cache_dir).walk(str(fileset)))
+        (fileset / "a" / "b" / "two.txt").write_text("a longer text")
+        _age(fileset)
+
+        cache = SnapshotCache(str(fileset), cache_dir)
+        sizes = {
+            entry.rel_path: entry.stat.st_size for entry in cache.walk(str(fileset))
+        }
+        assert cache.misses == 0
+        assert sizes["a/b/two.txt"] == len("a longer text")
+
+    def test_racy_listing(self, fileset, cache_dir):
+        os.utime(fileset / "a")
+        list(SnapshotCache(str(fileset), cache_dir).walk(str(fileset)))
+        cache = SnapshotCache(str(fileset), cache_dir)
+        list(cache.walk(str(fileset)))
+        assert (cache.hits, cache.misses) == (3, 1)
+
+    def test_skipped_kept(self, fileset, cache_dir):
+        """Listings under skipped directories are reused by later walks."""
+        list(SnapshotCache(str(fileset), cache_dir).walk(str(fileset)))
+        cache = SnapshotCache(str(fileset), cache_dir)
+        paths = [
+            entry.rel_path
+            for entry in cache.walk(str(fileset), descend=lambda d: d != "a/")
+        ]
+        assert "a/" in paths and "a/one.txt" not in paths
+        assert (cache.hits, cache.misses) == (2, 0)
+
+        cache = SnapshotCache(str(fileset), cache_dir)
+        assert _key(cache.walk(str(fileset))) == _key(scandir_walk(str(fileset)))
+        assert (cache.hits, cache.misses) == (4, 0)
+
+    def test_create_snapshot(self, fileset, cache_dir, monkeypatch):
+        def without_atime(files):
+            return [{k: v for k, v in f.items() if k != "atime_ns"} for f in files]
+
+        monkeypatch.setattr(config, "snapshot_cache_dir", cache_dir)
+        expected = without_atime(create_snapshot(str(fileset)))
+        assert not cache_dir.exists()
+        for _ in range(2):
+            files = create_snapshot(str(fileset), cache=True)
+            assert without_atime(files) == expected
+            assert len(list(cache_dir.iterdir())) == 1
@@ -26,6 +26,7 @@ class TestValidate:
         )
         assert result.exit_code == 1
         assert "failed" in result.stderr
+        assert "Query cache: 1 hits, 3 misses" in result.stderr
 
     def test_readme_example_with_symlink(self, runner):
         result = runner.invoke(
@@ -106,6 +107,33 @@ class TestValidate:
         elif fmt == "json":
             assert '"constraint_id": "count_min"' in result.stdout
 
+    @pytest.mark.parametrize("compression", ("none", "gzip"))
+    def test_snapshot(self, runner, tmp_path, compression):
+        output = str(tmp_path / "fileset0.djfv")
+        result = runner.invoke(
+            app,
+            [
+                "snapshot",
+                "--compression",
+                compression,
+                "tests/data/filesets/fileset0",
+                output,
+            ],
+        )
+        assert result.exit_code == 0
+        assert "Saved snapshot" in result.stderr
+
+        result = runner.invoke(
+            app,
+            [
+                "validate",
+                output,
+                "datajoint_file_validator/manifests/demo_dlc/v0.1.yaml",
+            ],
+        )
+        assert result.exit_code == 1
+        assert "failed" in result.stderr
+
     def test_list_manifests_basic(self, runner):
         result = runner.invoke(
             app,
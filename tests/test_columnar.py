@@ -0,0 +1,131 @@
+import pytest
+import datajoint_file_validator as djfval
+from datajoint_file_validator import columnar as columnar_module
+from datajoint_file_validator.columnar import Columns, ColumnarSnapshot
+from datajoint_file_validator.query import CompositeQuery
+
+
+@pytest.fixture(
+    params=(
+        "tests/data/filesets/fileset0",
+        "tests/data/filesets/fileset1",
+        "tests/data/filesets/fileset2",
+        "tests/data/filesets/fileset3.txt",
+    )
+)
+def snapshot(request):
+    return djfval.snapshot.create_snapshot(request.param)
+
+
+class TestColumnarSnapshot:
+    def test_round_trip(self, snapshot):
+        columnar = ColumnarSnapshot.from_records(snapshot)
+        assert len(columnar) == len(snapshot)
+        assert columnar.to_records() == snapshot
+        # Keys are in the same order as FileMetadata.asdict
+        assert [list(item) for item in columnar] == [list(item) for item in snapshot]
+
+    def test_derived_fields_not_stored(self, snapshot):
+        columnar = ColumnarSnapshot.from_records(snapshot)
+        for field in ("name", "rel_path", "abs_path", "last_modified"):
+            assert field not in columnar._columns
+
+    def test_timezone(self, snapshot, set_timezone):
+        """Rows do not depend on the timezone of the process that reads them."""
+        set_timezone("UTC")
+        columnar = ColumnarSnapshot.from_records(snapshot)
+        set_timezone("America/New_York")
+        assert columnar.to_records() == snapshot
+
+    def test_from_path(self):
+        path = "tests/data/filesets/fileset1"
+        paths = [item["path"] for item in ColumnarSnapshot.from_path(path)]
+        assert paths == [item["path"] for item in djfval.snapshot.create_snapshot(path)]
+
+    def test_indexing(self, snapshot):
+        columnar = ColumnarSnapshot.from_records(snapshot)
+        assert columnar[0] == snapshot[0]
+        assert columnar[-1] == snapshot[-1]
+        assert columnar[1:3].to_records() == snapshot[1:3]
+        with pytest.raises(IndexError):
+            columnar[len(snapshot)]
+
+    def test_heterogeneous_records(self, snapshot):
+        records = snapshot[:2] + [
+            dict(path="new_file.txt", type="file", extension=".txt", foo="bar")
+        ]
+        columnar = ColumnarSnapshot.from_records(records)
+        assert columnar.to_records() == records
+        assert columnar.column("foo")[-1] == "bar"
+
+    def test_missing_path(self):
+        with pytest.raises(ValueError):
+            ColumnarSnapshot.from_records([dict(type="file")])
+
+    @pytest.mark.parametrize(
+        "query",
+        (
+            {"path": "**"},
+            {"path": "*/", "type": "directory"},
+            {"path": "**/*.png", "type": "file"},
+            {"path": "*", "type": "file"},
+        ),
+    )
+    def test_query_filter(self, snapshot, query):
+        query = CompositeQuery.from_dict(query)
+        filtered = query.filter(ColumnarSnapshot.from_records(snapshot))
+        assert isinstance(filtered, ColumnarSnapshot)
+        assert filtered.to_records() == query.filter(snapshot)
+
+    def test_validate(self, manifest_dict):
+        snapshot = djfval.snapshot.create_snapshot("tests/data/filesets/fileset1")
+        manifest = djfval.Manifest.from_dict(manifest_dict)
+        assert djfval.validate(
+            ColumnarSnapshot.from_records(snapshot), manifest
+        ) == djfval.validate(snapshot, manifest)
+
+
+@pytest.fixture(params=("numpy", "no_numpy"))
+def numpy(request, monkeypatch):
+    """NumPy, if columns should be NumPy arrays, or None."""
+    if request.param == "numpy":
+        return pytest.importorskip("numpy")
+    monkeypatch.setattr(columnar_module, "_numpy", lambda: None)
+    return None
+
+
+def _values(column) -> list:
+    return column.tolist() if hasattr(column, "tolist") else list(column)
+
+
+class TestColumns:
+    def test_columns(self, snapshot, numpy):
+        columns = Columns(ColumnarSnapshot.from_records(snapshot))
+        assert len(columns) == len(snapshot)
+        assert {"path", "name", "extension", "size", "mtime_ns"} <= set(columns.fields)
+        for field in columns.fields:
+            assert field in columns
+            assert _values(columns[field]) == [item.get(field) for item in snapshot]
+        if numpy is not None:
+            assert isinstance(columns["size"], numpy.ndarray)
+            assert isinstance(columns["extension"], numpy.ndarray)
+        with pytest.raises(KeyError):
+            columns["not_a_field"]
+
+    def test_from_records(self, snapshot, numpy):
+        columns = Columns(snapshot)
+        assert _values(columns["path"]) == [item["path"] for item in snapshot]
+
+    def test_missing_values(self, numpy):
+        records = [{"path": "a.txt", "size": 1}, {"path": "b/"}, {"path": "c/d.txt"}]
+        columns = Columns(records)
+        assert _values(columns["size"]) == [1, None, None]
+        if numpy is not None:
+            assert columns["size"].sum() == 1
+
+    def test_read_only(self, numpy):
+        snapshot = ColumnarSnapshot.from_records([{"path": "a.txt", "size": 1}])
+        size = Columns(snapshot)["size"]
+        with pytest.raises((TypeError, ValueError)):
+            size[0] = 2
+        assert snapshot[0]["size"] == 1
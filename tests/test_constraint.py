@@ -1,11 +1,21 @@
 import pytest
+from concurrent.futures import ThreadPoolExecutor
+from cerberus import Validator
 from datajoint_file_validator.constraint import (
     Constraint,
     EvalConstraint,
     CountMinConstraint,
+    CountMaxConstraint,
     RegexConstraint,
 )
-from datajoint_file_validator.snapshot import create_snapshot, Snapshot
+from datajoint_file_validator.constraint import (
+    eval_cache,
+    validate_regex_constraints,
+    RegexBatch,
+)
+from datajoint_file_validator.constraint.schema import compile_schema
+from datajoint_file_validator.columnar import ColumnarSnapshot
+from datajoint_file_validator.snapshot import create_snapshot, Snapshot, ALL_FIELDS
 from datajoint_file_validator.error import DJFileValidatorError
 from datajoint_file_validator.config import config
 
@@ -36,7 +46,41 @@ class TestCountMinConstraint:
         assert c.val == "a string"
 
 
+class TestAccumulator:
+    @pytest.mark.parametrize(
+        "constraint",
+        (
+            CountMinConstraint(2),
+            CountMinConstraint(100),
+            CountMaxConstraint(2),
+            RegexConstraint(".*"),
+            RegexConstraint(".*\\.png"),
+        ),
+    )
+    def test_same_as_validate(self, snapshot_fileset1: Snapshot, constraint):
+        accumulator = constraint.start()
+        for entry in snapshot_fileset1:
+            accumulator.update(entry)
+        result = accumulator.finish()
+        expected = constraint.validate(snapshot_fileset1)
+        assert (result.status, result.message) == (expected.status, expected.message)
+        assert result.context["snapshot"] is None
+        assert result.context["constraint"] is constraint
+
+    def test_count(self):
+        accumulator = CountMinConstraint(2).start()
+        accumulator.update({"path": "a.txt"})
+        assert accumulator.finish().context["count"] == 1
+
+    def test_eval(self):
+        assert EvalConstraint("def func(snapshot): return True").start() is None
+
+
 class TestRegexConstraint:
+    def test_fields(self):
+        assert RegexConstraint(".+").fields == {"path"}
+        assert CountMinConstraint(2).fields == set()
+
     def test_basic_usage_pass(self, snapshot_fileset1: Snapshot):
         c = RegexConstraint(".+")
         assert c.val == ".+"
@@ -62,6 +106,101 @@ class TestRegexConstraint:
             result = c.validate(snapshot_fileset1)
             assert result.status is True
 
+    def test_compiled_messages(self, snapshot_fileset1: Snapshot):
+        c = RegexConstraint("^.+\\.png$")
+        result = c.validate(snapshot_fileset1)
+        schema = c.to_schema()
+        assert result.message == {
+            file["path"]: c._validate_file(schema, file).errors
+            for file in snapshot_fileset1
+            if not file["path"].endswith(".png")
+        }
+        assert result.message["obs.md"] == {
+            "path": ["value does not match regex '^.+\\.png$'"]
+        }
+
+    @pytest.mark.parametrize(
+        "patterns",
+        (
+            [".+", "^.+\\.png$", "2021-10-0[12]/.*"],
+            ["(.)\\1*.*", ".*\\.txt"],
+            ["(?i)readme\\.TXT", ".*"],
+            ["[a-z]+/"],
+        ),
+    )
+    @pytest.mark.parametrize("columnar", (False, True))
+    def test_batch(self, snapshot_fileset1: Snapshot, patterns, columnar):
+        snapshot = snapshot_fileset1
+        if columnar:
+            snapshot = ColumnarSnapshot.from_records(snapshot)
+        constraints = [RegexConstraint(pattern) for pattern in patterns]
+        results = validate_regex_constraints(constraints, snapshot)
+        for constraint, result in zip(constraints, results):
+            expected = constraint.validate(snapshot)
+            assert (result.status, result.message) == (
+                expected.status,
+                expected.message,
+            )
+            assert result.context["constraint"] is constraint
+
+    @pytest.mark.parametrize("keep_matches", (False, True))
+    def test_batch_snapshots(self, snapshot_fileset1: Snapshot, keep_matches):
+        """Constraints of a batch validate different snapshots."""
+        patterns = [".*\\.png", "(?i).*\\.TXT", "(.)\\1*.*", ".*\\.png"]
+        constraints = [RegexConstraint(pattern) for pattern in patterns]
+        batch = RegexBatch(constraints, keep_matches=keep_matches)
+        for k, constraint in enumerate(constraints):
+            snapshot = snapshot_fileset1[k::2]
+            result = batch.validate(k, snapshot)
+            expected = constraint.validate(snapshot)
+            assert (result.status, result.message) == (
+                expected.status,
+                expected.message,
+            )
+            accumulator = batch.start(k)
+            for entry in snapshot:
+                accumulator.update(entry)
+            assert accumulator.finish().message == expected.message
+
+
+SCHEMAS = [
+    {"path": {"type": "string", "required": True, "regex": ".*\\.png"}},
+    {"path": {"regex": "a|b"}, "size": {"type": "integer", "min": 3, "max": 10}},
+    {"size": {"type": ["integer", "float"], "allowed": [1, 3.5], "nullable": True}},
+    {"type": {"allowed": ("file",), "required": True}, "name": {"min": "b"}},
+    {"tags": {"type": "list", "allowed": ["x", "y"]}, "z": {"required": True}},
+]
+ENTRIES = [
+    {},
+    {"path": "x.png", "size": 3, "type": "file", "name": "c", "z": 0},
+    {"path": "obs.md", "size": 11, "type": "directory", "name": "a"},
+    {"path": None, "size": None, "type": None, "tags": None},
+    {"path": 1, "size": "1", "type": ["file", "x"], "name": 1, "tags": ["x", 2]},
+    {"path": "a", "size": 3.5, "tags": "xy", "other": None},
+]
+
+
+class TestCompiledSchema:
+    @pytest.mark.parametrize("schema", SCHEMAS)
+    @pytest.mark.parametrize("entry", ENTRIES)
+    def test_same_as_cerberus(self, schema, entry):
+        validator = Validator(allow_unknown=True)
+        validator.validate(entry, schema)
+        assert repr(compile_schema(schema)(entry)) == repr(validator.errors)
+
+    @pytest.mark.parametrize(
+        "schema",
+        (
+            {"path": {"minlength": 1}},
+            {"path": {"type": "not_a_type"}},
+            {"path": {"regex": "("}},
+            {"path": {"required": "yes"}},
+            {"path": "string"},
+        ),
+    )
+    def test_unsupported(self, schema):
+        assert compile_schema(schema) is None
+
 
 class TestEvalConstraint:
     def test_error_if_disabled(
@@ -108,6 +247,121 @@ class TestEvalConstraint:
         with pytest.raises(DJFileValidatorError):
             c.validate(snapshot_fileset1)
 
+    def test_compiled_once(self, snapshot_fileset1: Snapshot, monkeypatch):
+        eval_cache.clear()
+        calls = []
+        compile_function = EvalConstraint._eval_function
+        monkeypatch.setattr(
+            EvalConstraint,
+            "_eval_function",
+            staticmethod(lambda d: calls.append(d) or compile_function(d)),
+        )
+        definition = "def func(snapshot) -> bool: return len(snapshot) > 0"
+        for _ in range(3):
+            assert EvalConstraint(definition).validate(snapshot_fileset1).status
+        # Fields are parsed without compiling or consulting the cache
+        assert EvalConstraint(definition).fields == ALL_FIELDS
+        assert calls == [definition]
+        assert (eval_cache.hits, eval_cache.misses) == (2, 1)
+
+    def test_columnar(self, snapshot_fileset1: Snapshot):
+        definition = (
+            "def func(columns) -> bool:\n"
+            "    return list(columns['extension']).count('.png') == {}\n"
+            "func.columnar = True\n"
+        )
+        n_png = sum(item["extension"] == ".png" for item in snapshot_fileset1)
+        result = EvalConstraint(definition.format(n_png)).validate(snapshot_fileset1)
+        assert result.status is True
+        assert result.context["snapshot"] is snapshot_fileset1
+        assert not EvalConstraint(definition.format(n_png + 1)).validate(
+            snapshot_fileset1
+        )
+
+    def test_error_cached(self, snapshot_fileset1: Snapshot):
+        eval_cache.clear()
+        c = EvalConstraint("def func(snapshot) -> bool: return (")
+        messages = []
+        for _ in range(2):
+            with pytest.raises(DJFileValidatorError) as exc_info:
+                c.validate(snapshot_fileset1)
+            messages.append(str(exc_info.value))
+        assert "SyntaxError" in messages[0]
+        assert messages[0] == messages[1]
+        assert (eval_cache.hits, eval_cache.misses) == (1, 1)
+
+    def test_error_raised_fresh(self):
+        eval_cache.clear()
+        definition = "def func(snapshot) -> bool: return ("
+        errors = []
+        for _ in range(2):
+            with pytest.raises(SyntaxError) as exc_info:
+                eval_cache.get(definition)
+            errors.append(exc_info.value)
+        assert errors[0] is not errors[1]
+        assert str(errors[0]) == str(errors[1])
+        assert errors[1].__context__ is None
+
+    def test_cache_threads(self):
+        eval_cache.clear()
+        definitions = [f"def func{i}(snapshot): return True" for i in range(20)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for _ in range(5):
+                list(executor.map(eval_cache.get, definitions))
+        assert eval_cache.hits + eval_cache.misses == 100
+        assert eval_cache.misses == 20
+
+    def test_cache_eviction(self, monkeypatch):
+        eval_cache.clear()
+        monkeypatch.setattr(config, "eval_cache_size", 2)
+        definitions = [f"def func{i}(snapshot): return True" for i in range(3)]
+        for definition in definitions:
+            eval_cache.get(definition)
+        eval_cache.get(definitions[1])
+        assert len(eval_cache) == 2
+        assert eval_cache.hits == 1
+        # The least recently used definition was evicted
+        eval_cache.get(definitions[0])
+        assert eval_cache.misses == 4
+        eval_cache.get(definitions[1])
+        assert eval_cache.hits == 2
+
+    def test_fields_declared(self):
+        c = EvalConstraint(
+            "def func(snapshot):\n"
+            "    return all(f['extension'] for f in snapshot)\n"
+            "func.fields = ['extension']"
+        )
+        assert c.fields == {"extension"}
+
+    def test_fields_default(self):
+        c = EvalConstraint("def func(snapshot):\n    return True")
+        assert c.fields == ALL_FIELDS
+        assert EvalConstraint("lambda x: x > 0").fields == ALL_FIELDS
+
+    def test_fields_not_run(self):
+        eval_cache.clear()
+        c = EvalConstraint(
+            "raise RuntimeError('ran')\n"
+            "def func(snapshot):\n    return True\n"
+            "func.fields = ['extension']"
+        )
+        assert c.fields == {"extension"}
+        assert len(eval_cache) == 0
+
+    def test_fields_not_literal(self):
+        c = EvalConstraint(
+            "def func(snapshot):\n    return True\n"
+            "func.fields = sorted(['extension'])"
+        )
+        assert c.fields == ALL_FIELDS
+
+    def test_fields_if_disabled(self, disable_feature_allow_eval):
+        c = EvalConstraint(
+            "def func(snapshot):\n    return True\nfunc.fields = ['extension']"
+        )
+        assert c.fields == ALL_FIELDS
+
     def test_syntax_error(self, snapshot_fileset1: Snapshot):
         """Raises error due to trailing parenthesis."""
         c = EvalConstraint(
@@ -0,0 +1,66 @@
+import pytest
+from datajoint_file_validator.columnar import ColumnarSnapshot
+from datajoint_file_validator.diff import diff_snapshots, SnapshotDiff
+from datajoint_file_validator.snapshot import create_snapshot
+
+
+def _entry(path, size=0, mtime_ns=0):
+    return dict(path=path, rel_path=path, size=size, mtime_ns=mtime_ns)
+
+
+@pytest.fixture
+def old():
+    return [_entry("a.txt"), _entry("b/"), _entry("b/c.txt", 1), _entry("d.txt")]
+
+
+@pytest.fixture
+def new():
+    return [
+        _entry("a.txt"),
+        _entry("b/"),
+        _entry("b/c.txt", 2),
+        _entry("b/e.txt"),
+        _entry("f.txt", mtime_ns=1),
+    ]
+
+
+class TestDiffSnapshots:
+    def test_basic(self, old, new):
+        diff = diff_snapshots(old, new)
+        assert [e["path"] for e in diff.added] == ["b/e.txt", "f.txt"]
+        assert [e["path"] for e in diff.removed] == ["d.txt"]
+        assert diff.modified == [(old[2], new[2])]
+        assert diff.changed_paths == {"b/e.txt", "f.txt", "d.txt", "b/c.txt"}
+        assert diff
+
+    def test_mtime_modified(self, old):
+        new = [dict(e) for e in old]
+        new[0]["mtime_ns"] = 5
+        assert diff_snapshots(old, new).modified == [(old[0], new[0])]
+
+    def test_unchanged(self, old):
+        diff = diff_snapshots(old, iter(old))
+        assert diff == SnapshotDiff()
+        assert not diff
+
+    def test_columnar(self, old, new):
+        expected = diff_snapshots(old, new)
+        diff = diff_snapshots(
+            ColumnarSnapshot.from_records(old), ColumnarSnapshot.from_records(new)
+        )
+        assert isinstance(diff.added, ColumnarSnapshot)
+        assert diff.added.to_records() == expected.added
+        assert diff.removed.to_records() == expected.removed
+        assert diff.modified == expected.modified
+
+    def test_fileset(self, tmp_path):
+        (tmp_path / "a.txt").write_text("a")
+        (tmp_path / "b.txt").touch()
+        old = create_snapshot(str(tmp_path))
+        (tmp_path / "a.txt").write_text("a longer text")
+        (tmp_path / "b.txt").unlink()
+        (tmp_path / "c.txt").touch()
+        diff = diff_snapshots(old, create_snapshot(str(tmp_path)))
+        assert [e["path"] for e in diff.added] == ["c.txt"]
+        assert [e["path"] for e in diff.removed] == ["b.txt"]
+        assert [new["size"] for _, new in diff.modified] == [len("a longer text")]
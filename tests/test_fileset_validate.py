@@ -1,3 +1,4 @@
+import time
 import pytest
 from typing import Tuple, Dict, Union
 from pathlib import PurePath
@@ -496,3 +497,137 @@ class TestSnapshotValidation:
         assert not success
         assert "max_md_files" in failed_rules
         assert "max_md_files_eval" in failed_rules
+
+    def test_snapshot_streamed(self, snapshot_dict, manifest_dict):
+        """Validating an iterator of entries gives the same report as a list."""
+        expected = self._validate(snapshot_dict, manifest_dict)
+        assert self._validate(iter(snapshot_dict), manifest_dict) == expected
+        assert (
+            self._validate((item for item in snapshot_dict), manifest_dict) == expected
+        )
+
+    def test_revalidate(self, snapshot_dict, manifest_dict):
+        """Revalidating after a change gives the same report as validating."""
+        manifest_dict["rules"].append(
+            dict(id="max_md_files", query="*.md", count_max=1)
+        )
+        manifest = djfval.Manifest.from_dict(manifest_dict)
+        previous = djfval.main.validate_rules(snapshot_dict, manifest)
+
+        new_snapshot = snapshot_dict[1:] + [
+            self._new_file(f"new_file_{i}.txt") for i in range(5)
+        ]
+        diff = djfval.diff.diff_snapshots(snapshot_dict, new_snapshot)
+        results = djfval.main.revalidate_rules(new_snapshot, manifest, previous, diff)
+        assert djfval.main.report_results(
+            results, manifest
+        ) == djfval.main.validate_snapshot(new_snapshot, manifest)
+
+        # Unaffected rules are reused, and counts are updated by delta
+        assert results[-1] is previous[-1]
+        assert results[2]["count_max"].context["count"] == 6
+        assert results[2]["count_max"].context["snapshot"] is None
+        assert not results[2]["count_max"]
+
+    def test_revalidate_unchanged(self, snapshot_dict, manifest_dict):
+        manifest = djfval.Manifest.from_dict(manifest_dict)
+        previous = djfval.main.validate_rules(snapshot_dict, manifest)
+        diff = djfval.diff.diff_snapshots(snapshot_dict, snapshot_dict)
+        results = djfval.main.revalidate_rules(snapshot_dict, manifest, previous, diff)
+        assert all(a is b for a, b in zip(results, previous))
+
+    def test_revalidate_time_relative(self, monkeypatch):
+        """Rules on the age of files are validated again as time passes."""
+        now = time.time_ns()
+        snapshot = [{"path": "a.txt", "type": "file", "mtime_ns": now - 10**10}]
+        manifest = djfval.Manifest.from_dict(
+            {
+                "id": "test",
+                "rules": [
+                    {
+                        "id": "recent",
+                        "query": {"mtime": {"max_age": 60}},
+                        "count_min": 1,
+                    }
+                ],
+            }
+        )
+        previous = djfval.main.validate_rules(snapshot, manifest)
+        assert previous[0]["count_min"]
+        monkeypatch.setattr(time, "time_ns", lambda: now + 120 * 10**9)
+        diff = djfval.diff.diff_snapshots(snapshot, snapshot)
+        results = djfval.main.revalidate_rules(snapshot, manifest, previous, diff)
+        assert not results[0]["count_min"]
+        with pytest.raises(ValueError):
+            manifest.rules[0].count_delta(diff)
+
+    def test_streamed(self, snapshot_dict, monkeypatch):
+        """Only the entries of rules that cannot stream are kept."""
+        manifest = djfval.Manifest.from_dict(
+            {
+                "id": "test",
+                "rules": [
+                    {"id": "count", "count_min": 1, "regex": ".*"},
+                    {"id": "png", "query": "**/*.png", "count_max": 1},
+                    {"id": "eval", "query": "*", "eval": "def f(s): return len(s) > 0"},
+                ],
+            }
+        )
+        streams = []
+        stream = djfval.main.QueryPlan.stream
+        monkeypatch.setattr(
+            djfval.main.QueryPlan,
+            "stream",
+            lambda self, entries, consumers: streams.append(consumers)
+            or stream(self, entries, consumers),
+        )
+        results = djfval.main.validate_rules(iter(snapshot_dict), manifest)
+        assert [consumer is None for consumer in streams[0]] == [False, False, True]
+        assert [
+            {name: (r.status, r.message) for name, r in rule_results.items()}
+            for rule_results in results
+        ] == [
+            {name: (r.status, r.message) for name, r in rule_results.items()}
+            for rule_results in djfval.main.validate_rules(snapshot_dict, manifest)
+        ]
+
+    @pytest.mark.parametrize("streamed", (False, True))
+    def test_regex_batched(self, snapshot_dict, monkeypatch, streamed):
+        """Regex rules are validated in one batch, whatever their query."""
+        patterns = (".*", ".*\\.png", "2021-.*", "(?i)README.TXT|.*/")
+        manifest = djfval.Manifest.from_dict(
+            {
+                "id": "test",
+                "rules": [
+                    {"id": f"rule{i}", "regex": p} for i, p in enumerate(patterns)
+                ]
+                + [
+                    {"id": "top", "query": "*", "regex": ".*\\.md"},
+                    {"id": "png", "query": "**/*.png", "regex": "2021-.*"},
+                ],
+            }
+        )
+        batches, calls = [], []
+        match_patterns = djfval.constraint._match_patterns
+
+        def counted(batch_patterns):
+            batches.append(len(batch_patterns))
+            match = match_patterns(batch_patterns)
+            return lambda path: calls.append(path) or match(path)
+
+        monkeypatch.setattr(djfval.constraint, "_match_patterns", counted)
+        snapshot = iter(snapshot_dict) if streamed else snapshot_dict
+        results = djfval.main.validate_rules(snapshot, manifest)
+        # Distinct patterns, each path matched once
+        assert batches == [len(patterns) + 1]
+        assert sorted(calls) == sorted(entry["path"] for entry in snapshot_dict)
+        assert [
+            {name: (r.status, r.message) for name, r in rule_results.items()}
+            for rule_results in results
+        ] == [
+            {
+                name: (r.status, r.message)
+                for name, r in rule.validate(snapshot_dict).items()
+            }
+            for rule in manifest.rules
+        ]
@@ -0,0 +1,195 @@
+import pytest
+from datajoint_file_validator.columnar import ColumnarSnapshot
+from datajoint_file_validator.index import (
+    IndexedSnapshot,
+    SnapshotIndex,
+    get_index,
+    glob_plan,
+    prune_matcher,
+)
+from datajoint_file_validator.path_utils import compile_glob
+from datajoint_file_validator.query import GlobQuery, TypeQuery
+from datajoint_file_validator.snapshot import create_snapshot
+
+PATHS = [
+    "README.txt",
+    "obs.md",
+    "2021-10-01/",
+    "2021-10-01/obs.txt",
+    "2021-10-01/subject1_frame0.png",
+    "2021-10-02/",
+    "2021-10-02/obs.md",
+    "2021-10-02/subject1_frame1.png",
+    "2021-10-02/foo/",
+    "2021-10-02/foo/bar.txt",
+    "2021-10-02/foo/.hidden/",
+    "2021-10-02/foo/.hidden/x.txt",
+    "deep/a/b/c.png",
+    "archive.tar.gz",
+    "session.d/",
+    "session.d/trailing.",
+]
+
+PATTERNS = [
+    "*",
+    "*/",
+    "*.md",
+    "*/*",
+    "*/*.png",
+    "*/foo/*",
+    "2021-10-02",
+    "2021-10-02/",
+    "2021-10-02/*",
+    "2021-10-02/**",
+    "2021-10-02/**/*.txt",
+    "2021-10-02/foo/bar.txt",
+    "2021-10-0?/*.png",
+    "deep/**",
+    "deep/a/b/*",
+    "missing/**",
+    "**",
+    "**/*.png",
+    "**/*.txt",
+    "**/*.tar.gz",
+    "**/*.d/",
+    "**/*.",
+    "**/frame*.png",
+    "**/*[.]txt",
+    "./*",
+    "2021-10-02//obs.md",
+    ["*.md", "2021-10-01/*"],
+]
+
+
+@pytest.fixture
+def snapshot():
+    return IndexedSnapshot({"path": path} for path in PATHS)
+
+
+class TestSnapshotIndex:
+    @pytest.mark.parametrize("pattern", PATTERNS)
+    def test_matches_glob(self, pattern):
+        index = SnapshotIndex(PATHS)
+        match = compile_glob(pattern)
+        expected = [i for i, path in enumerate(PATHS) if match(path)]
+        indices = index.glob(pattern)
+        if glob_plan(pattern) is None:
+            assert indices is None
+        else:
+            assert indices == expected
+
+    def test_plan(self):
+        assert glob_plan("2021-10-02/foo/*.txt") == (
+            (("2021-10-02", "foo"), 1, ".txt"),
+        )
+        assert glob_plan("*/foo/*") == (((), 3, None),)
+        assert glob_plan("deep/**/*.png") == ((("deep",), None, ".png"),)
+        assert glob_plan("**/*.tar.gz") == (((), None, ".gz"),)
+        assert glob_plan("**/frame_*") is None
+        assert glob_plan("**") is None
+        assert glob_plan("./*") is None
+
+    @pytest.mark.parametrize(
+        "pattern, exclude",
+        (
+            ("**", "2021-10-02/**"),
+            ("**", ["**/foo/**", "deep/a/**"]),
+            ("2021-10-02/**", "2021-10-02/**"),
+            ("2021-10-02/**", "*/foo/**"),
+            ("*/*", "2021-10-01/**"),
+            ("**/*.txt", "**/foo/**"),
+            ("2021-10-02/foo/.hidden/*", "2021-10-02/foo/**"),
+            ("**", "*.md"),
+        ),
+    )
+    def test_exclude(self, pattern, exclude):
+        index = SnapshotIndex(PATHS)
+        match = compile_glob(pattern, exclude=exclude)
+        expected = [i for i, path in enumerate(PATHS) if match(path)]
+        indices = index.glob(pattern, exclude)
+        if glob_plan(pattern) is None and prune_matcher(pattern, exclude) is None:
+            assert indices is None
+        else:
+            assert indices == expected
+
+    def test_prune(self):
+        trie = SnapshotIndex(PATHS).trie
+        skip = prune_matcher("**", "2021-10-02/**")
+        assert skip("2021-10-02/") and skip("2021-10-02/foo/")
+        assert not skip("2021-10-01/")
+        candidates = trie.candidates((), None, skip)
+        assert [PATHS[i] for i in sorted(candidates)] == [
+            p for p in PATHS if p == "2021-10-02/" or not p.startswith("2021-10-02/")
+        ]
+        assert trie.candidates(("2021-10-02", "foo"), None, skip) == []
+        # Hidden entries are not excluded by wildcards, so cannot be pruned
+        assert prune_matcher(".hidden/*", "**/foo/**") is None
+        assert prune_matcher("**", "*.md") is None
+
+    def test_trie(self):
+        trie = SnapshotIndex(PATHS).trie
+        node = trie.find(["2021-10-02"])
+        assert node.self_index == PATHS.index("2021-10-02/")
+        assert sorted(trie.subtree(node)) == list(range(5, 12))
+        assert trie.at_depth(node, 2) == [9, 10]
+        assert sorted(trie.candidates(["deep"], None)) == [12]
+        assert trie.find(["missing"]) is None
+        # Directories without entries of their own are still in the trie
+        assert trie.find(["deep", "a"]).self_index is None
+
+    def test_secondary_indexes(self):
+        index = SnapshotIndex(PATHS, ["file", "directory"] * 8)
+        assert index.extensions[".txt"] == [0, 3, 9, 11]
+        assert index.extensions[".d"] == [14]
+        assert index.depths[1] == [0, 1, 2, 5, 13, 14]
+        assert index.of_type("directory") == list(range(1, 16, 2))
+        assert index.of_type("symlink") == []
+        assert SnapshotIndex(PATHS).of_type("file") == []
+
+    def test_in_range(self):
+        sizes = [5, None, 3, 5, 1]
+        index = SnapshotIndex(["a", "b", "c", "d", "e"], column={"size": sizes}.get)
+        assert list(index.sorted_by("size")[0]) == [1, 3, 5, 5]
+        assert index.in_range("size", 3, 5) == [0, 2, 3]
+        assert index.in_range("size", min=4) == [0, 3]
+        assert index.in_range("size", max=0) == []
+        assert index.in_range("size") == [0, 2, 3, 4]
+
+
+class TestIndexedSnapshot:
+    def test_lazy(self, snapshot):
+        assert snapshot._index is None
+        assert get_index(snapshot) is snapshot.snapshot_index
+        assert get_index(list(snapshot)) is None
+
+    def test_list_methods(self, snapshot):
+        """Indexed snapshots keep the methods of a list."""
+        columnar = ColumnarSnapshot.from_records(snapshot)
+        for indexed in (snapshot, columnar):
+            assert indexed.index(snapshot[2]) == 2
+            assert indexed.count(snapshot[2]) == 1
+
+    @pytest.mark.parametrize("pattern", PATTERNS)
+    def test_glob_query(self, snapshot, pattern):
+        query = GlobQuery(pattern)
+        expected = query.filter(list(snapshot))
+        assert query.filter(snapshot) == expected
+        columnar = ColumnarSnapshot.from_records(snapshot)
+        assert get_index(columnar) is columnar.snapshot_index
+        assert query.filter(columnar).to_records() == expected
+
+    @pytest.mark.parametrize("file_type", ("file", "directory", "symlink"))
+    def test_type_query(self, file_type):
+        snapshot = create_snapshot("tests/data/filesets/fileset1")
+        query = TypeQuery(file_type)
+        expected = query.filter(snapshot)
+        assert query.filter(IndexedSnapshot(snapshot)) == expected
+        columnar = ColumnarSnapshot.from_records(snapshot)
+        assert query.filter(columnar).to_records() == expected
+
+    def test_fileset(self):
+        snapshot = create_snapshot("tests/data/filesets/fileset1")
+        indexed = IndexedSnapshot(snapshot)
+        for pattern in ("*", "*/*", "*/**", "**/*.png"):
+            query = GlobQuery(pattern)
+            assert query.filter(indexed) == query.filter(snapshot)
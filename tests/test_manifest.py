@@ -2,12 +2,16 @@ import pytest
 import re
 import yaml
 from copy import deepcopy
+from dataclasses import replace
 from typing import List, Dict, Union
 from wcmatch import glob, pathlib
 from datajoint_file_validator import Manifest
 from datajoint_file_validator.yaml import read_yaml, is_reference
 from datajoint_file_validator.error import InvalidManifestError
 from datajoint_file_validator.config import config
+from datajoint_file_validator.main import validate
+from datajoint_file_validator.planner import descend_filter
+from datajoint_file_validator.snapshot import create_snapshot
 from . import logger
 
 
@@ -53,6 +57,22 @@ class TestManifest:
         duplicate_ids = [mani_id for mani_id in mani_ids if mani_ids.count(mani_id) > 1]
         assert len(mani_ids) == len(set(mani_ids)), f"Duplicate ids: {duplicate_ids}"
 
+    def test_fields(self):
+        mani = Manifest.from_dict(
+            {
+                "id": "test",
+                "rules": [
+                    {"query": {"path": "*.png", "type": "file"}, "count_min": 1},
+                    {"regex": ".+"},
+                ],
+            }
+        )
+        assert mani.fields == {"path", "type"}
+        mani = Manifest.from_yaml(
+            "datajoint_file_validator/manifests/demo_dlc/v0.1.yaml"
+        )
+        assert mani.fields == {"path", "extension"}
+
     def test_check_valid(self, manifest_dict, tmp_path):
         """
         Checks the Manifest.check_valid method.
@@ -86,3 +106,39 @@ class TestManifest:
             Manifest.from_dict(invalid_dict, check_valid=True)
         with pytest.raises(InvalidManifestError):
             Manifest.from_yaml(fp_invalid, check_valid=True)
+
+    def test_ignore(self, tmp_path):
+        (tmp_path / "cache").mkdir()
+        (tmp_path / "cache" / "a.txt").touch()
+        (tmp_path / "b.txt").touch()
+        mani = Manifest.from_dict(
+            {
+                "id": "test",
+                "ignore": ["cache/"],
+                "rules": [{"count_max": 1}, {"query": "**/*.txt", "count_max": 1}],
+            }
+        )
+        assert all(rule.query.match({"path": "b.txt"}) for rule in mani.rules)
+        for path in ("cache/", "cache/a.txt"):
+            assert not any(rule.query.match({"path": path}) for rule in mani.rules)
+        assert descend_filter([rule.query for rule in mani.rules])("cache/") is False
+        assert validate(str(tmp_path), mani)[0]
+        assert validate(create_snapshot(str(tmp_path)), mani)[0]
+
+    def test_ignore_round_trip(self):
+        """Ignored paths are only folded into the rules once."""
+        mani = Manifest.from_dict(
+            {
+                "id": "test",
+                "ignore": ["cache/"],
+                "rules": [{"count_max": 1}, {"query": {"path": "*", "type": "file"}}],
+            }
+        )
+        copy = replace(mani)
+        assert copy.rules == mani.rules
+        assert hash(copy) == hash(mani)
+        assert replace(copy, description="copy").rules == mani.rules
+
+    def test_ignore_invalid(self):
+        with pytest.raises(InvalidManifestError):
+            Manifest.from_dict({"id": "test", "ignore": "cache/", "rules": []})
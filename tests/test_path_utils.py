@@ -1,6 +1,12 @@
 import os
 import pytest
-from datajoint_file_validator.path_utils import find_matching_paths
+from wcmatch import glob
+from datajoint_file_validator.path_utils import (
+    GLOB_FLAGS,
+    compile_glob,
+    find_matching_files,
+    find_matching_paths,
+)
 
 
 @pytest.fixture
@@ -84,3 +90,42 @@ def test_example0_paths(example0_paths):
         "2021-10-01/",
         "2021-10-02/",
     }
+
+
+@pytest.mark.parametrize(
+    "patterns",
+    (
+        "**",
+        "*",
+        "*/",
+        "**/*.png",
+        "2021-10-02",
+        "2021-10-02/**",
+        "[!R]*",
+        "?????????/*.md",
+        ["*.md", "**/*.txt"],
+        [],
+    ),
+)
+def test_compiled_same_as_wcmatch(example0_paths, patterns):
+    paths = sorted(example0_paths) + ["", ".hidden", "a/.b/c.png"]
+    match = compile_glob(patterns)
+    for path in paths:
+        assert match(path) == glob.globmatch(path, patterns, flags=GLOB_FLAGS)
+    assert find_matching_paths(paths, patterns) == glob.globfilter(
+        paths, patterns, flags=GLOB_FLAGS
+    )
+
+
+def test_compile_glob_cached():
+    assert compile_glob("**/*.png") is compile_glob("**/*.png")
+    assert compile_glob(["*.md", "*.txt"]) is compile_glob(("*.md", "*.txt"))
+    assert compile_glob("*", exclude="*.md")("obs.txt")
+    assert not compile_glob("*", exclude="*.md")("obs.md")
+
+
+def test_find_matching_files(example0_paths):
+    snapshot = [dict(path=path) for path in sorted(example0_paths)]
+    assert [file["path"] for file in find_matching_files(snapshot, "*.md")] == [
+        "obs.md"
+    ]
@@ -0,0 +1,209 @@
+import pytest
+from dataclasses import dataclass
+from datajoint_file_validator.columnar import ColumnarSnapshot
+from datajoint_file_validator.index import IndexedSnapshot
+from datajoint_file_validator.planner import QueryCache, QueryPlan, descend_filter
+from datajoint_file_validator.query import (
+    Query,
+    GlobQuery,
+    TypeQuery,
+    RangeQuery,
+    CompositeQuery,
+)
+from datajoint_file_validator.snapshot import create_snapshot
+from datajoint_file_validator.manifest import Manifest
+from datajoint_file_validator.main import validate, validate_snapshot
+
+
+@dataclass(frozen=True)
+class NameQuery(Query):
+    """A query that the planner cannot decompose."""
+
+    name: str = ""
+
+    def filter(self, snapshot):
+        return [metadata for metadata in snapshot if self.match(metadata)]
+
+    def match(self, metadata):
+        return metadata.get("name") == self.name
+
+
+QUERIES = [
+    GlobQuery("**"),
+    GlobQuery("**/*.png"),
+    GlobQuery("*/*.png"),
+    GlobQuery("2021-10-02/*"),
+    GlobQuery("2021-10-02/**/*.txt"),
+    GlobQuery(["*.md", "*/obs.*"]),
+    TypeQuery("directory"),
+    CompositeQuery.from_dict({"path": "**/*.png", "type": "file"}),
+    CompositeQuery.from_dict({"path": "**", "type": "directory"}),
+    CompositeQuery([GlobQuery("**/*.png"), GlobQuery("*/*")]),
+    CompositeQuery(),
+    NameQuery("obs.md"),
+    GlobQuery("**/*.png"),
+]
+
+
+@pytest.fixture(scope="module")
+def snapshot():
+    return create_snapshot("tests/data/filesets/fileset1")
+
+
+class TestQueryPlan:
+    def test_scan(self, snapshot):
+        filtered = QueryPlan(QUERIES).scan(snapshot)
+        assert filtered == [query.filter(snapshot) for query in QUERIES]
+
+    def test_stream(self, snapshot):
+        filtered = QueryPlan(QUERIES).filter(iter(snapshot))
+        assert filtered == [query.filter(snapshot) for query in QUERIES]
+
+    @pytest.mark.parametrize(
+        "indexed", (IndexedSnapshot, ColumnarSnapshot.from_records)
+    )
+    def test_indexed(self, snapshot, indexed):
+        filtered = QueryPlan(QUERIES).filter(indexed(snapshot))
+        assert [list(f) for f in filtered] == [
+            query.filter(snapshot) for query in QUERIES
+        ]
+
+    @pytest.mark.parametrize(
+        "indexed", (IndexedSnapshot, ColumnarSnapshot.from_records)
+    )
+    def test_range_order(self, snapshot, indexed):
+        """Indexed snapshots filter in snapshot order, like iterables."""
+        queries = [RangeQuery("size", 1), RangeQuery("size", None, 10**6)]
+        filtered = QueryPlan(queries).filter(indexed(snapshot))
+        assert [list(f) for f in filtered] == QueryPlan(queries).filter(iter(snapshot))
+
+    def test_consumers(self, snapshot):
+        consumed = [[] for _ in QUERIES]
+        consumers = [
+            None if i % 2 else entries.append for i, entries in enumerate(consumed)
+        ]
+        filtered = QueryPlan(QUERIES).stream(iter(snapshot), consumers)
+        for i, query in enumerate(QUERIES):
+            if i % 2:
+                assert filtered[i] == query.filter(snapshot)
+                assert consumed[i] == []
+            else:
+                assert filtered[i] is None
+                assert consumed[i] == query.filter(snapshot)
+
+    def test_shared_buckets(self, snapshot):
+        filtered = QueryPlan(QUERIES).scan(snapshot)
+        assert filtered[1] is filtered[-1]
+        assert filtered[1] is not filtered[2]
+
+
+class TestQueryCache:
+    def test_counters(self, snapshot):
+        cache = QueryCache()
+        plan = QueryPlan(QUERIES)
+        filtered = plan.filter(snapshot, cache=cache)
+        # GlobQuery with a list of patterns is unhashable, so never cached
+        assert (cache.hits, cache.misses) == (1, len(QUERIES) - 1)
+        assert plan.filter(snapshot, cache=cache) == filtered
+        assert (cache.hits, cache.misses) == (len(QUERIES), len(QUERIES))
+        assert cache.results[GlobQuery("**")] is filtered[0]
+
+    def test_other_snapshot(self, snapshot):
+        cache = QueryCache()
+        QueryPlan([GlobQuery("**")]).filter(snapshot, cache=cache)
+        filtered = QueryPlan([GlobQuery("**")]).filter(snapshot[:2], cache=cache)
+        assert filtered == [snapshot[:2]]
+        assert (cache.hits, cache.misses) == (0, 2)
+
+    @pytest.mark.parametrize("streamed", (False, True))
+    def test_report(self, snapshot, capsys, streamed):
+        manifest = Manifest.from_yaml(
+            "datajoint_file_validator/manifests/demo_dlc/v0.1.yaml"
+        )
+        cache = QueryCache()
+        target = iter(snapshot) if streamed else snapshot
+        _, report = validate_snapshot(target, manifest, verbose=True, cache=cache)
+        n_rules = len(manifest.rules)
+        n_queries = len({rule.query for rule in manifest.rules})
+        assert (cache.hits, cache.misses) == (n_rules - n_queries, n_queries)
+        assert (
+            f"Query cache: {n_rules - n_queries} hits, {n_queries} misses"
+            in capsys.readouterr().err
+        )
+        assert type(report) is list
+
+    def test_report_path(self):
+        manifest = "datajoint_file_validator/manifests/demo_dlc/v0.1.yaml"
+        cache = QueryCache()
+        validate("tests/data/filesets/fileset1", manifest, cache=cache)
+        n_rules = len(Manifest.from_yaml(manifest).rules)
+        assert cache.hits > 0
+        assert cache.hits + cache.misses == n_rules
+
+
+class TestDescendFilter:
+    @pytest.mark.parametrize(
+        "query,rel_dir,expected",
+        (
+            (GlobQuery("raw/**"), "raw/", True),
+            (GlobQuery("raw/**"), "raw/a/b/", True),
+            (GlobQuery("raw/**"), "cache/", False),
+            (GlobQuery("*.csv"), "raw/", False),
+            (GlobQuery("*/obs/*.txt"), "a/obs/", True),
+            (GlobQuery("*/obs/*.txt"), "a/obs/b/", False),
+            (GlobQuery("*/obs/*.txt"), "a/b/", False),
+            (GlobQuery("a/**/b/*"), "a/x/b/c/", True),
+            (GlobQuery("a/**/b/*"), "b/", False),
+            (GlobQuery("**", exclude="cache/**"), "cache/", False),
+            (GlobQuery("**", exclude="cache/**"), "a/cache/", True),
+            (GlobQuery(["raw/**", "!raw/tmp/**"]), "raw/tmp/", False),
+            (CompositeQuery([GlobQuery("a/**"), GlobQuery("*/b/*")]), "a/b/", True),
+            (CompositeQuery([GlobQuery("a/**"), GlobQuery("*/b/*")]), "c/b/", False),
+            (CompositeQuery.from_dict({"path": "a/*", "type": "file"}), "a/", True),
+        ),
+    )
+    def test_descend(self, query, rel_dir, expected):
+        assert descend_filter([query])(rel_dir) == expected
+
+    @pytest.mark.parametrize(
+        "queries",
+        (
+            [GlobQuery("**")],
+            [GlobQuery("**/*.png")],
+            [GlobQuery("raw/**"), TypeQuery("file")],
+            [GlobQuery("raw/**"), NameQuery("obs.md")],
+        ),
+    )
+    def test_none(self, queries):
+        assert descend_filter(queries) is None
+
+    @pytest.mark.parametrize("query", QUERIES)
+    def test_same_matches(self, snapshot, query):
+        descend = descend_filter([query])
+        pruned = create_snapshot("tests/data/filesets/fileset1", descend=descend)
+        assert query.filter(pruned) == query.filter(snapshot)
+
+    def test_validate(self, tmp_path, monkeypatch):
+        (tmp_path / "raw").mkdir()
+        (tmp_path / "raw" / "a.csv").touch()
+        (tmp_path / "cache").mkdir()
+        (tmp_path / "cache" / "b.csv").touch()
+        manifest = Manifest.from_dict(
+            {"id": "test", "rules": [{"query": "raw/*.csv", "count_min": 1}]}
+        )
+        walked = {}
+        real_descend_filter = descend_filter
+
+        def spy(queries):
+            descend = real_descend_filter(queries)
+
+            def wrapped(rel_dir):
+                walked[rel_dir] = descend(rel_dir)
+                return walked[rel_dir]
+
+            return wrapped
+
+        monkeypatch.setattr("datajoint_file_validator.main.descend_filter", spy)
+        success, _ = validate(str(tmp_path), manifest)
+        assert success
+        assert walked == {"cache/": False, "raw/": True}
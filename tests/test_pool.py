@@ -0,0 +1,139 @@
+import os
+import sys
+import time
+import pytest
+from datajoint_file_validator.constraint import EvalConstraint
+from datajoint_file_validator.constraint import pool as pool_module
+from datajoint_file_validator.constraint.pool import validate_eval_constraints
+from datajoint_file_validator.snapshot import create_snapshot
+from datajoint_file_validator.manifest import Manifest
+from datajoint_file_validator.main import validate_rules
+from datajoint_file_validator.error import DJFileValidatorError
+from datajoint_file_validator.config import config
+
+HAS_PNG = (
+    "def has_png(snapshot):\n"
+    "    return any(f['path'].endswith('.png') for f in snapshot)\n"
+)
+HAS_CSV = (
+    "def has_csv(snapshot):\n"
+    "    return any(f['path'].endswith('.csv') for f in snapshot)\n"
+)
+HAS_PNG_COLUMNAR = (
+    "def has_png(columns):\n"
+    "    return '.png' in list(columns['extension'])\n"
+    "has_png.columnar = True\n"
+)
+LOOPS = "def loops(snapshot):\n    while True:\n        pass\n"
+# Blocks in C code, where the alarm cannot interrupt it
+SUMS = "def sums(snapshot):\n    return sum(range(10**12)) > 0\n"
+
+
+@pytest.fixture(scope="module")
+def snapshot():
+    return create_snapshot("tests/data/filesets/fileset1")
+
+
+class TestValidateEvalConstraints:
+    def test_same_as_in_process(self, snapshot):
+        calls = [
+            (EvalConstraint(HAS_PNG), snapshot),
+            (EvalConstraint(HAS_CSV), snapshot),
+            (EvalConstraint(HAS_PNG), snapshot[:1]),
+            (EvalConstraint(HAS_PNG_COLUMNAR), snapshot),
+        ]
+        results = validate_eval_constraints(calls, workers=2)
+        assert [(r.status, r.message) for r in results] == [
+            (r.status, r.message)
+            for r in (constraint.validate(s) for constraint, s in calls)
+        ]
+        assert results[0].context["snapshot"] is snapshot
+
+    def test_snapshot_written_once(self, snapshot, monkeypatch):
+        written = []
+        write_snapshot = pool_module._write_snapshot
+        monkeypatch.setattr(
+            pool_module,
+            "_write_snapshot",
+            lambda s, path: written.append(s) or write_snapshot(s, path),
+        )
+        calls = [
+            (EvalConstraint(HAS_PNG), snapshot),
+            (EvalConstraint(HAS_CSV), snapshot),
+            (EvalConstraint(HAS_PNG_COLUMNAR), snapshot),
+            (EvalConstraint(HAS_PNG), snapshot[:1]),
+        ]
+        results = validate_eval_constraints(calls, workers=2)
+        assert [r.status for r in results] == [True, False, True, False]
+        assert len(written) == 2
+        assert written[0] is snapshot
+
+    @pytest.mark.parametrize("definition", (LOOPS, SUMS))
+    def test_timeout(self, snapshot, definition):
+        start = time.monotonic()
+        with pytest.raises(DJFileValidatorError, match="TimeoutError"):
+            validate_eval_constraints(
+                [
+                    (EvalConstraint(HAS_PNG), snapshot),
+                    (EvalConstraint(definition), snapshot),
+                ],
+                workers=2,
+                timeout=0.5,
+            )
+        assert time.monotonic() - start < 5
+
+    @pytest.mark.skipif(
+        not sys.platform.startswith("linux"), reason="needs /proc to size the limit"
+    )
+    def test_memory_limit(self, snapshot):
+        # Workers start as copies of this process, so allow a little more
+        with open("/proc/self/statm") as f:
+            address_space = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+        allocates = "def allocates(snapshot):\n    return len(bytearray(2 ** 28)) > 0\n"
+        with pytest.raises(DJFileValidatorError, match="MemoryError"):
+            validate_eval_constraints(
+                [(EvalConstraint(allocates), snapshot)],
+                workers=1,
+                memory_limit=address_space + 2**26,
+            )
+
+    def test_pool_reused(self, snapshot):
+        calls = [(EvalConstraint(HAS_PNG), snapshot)]
+        validate_eval_constraints(calls, workers=1)
+        pool = pool_module._pool
+        assert validate_eval_constraints(calls, workers=1)[0].status
+        assert pool_module._pool is pool
+        validate_eval_constraints(calls, workers=2)
+        assert pool_module._pool is not pool
+        pool_module.terminate_pool()
+        assert pool_module._pool is None
+
+    def test_errors(self, snapshot):
+        with pytest.raises(DJFileValidatorError, match="Error parsing function"):
+            validate_eval_constraints(
+                [(EvalConstraint("lambda x: x > 0"), snapshot)], workers=1
+            )
+        raises = "def raises(snapshot):\n    raise ValueError('foo')\n"
+        with pytest.raises(DJFileValidatorError, match="ValueError: foo"):
+            validate_eval_constraints([(EvalConstraint(raises), snapshot)], workers=1)
+
+    def test_validate_rules(self, snapshot, monkeypatch):
+        manifest = Manifest.from_dict(
+            {
+                "id": "test",
+                "rules": [
+                    {"id": "png", "eval": HAS_PNG, "count_min": 1},
+                    {"id": "csv", "query": "*", "eval": HAS_CSV},
+                ],
+            }
+        )
+        expected = validate_rules(snapshot, manifest)
+        monkeypatch.setattr(config, "eval_workers", 2)
+        results = validate_rules(snapshot, manifest)
+        assert [
+            {name: (r.status, r.message) for name, r in rule_results.items()}
+            for rule_results in results
+        ] == [
+            {name: (r.status, r.message) for name, r in rule_results.items()}
+            for rule_results in expected
+        ]
@@ -1,4 +1,5 @@
 import pytest
+from datetime import datetime, timedelta, timezone
 import datajoint_file_validator as djfval
 
 
@@ -136,6 +137,48 @@ class TestGlobQuery:
         )
 
 
+class TestExclude:
+    @pytest.mark.parametrize(
+        "query, expected",
+        (
+            (
+                djfval.query.GlobQuery("**/*.png", exclude="2021-10-02/**"),
+                {"2021-10-01/subject1_frame%d.png" % i for i in range(6)},
+            ),
+            (
+                djfval.query.GlobQuery(["*/*", "!2021-10-02/*", "!*/*.png"]),
+                {"2021-10-01/obs.txt"},
+            ),
+            (
+                djfval.query.GlobQuery("!**/*.*"),
+                {"2021-10-01/", "2021-10-02/", "2021-10-02/foo/"},
+            ),
+            (
+                djfval.query.CompositeQuery.from_dict(
+                    {"path": "**/*.*", "exclude": ["*/*.png", "*.*"]}
+                ),
+                {"2021-10-01/obs.txt", "2021-10-02/obs.md", "2021-10-02/foo/bar.txt"},
+            ),
+        ),
+    )
+    def test_filter(self, query, expected):
+        ss = djfval.snapshot.create_snapshot("tests/data/filesets/fileset1")
+        filtered = query.filter(ss)
+        assert {item["path"] for item in filtered} == expected
+        assert query.filter(djfval.index.IndexedSnapshot(ss)) == filtered
+        assert [item for item in ss if query.match(item)] == filtered
+        columnar = djfval.columnar.ColumnarSnapshot.from_records(ss)
+        assert query.filter(columnar).to_records() == filtered
+
+    def test_patterns(self):
+        query = djfval.query.GlobQuery(["*.png", "!a/*"], exclude="b/**")
+        assert query.patterns == (("*.png",), ("a/*", "b/**"))
+        assert djfval.query.GlobQuery("*.png").patterns == ("*.png", None)
+        assert djfval.query.GlobQuery("!*.png").patterns == (("**",), ("*.png",))
+        assert djfval.query.GlobQuery("**", exclude="scratch/**").uses_index
+        hash(djfval.query.CompositeQuery.from_dict({"exclude": ["a/**"]}))
+
+
 class TestCompositeQuery:
     def _comp_query(self, pattern, file_type, ss):
         filtered_snapshot = djfval.query.CompositeQuery(
@@ -228,3 +271,158 @@ class TestCompositeQuery:
                 "2021-10-02/foo/",
             ]
         )
+
+    @pytest.mark.parametrize(
+        "pattern, file_type",
+        (
+            ("**", None),
+            ("2021-10-02/*", "file"),
+            ("*/**/*.txt", "file"),
+            ("*/", "directory"),
+        ),
+    )
+    def test_match(self, pattern, file_type):
+        """Query.match agrees with Query.filter on every entry."""
+        ss = djfval.snapshot.create_snapshot("tests/data/filesets/fileset1")
+        query = djfval.query.CompositeQuery.from_dict(
+            {"path": pattern, "type": file_type}
+        )
+        assert [item for item in ss if query.match(item)] == query.filter(ss)
+
+    def test_ordered_parts(self):
+        gq = djfval.query.GlobQuery("**")
+        tq = djfval.query.TypeQuery("file")
+        query = djfval.query.CompositeQuery([gq, tq])
+        assert query.ordered_parts == [tq, gq]
+        assert query.parts == [gq, tq]
+        assert query.uses_index
+        assert not djfval.query.CompositeQuery([gq]).uses_index
+
+    @pytest.mark.parametrize(
+        "pattern, file_type",
+        (
+            ("**", None),
+            ("**", "file"),
+            ("2021-10-02/*", "file"),
+            ("*/**/*.txt", "file"),
+            ("*/", "directory"),
+        ),
+    )
+    def test_fused(self, pattern, file_type):
+        """The fused filter agrees with filtering by each part in turn."""
+        ss = djfval.snapshot.create_snapshot("tests/data/filesets/fileset1")
+        query = djfval.query.CompositeQuery.from_dict(
+            {"path": pattern, "type": file_type}
+        )
+        expected = ss
+        for part in query.parts:
+            expected = part.filter(expected)
+        assert query.filter(ss) == expected
+        assert query.filter(djfval.index.IndexedSnapshot(ss)) == expected
+        assert [item for item in ss if query.matcher()(item)] == expected
+
+
+class TestRangeQuery:
+    @pytest.fixture
+    def snapshot(self):
+        return [
+            {"path": "a.txt", "type": "file", "size": 10, "mtime_ns": 3},
+            {"path": "b/", "type": "directory", "size": 4096, "mtime_ns": 1},
+            {"path": "b/c.txt", "type": "file", "size": 0, "mtime_ns": 2},
+            {"path": "d.txt", "type": "file"},
+            {"path": "e.txt", "type": "file", "size": 10, "mtime_ns": 5},
+        ]
+
+    @pytest.mark.parametrize(
+        "bounds, expected",
+        (
+            ((None, None), ["a.txt", "b/", "b/c.txt", "e.txt"]),
+            ((10, None), ["a.txt", "b/", "e.txt"]),
+            ((None, 10), ["a.txt", "b/c.txt", "e.txt"]),
+            ((10, 10), ["a.txt", "e.txt"]),
+            ((11, 4095), []),
+        ),
+    )
+    def test_size(self, snapshot, bounds, expected):
+        query = djfval.query.RangeQuery("size", *bounds)
+        assert [item["path"] for item in query.filter(snapshot)] == expected
+        indexed = djfval.index.IndexedSnapshot(snapshot)
+        assert query.filter(indexed) == query.filter(snapshot)
+        columnar = djfval.columnar.ColumnarSnapshot.from_records(snapshot)
+        assert query.filter(columnar).to_records() == query.filter(snapshot)
+        assert [item for item in snapshot if query.match(item)] == query.filter(
+            snapshot
+        )
+        assert query.fields == {"size"}
+
+    def test_mtime(self, snapshot):
+        query = djfval.query.MtimeQuery(min=2, max=3)
+        assert [item["path"] for item in query.filter(snapshot)] == [
+            "a.txt",
+            "b/c.txt",
+        ]
+        assert not djfval.query.MtimeQuery(max_age=3600).filter(snapshot)
+
+    def test_max_age(self, tmp_path):
+        (tmp_path / "new.txt").touch()
+        ss = djfval.snapshot.create_snapshot(str(tmp_path))
+        query = djfval.query.CompositeQuery.from_dict(
+            {"type": "file", "mtime": {"max_age": 3600}}
+        )
+        assert [item["path"] for item in query.filter(ss)] == ["new.txt"]
+        assert query.fields == {"path", "type", "mtime_ns"}
+
+    def test_from_dict(self):
+        query = djfval.query.CompositeQuery.from_dict(
+            {
+                "size": {"min": 1 << 30},
+                "mtime": {"min": "2024-01-01T00:00:00Z", "max": "2024-01-02"},
+            }
+        )
+        size, mtime = query.parts[2:]
+        assert size == djfval.query.RangeQuery("size", min=1 << 30)
+        assert mtime.min == 1704067200 * 10**9
+        assert mtime.max == mtime.min + 86400 * 10**9
+        # YAML loads unquoted timestamps as datetimes
+        mtime = djfval.query.MtimeQuery.from_dict(
+            {"min": datetime(2024, 1, 1, 1, tzinfo=timezone(timedelta(hours=1)))}
+        )
+        assert mtime.min == 1704067200 * 10**9
+
+    @pytest.mark.parametrize(
+        "d",
+        (
+            {"size": 10},
+            {"size": {"min": 10, "max": 1}},
+            {"size": {"above": 10}},
+            {"mtime": {"min": "yesterday"}},
+            {"mtime": {"min": 10}},
+        ),
+    )
+    def test_from_dict_invalid(self, d):
+        with pytest.raises(djfval.error.InvalidQueryError):
+            djfval.query.CompositeQuery.from_dict(d)
+
+    def test_manifest(self):
+        mani = djfval.Manifest.from_dict(
+            {
+                "id": "test",
+                "rules": [
+                    {
+                        "query": {
+                            "path": "**/*.png",
+                            "size": {"max": 0},
+                            "mtime": {"max_age": 86400, "min": "2000-01-01"},
+                        },
+                        "count_max": 0,
+                    },
+                ],
+            },
+            check_valid=True,
+        )
+        assert mani.fields == {"path", "size", "mtime_ns"}
+        with pytest.raises(djfval.error.InvalidManifestError):
+            djfval.Manifest.from_dict(
+                {"id": "test", "rules": [{"query": {"size": {"min": -1}}}]},
+                check_valid=True,
+            )
@@ -1,6 +1,8 @@
 import pytest
 from copy import deepcopy
 from datajoint_file_validator.rule import Rule
+from datajoint_file_validator.index import IndexedSnapshot
+from datajoint_file_validator.snapshot import create_snapshot
 from datajoint_file_validator.yaml import read_yaml
 from datajoint_file_validator.error import InvalidRuleError
 
@@ -127,3 +129,22 @@ class TestRule:
                 }
             )
         assert "empty" in str(e.value).lower(), str(e.value)
+
+    @pytest.mark.parametrize(
+        "rule",
+        (
+            {"query": "**/*.png", "count_min": 1, "count_max": 2},
+            {"query": "*", "regex": ".*\\.md", "count_max": 100},
+            {"query": "*", "eval": "def func(snapshot):\n    return len(snapshot) > 1"},
+        ),
+    )
+    def test_validate_streams(self, rule):
+        """Rules stream entries to their constraints, unless some cannot."""
+        rule = Rule.from_dict(rule)
+        snapshot = create_snapshot("tests/data/filesets/fileset1")
+        expected = rule.validate_constraints(rule.query.filter(snapshot))
+        for target in (snapshot, iter(snapshot), IndexedSnapshot(snapshot)):
+            results = rule.validate(target)
+            assert {name: (r.status, r.message) for name, r in results.items()} == {
+                name: (r.status, r.message) for name, r in expected.items()
+            }
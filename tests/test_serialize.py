@@ -0,0 +1,109 @@
+import gzip
+import pytest
+from datajoint_file_validator.columnar import ColumnarSnapshot
+from datajoint_file_validator.serialize import (
+    MAGIC,
+    save_snapshot,
+    load_snapshot,
+    iter_load_snapshot,
+    is_snapshot_file,
+)
+from datajoint_file_validator.snapshot import create_snapshot, iter_snapshot
+from datajoint_file_validator.error import InvalidSnapshotError
+from datajoint_file_validator.main import validate
+from datajoint_file_validator.manifest import Manifest
+
+
+@pytest.fixture(scope="module")
+def snapshot():
+    return create_snapshot("tests/data/filesets/fileset1")
+
+
+class TestSerialize:
+    @pytest.mark.parametrize("compression", (None, "gzip"))
+    @pytest.mark.parametrize("chunk_size", (1, 3, 1000))
+    def test_round_trip(self, snapshot, tmp_path, compression, chunk_size):
+        path = tmp_path / "snapshot.djfv"
+        n = save_snapshot(
+            snapshot, path, compression=compression, chunk_size=chunk_size
+        )
+        assert n == len(snapshot)
+        assert is_snapshot_file(path)
+        loaded = load_snapshot(path)
+        assert isinstance(loaded, ColumnarSnapshot)
+        assert loaded.to_records() == snapshot
+        assert list(iter_load_snapshot(path)) == snapshot
+
+    def test_columnar_and_streamed(self, snapshot, tmp_path):
+        save_snapshot(ColumnarSnapshot.from_records(snapshot), tmp_path / "a")
+        save_snapshot(iter(snapshot), tmp_path / "b", chunk_size=4)
+        assert load_snapshot(tmp_path / "a").to_records() == snapshot
+        assert load_snapshot(tmp_path / "b").to_records() == snapshot
+
+    def test_timezone(self, tmp_path, set_timezone):
+        """Snapshots load the same on machines in other timezones."""
+        set_timezone("UTC")
+        snapshot = create_snapshot("tests/data/filesets/fileset1")
+        save_snapshot(snapshot, tmp_path / "snapshot.djfv")
+        set_timezone("America/New_York")
+        assert load_snapshot(tmp_path / "snapshot.djfv").to_records() == snapshot
+
+    def test_heterogeneous(self, tmp_path):
+        records = [
+            {"path": "a.txt", "size": 1, "note": "x\0y"},
+            {"path": "b/", "type": "directory", "abs_path": "/elsewhere/b/"},
+        ]
+        save_snapshot(records, tmp_path / "snapshot.djfv", chunk_size=1)
+        assert load_snapshot(tmp_path / "snapshot.djfv").to_records() == records
+
+    def test_empty(self, tmp_path):
+        save_snapshot([], tmp_path / "snapshot.djfv")
+        assert len(load_snapshot(tmp_path / "snapshot.djfv")) == 0
+
+    def test_gzip_compressed(self, snapshot, tmp_path):
+        save_snapshot(snapshot, tmp_path / "snapshot.djfv", compression="gzip")
+        with open(tmp_path / "snapshot.djfv", "rb") as f:
+            f.read(len(MAGIC) + 2)
+            gzip.GzipFile(fileobj=f).read()
+
+    def test_invalid(self, snapshot, tmp_path):
+        path = tmp_path / "snapshot.djfv"
+        path.write_text("not a snapshot")
+        assert not is_snapshot_file(path)
+        assert not is_snapshot_file("tests/data/filesets/fileset1")
+        with pytest.raises(InvalidSnapshotError):
+            load_snapshot(path)
+
+        save_snapshot(snapshot, path)
+        path.write_bytes(path.read_bytes()[:-20])
+        with pytest.raises(InvalidSnapshotError):
+            load_snapshot(path)
+
+        with pytest.raises(ValueError):
+            save_snapshot(snapshot, path, compression="lz4")
+
+    def test_validate(self, tmp_path):
+        manifest = "datajoint_file_validator/manifests/demo_dlc/v0.1.yaml"
+        path = tmp_path / "snapshot.djfv"
+        save_snapshot(iter_snapshot("tests/data/filesets/fileset0"), path)
+        assert validate(str(path), manifest) == validate(
+            "tests/data/filesets/fileset0", manifest
+        )
+
+    def test_validate_eval(self, tmp_path, manifest_dict):
+        """Eval functions get a list of entries from a saved snapshot."""
+        manifest_dict["rules"] = [
+            {
+                "id": "sorted",
+                "eval": (
+                    "def check_sorted(snapshot):\n"
+                    "    snapshot.sort(key=lambda entry: entry['path'])\n"
+                    "    return isinstance(snapshot, list)"
+                ),
+            }
+        ]
+        manifest = Manifest.from_dict(manifest_dict)
+        path = tmp_path / "snapshot.djfv"
+        save_snapshot(iter_snapshot("tests/data/filesets/fileset0"), path)
+        success, report = validate(str(path), manifest)
+        assert success, report
@@ -87,3 +87,102 @@ class TestSnapshot:
     ):
         with pytest.raises(FileNotFoundError):
             djfval.snapshot.create_snapshot(fileset_path)
+
+    @pytest.mark.parametrize(
+        "fileset_path",
+        (
+            "tests/data/filesets/fileset1",
+            "tests/data/filesets/fileset2",
+            "tests/data/filesets/fileset3.txt",
+        ),
+    )
+    def test_iter_snapshot(self, fileset_path):
+        files = djfval.snapshot.iter_snapshot(fileset_path)
+        assert not isinstance(files, list)
+        assert self._get_paths(list(files)) == self._get_paths(
+            djfval.snapshot.create_snapshot(fileset_path)
+        )
+
+    def test_fields_without_stat(self, fileset_path="tests/data/filesets/fileset1"):
+        files = djfval.snapshot.create_snapshot(fileset_path, fields=["path", "type"])
+        full = djfval.snapshot.create_snapshot(fileset_path)
+        assert [(f["path"], f["type"]) for f in files] == [
+            (f["path"], f["type"]) for f in full
+        ]
+        for file in files:
+            assert "size" not in file
+            assert "mtime_ns" not in file
+
+    def test_fields_with_stat(self):
+        files = djfval.snapshot.create_snapshot(
+            "tests/data/filesets/fileset1", fields=["path", "size"]
+        )
+        assert all("size" in file and "mtime_ns" in file for file in files)
+
+
+class TestFileMetadata:
+    @pytest.fixture
+    def metadata(self):
+        files = djfval.snapshot._snapshot_to_cls("tests/data/filesets/fileset1")
+        return next(f for f in files if f.path == "2021-10-02/obs.md")
+
+    def test_slotted(self, metadata):
+        assert not hasattr(metadata, "__dict__")
+
+    def test_lazy_fields(self, metadata):
+        assert metadata._abs_path is None
+        assert metadata._extension is None
+        assert metadata._last_modified is None
+        assert metadata.abs_path == "tests/data/filesets/fileset1/2021-10-02/obs.md"
+        assert metadata.extension == ".md"
+        assert metadata.last_modified == metadata.to_iso_8601(metadata.mtime_ns)
+        assert metadata.path is metadata.rel_path
+
+    def test_asdict(self, metadata):
+        d = metadata.asdict()
+        assert list(d) == list(djfval.snapshot.FileMetadata.FIELDS)
+        assert d["path"] == d["rel_path"] == "2021-10-02/obs.md"
+        assert d["name"] == "obs.md"
+        assert d["type"] == "file"
+
+    def test_positional(self):
+        """Positional arguments are in the order of the former dataclass."""
+        metadata = djfval.snapshot.FileMetadata(
+            "obs.md",
+            "/data/2021-10-02/obs.md",
+            "2021-10-02/obs.md",
+            ".md",
+            11,
+            "file",
+            "2021-10-02T00:00:00+00:00",
+            1,
+            2,
+            3,
+        )
+        assert metadata.asdict() == {
+            "name": "obs.md",
+            "path": "2021-10-02/obs.md",
+            "abs_path": "/data/2021-10-02/obs.md",
+            "rel_path": "2021-10-02/obs.md",
+            "extension": ".md",
+            "size": 11,
+            "type": "file",
+            "last_modified": "2021-10-02T00:00:00+00:00",
+            "mtime_ns": 1,
+            "ctime_ns": 2,
+            "atime_ns": 3,
+        }
+        with pytest.raises(TypeError):
+            djfval.snapshot.FileMetadata("obs.md")
+
+    def test_asdict_omits_none(self):
+        metadata = djfval.snapshot.FileMetadata(
+            name="foo", rel_path="foo/", type="directory"
+        )
+        assert metadata.asdict() == {
+            "name": "foo",
+            "path": "foo/",
+            "rel_path": "foo/",
+            "extension": "",
+            "type": "directory",
+        }
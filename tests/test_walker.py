@@ -0,0 +1,102 @@
+import os
+import pytest
+from datajoint_file_validator.walker import scandir_walk, threaded_walk, WALKERS
+from datajoint_file_validator.snapshot import _snapshot_to_cls
+
+
+def _without_atime(files):
+    records = [f.asdict() for f in files]
+    for record in records:
+        record.pop("atime_ns")
+    return sorted(records, key=lambda record: record["path"])
+
+
+@pytest.mark.parametrize("walker", list(WALKERS))
+@pytest.mark.parametrize(
+    "fileset_path",
+    (
+        "tests/data/filesets/fileset0",
+        "tests/data/filesets/fileset1/",
+        "tests/data/filesets/fileset2",
+        "tests/data/filesets/fileset3.txt",
+    ),
+)
+def test_same_as_glob(walker, fileset_path):
+    assert _without_atime(_snapshot_to_cls(fileset_path, walker)) == _without_atime(
+        _snapshot_to_cls(fileset_path, "glob")
+    )
+
+
+def test_preorder_sorted():
+    paths = [entry.rel_path for entry in scandir_walk("tests/data/filesets/fileset1")]
+    assert paths[:3] == [
+        "2021-10-01/",
+        "2021-10-01/obs.txt",
+        "2021-10-01/subject1_frame0.png",
+    ]
+    assert paths.index("2021-10-02/foo/bar.txt") == paths.index("2021-10-02/foo/") + 1
+    assert paths[-2:] == ["README.txt", "obs.md"]
+
+
+def test_hidden_skipped(tmp_path):
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "HEAD").touch()
+    (tmp_path / ".hidden.txt").touch()
+    (tmp_path / "visible.txt").touch()
+    assert [entry.rel_path for entry in scandir_walk(str(tmp_path))] == ["visible.txt"]
+
+
+def test_symlink_loop(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "b.txt").touch()
+    os.symlink(tmp_path, tmp_path / "a" / "loop")
+    paths = [entry.rel_path for entry in scandir_walk(str(tmp_path))]
+    assert paths == ["a/", "a/b.txt", "a/loop/"]
+
+
+def test_unknown_walker():
+    with pytest.raises(ValueError):
+        _snapshot_to_cls("tests/data/filesets/fileset1", "not_a_walker")
+
+
+def test_nonexistent():
+    with pytest.raises(FileNotFoundError):
+        list(scandir_walk("tests/data/filesets/my_dummy_fileset"))
+
+
+@pytest.mark.parametrize("workers,max_pending", ((1, 1), (4, 2), (8, 256)))
+def test_threaded_same_order(workers, max_pending):
+    def key(entries):
+        return [entry._replace(stat=None) for entry in entries]
+
+    expected = key(scandir_walk("tests/data"))
+    assert key(threaded_walk("tests/data", workers, max_pending)) == expected
+
+
+def test_threaded_symlink_loop(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "b.txt").touch()
+    os.symlink(tmp_path, tmp_path / "a" / "loop")
+    paths = [entry.rel_path for entry in threaded_walk(str(tmp_path))]
+    assert paths == ["a/", "a/b.txt", "a/loop/"]
+
+
+@pytest.mark.parametrize("walker", list(WALKERS))
+def test_without_stat(walker):
+    def key(entries):
+        return [entry._replace(stat=None) for entry in entries]
+
+    entries = list(WALKERS[walker]("tests/data", stat=False))
+    assert all(entry.stat is None for entry in entries)
+    assert entries == key(scandir_walk("tests/data"))
+
+
+@pytest.mark.parametrize("walker", list(WALKERS))
+def test_descend(walker):
+    entries = WALKERS[walker](
+        "tests/data/filesets/fileset1", descend=lambda rel_dir: rel_dir != "2021-10-01/"
+    )
+    paths = [entry.rel_path for entry in entries]
+    assert "2021-10-01/" in paths
+    assert not any(path.startswith("2021-10-01/") for path in paths[1:])
+    assert "2021-10-02/foo/bar.txt" in paths